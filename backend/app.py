@@ -1,38 +1,71 @@
 import os
-from flask import Flask, jsonify, request, send_file
+import atexit
+import logging
+from flask import Blueprint, Flask, current_app, jsonify, request, send_file
 from flask_cors import CORS
+from config import Config
+from database.db import close_pool
 from routes.file import bp as file_bp
 from routes.report import bp as report_bp
 from routes.case import bp as case_bp
 from routes.auth import auth_bp
 from routes.scoring import scoring_bp
-from utils.file_handler import save_file, generate_preview, list_files, get_file_type, delete_file
-from werkzeug.utils import secure_filename
-from datetime import datetime
+from routes.upload import upload_bp
+from routes.search import search_bp
+from utils.file_handler import save_file, generate_preview, list_files, get_file_type, delete_file, resolve_upload, query_files
+from utils.case_catalog import CASE_DIR, get_case_catalog
+from utils.pdf_preview import get_pdf_info, parse_preview_args, render_page
+from utils.metrics import install_metrics
+from utils.log_config import setup_logging, install_request_logging
 
-app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+logger = logging.getLogger(__name__)
 
-# 配置文件上传目录
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+main_bp = Blueprint('main', __name__)
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 限制上传文件大小为5MB
+def create_app(config=None):
+    """创建 Flask 应用
 
-# 注册蓝图
-app.register_blueprint(file_bp)
-app.register_blueprint(report_bp, url_prefix='/api')
-app.register_blueprint(case_bp)
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(scoring_bp)
+    所有带副作用的初始化（创建目录、建立索引）都在这里完成，模块导入时不做任何事，
+    多进程部署时每个 worker 的数据库连接池在首次使用时按进程创建。
+    config 为字典或配置类，用于覆盖 Config 中的默认值。
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
 
-@app.route('/')
+    setup_logging()
+    CORS(app, resources={r"/api/*": {"origins": app.config['CORS_ORIGINS']}})
+    install_request_logging(app)
+    install_metrics(app)
+
+    # 配置文件上传目录
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    # 注册蓝图
+    app.register_blueprint(main_bp)
+    app.register_blueprint(file_bp)
+    app.register_blueprint(report_bp, url_prefix='/api')
+    app.register_blueprint(case_bp)
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(scoring_bp)
+    app.register_blueprint(upload_bp)
+    app.register_blueprint(search_bp)
+
+    # 建立案例目录索引
+    if app.config['WARM_CASE_CATALOG']:
+        get_case_catalog()
+    logger.info("CASE_DIR set to: %s", CASE_DIR)
+
+    return app
+
+@main_bp.route('/')
 def index():
     return jsonify({"message": "Fire Incident Investigation API"})
 
-@app.route('/api/upload', methods=['POST'])
+@main_bp.route('/api/upload', methods=['POST'])
 def upload_file():
     """上传文件处理"""
     try:
@@ -43,64 +76,114 @@ def upload_file():
         if file.filename == '':
             return jsonify({'error': '没有选择文件'}), 400
         
-        result = save_file(file, app.config['UPLOAD_FOLDER'])
+        result = save_file(file, current_app.config['UPLOAD_FOLDER'])
         if result:
             return jsonify(result)
         
         return jsonify({'error': '不支持的文件类型'}), 400
     except Exception as e:
-        print(f"文件上传失败: {str(e)}")
+        logger.error("文件上传失败: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/files', methods=['GET'])
+# 文件列表的分页、排序和过滤参数
+PAGINATION_ARGS = {'limit', 'cursor', 'sort', 'order', 'type', 'from', 'to'}
+
+@main_bp.route('/api/files', methods=['GET'])
 def get_files():
-    """获取所有上传的文件列表"""
+    """获取上传的文件列表
+
+    不带参数时返回全部文件（数组）；带 limit / cursor / sort / order / type / from / to
+    任一参数时分页返回 {"files": [...], "next_cursor": ...}。
+    """
     try:
-        files = list_files(app.config['UPLOAD_FOLDER'])
-        return jsonify(files)
+        if not PAGINATION_ARGS.intersection(request.args):
+            files = list_files(current_app.config['UPLOAD_FOLDER'])
+            return jsonify(files)
+
+        try:
+            page = query_files(
+                current_app.config['UPLOAD_FOLDER'],
+                limit=request.args.get('limit', 50),
+                cursor=request.args.get('cursor'),
+                sort=request.args.get('sort', 'upload_time'),
+                order=request.args.get('order', 'desc'),
+                file_type=request.args.get('type'),
+                date_from=request.args.get('from'),
+                date_to=request.args.get('to')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(page)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/files/<file_uid>', methods=['DELETE'])
+@main_bp.route('/api/files/<file_uid>', methods=['DELETE'])
 def delete_uploaded_file(file_uid):
     """删除上传的文件"""
     try:
-        success = delete_file(file_uid, app.config['UPLOAD_FOLDER'])
+        success = delete_file(file_uid, current_app.config['UPLOAD_FOLDER'])
         if success:
             return jsonify({'message': '文件删除成功'})
         return jsonify({'error': '文件不存在'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/preview/<filename>')
+@main_bp.route('/api/preview/<filename>')
 def preview_file(filename):
     """预览文件"""
     try:
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename))
-        if not os.path.exists(file_path):
+        file_path = resolve_upload(filename, current_app.config['UPLOAD_FOLDER'])
+        if file_path is None:
             return jsonify({'error': '文件不存在'}), 404
 
-        # 获取文件类型
-        file_type = get_file_type(file_path)
+        # 获取文件类型（磁盘上按内容哈希存储，类型以文件名为准）
+        file_type = get_file_type(filename)
         
         # 图片文件直接返回
         if file_type.startswith('image/'):
-            return send_file(file_path)
+            return send_file(file_path, mimetype=file_type)
         
-        # PDF文件直接返回
+        # PDF文件：指定 page 时返回该页的预览图，否则返回整个文件
         if file_type == 'application/pdf' or filename.lower().endswith('.pdf'):
+            if 'page' in request.args:
+                try:
+                    page, dpi, fmt = parse_preview_args(request.args)
+                    preview_path, mimetype = render_page(file_path, page, dpi, fmt)
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                return send_file(preview_path, mimetype=mimetype)
             return send_file(file_path, mimetype='application/pdf')
         
         # 其他文件尝试生成预览
-        preview = generate_preview(file_path)
+        preview = generate_preview(file_path, filename)
         if preview and preview.get('path'):
-            return send_file(preview['path'])
+            return send_file(preview['path'], mimetype=file_type, download_name=filename)
         
         return jsonify({'error': '不支持的文件类型预览'}), 400
         
     except Exception as e:
-        print(f"预览失败: {str(e)}")
+        logger.error("预览失败: %s", e, exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/api/preview/<filename>/info')
+def preview_info(filename):
+    """获取PDF页数和元数据"""
+    try:
+        file_path = resolve_upload(filename, current_app.config['UPLOAD_FOLDER'])
+        if file_path is None:
+            return jsonify({'error': '文件不存在'}), 404
+
+        if not filename.lower().endswith('.pdf'):
+            return jsonify({'error': '仅支持PDF文件'}), 400
+
+        return jsonify(get_pdf_info(file_path))
+    except Exception as e:
+        logger.error("获取PDF信息失败: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # 开发服务器；生产环境使用 gunicorn -c gunicorn.conf.py wsgi:app
+    app = create_app()
+    atexit.register(close_pool)
+    app.run(host=os.getenv('HOST', '0.0.0.0'), port=int(os.getenv('PORT', '5000')),
+            debug=app.config['DEBUG'], threaded=True)
@@ -0,0 +1,160 @@
+import os
+import io
+import json
+import random
+import mysql.connector
+from PIL import Image
+from werkzeug.security import generate_password_hash
+from database.migrate import migrate
+from utils.score_stats import rebuild_report_stats
+from utils.password_hashing import PASSWORD_HASH_METHOD, PASSWORD_SALT_LENGTH
+
+# 各规模的数据量：案例数、每案例询问记录数、每份记录问答轮数、每案例图片数、用户数、每个用户评分的案例比例
+SCALES = {
+    'small': {'cases': 5, 'records': 4, 'turns': 40, 'pictures': 4, 'users': 20, 'score_ratio': 0.8},
+    'medium': {'cases': 50, 'records': 8, 'turns': 80, 'pictures': 8, 'users': 200, 'score_ratio': 0.6},
+    'large': {'cases': 300, 'records': 12, 'turns': 120, 'pictures': 12, 'users': 1000, 'score_ratio': 0.5},
+}
+
+BENCH_USER_PREFIX = 'bench_user_'
+BENCH_PASSWORD = 'bench-password'
+
+_WORDS = ('起火', '电动车', '充电', '烟头', '垃圾桶', '客厅', '物业', '保安', '报警', '消防',
+          '电瓶', '楼道', '蜡烛', '烟花', '包间', '沙发', '监控', '值班', '线路', '短路',
+          '燃气', '厨房', '阳台', '窗户', '逃生', '灭火器', '浓烟', '邻居', '凌晨', '傍晚')
+_ROLES = ('小区居民', '物业管理员', '保安', '报警人', '店主', '服务员', '值班人员', '目击者')
+
+
+def _sentence(rng, words=12):
+    return '，'.join(''.join(rng.sample(_WORDS, 2)) for _ in range(words // 2)) + '。'
+
+
+def _write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _picture(rng):
+    """生成一张带噪声的 JPEG，体积接近现场照片"""
+    image = Image.effect_noise((1600, 1200), 64).convert('RGB')
+    overlay = Image.new('RGB', image.size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    image = Image.blend(image, overlay, 0.3)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def _graph_html(rng, entities):
+    nodes = [{'id': e, 'label': e, 'shape': 'dot', 'size': 20.0, 'title': f'实体: {e}'} for e in entities]
+    edges = [{'from': rng.choice(entities), 'to': rng.choice(entities), 'title': rng.choice(_WORDS), 'arrows': 'to'}
+             for _ in range(len(entities) * 2)]
+    return ('<html>\n<head><meta charset="utf-8"></head>\n<body>\n<div id="mynetwork"></div>\n<script>\n'
+            f'nodes = new vis.DataSet({json.dumps(nodes)});\n'
+            f'edges = new vis.DataSet({json.dumps(edges)});\n'
+            '</script>\n</body>\n</html>\n')
+
+
+def build_case_tree(root, cases, records, turns, pictures, seed=0, **_):
+    """在 root 下生成与 case_show 结构相同的合成案例，返回案例 id 列表
+
+    已存在且规模相同的目录直接复用（以 .bench.json 记录生成参数）。
+    """
+    params = {'cases': cases, 'records': records, 'turns': turns, 'pictures': pictures, 'seed': seed}
+    marker = os.path.join(root, '.bench.json')
+    case_ids = [f'bench_case_{i:04d}' for i in range(cases)]
+    if os.path.exists(marker):
+        with open(marker, encoding='utf-8') as f:
+            if json.load(f) == params:
+                return case_ids
+
+    rng = random.Random(seed)
+    photos = [_picture(rng) for _ in range(min(max(pictures, 1), 4))]
+    for case_id in case_ids:
+        case_dir = os.path.join(root, case_id)
+        os.makedirs(os.path.join(case_dir, 'pic'), exist_ok=True)
+        os.makedirs(os.path.join(case_dir, 'record'), exist_ok=True)
+
+        _write_json(os.path.join(case_dir, 'report.json'), {
+            '背景信息': _sentence(rng, 60),
+            '火灾原因': {
+                '起火时间': f'2024年{rng.randint(1, 12)}月{rng.randint(1, 28)}日',
+                '起火部位': _sentence(rng, 6),
+                '起火点': _sentence(rng, 6),
+                '起火原因': {'直接原因': _sentence(rng, 20), '间接原因': [_sentence(rng, 16) for _ in range(3)]}
+            },
+            '事故防范和整改措施意见': [_sentence(rng, 24) for _ in range(5)]
+        })
+        with open(os.path.join(case_dir, 'graph.html'), 'w', encoding='utf-8') as f:
+            f.write(_graph_html(rng, rng.sample(_WORDS + _ROLES, 20)))
+
+        for i in range(pictures):
+            with open(os.path.join(case_dir, 'pic', f'{i + 1:03d}.jpg'), 'wb') as f:
+                f.write(photos[i % len(photos)])
+
+        for i in range(records):
+            role = rng.choice(_ROLES)
+            _write_json(os.path.join(case_dir, 'record', f'{case_id}+{role}{i}+第一次询问.json'), {
+                '基本信息': {'被询问人': {'姓名': f'证人{i}', '身份': role}, '询问信息': {'地点': _sentence(rng, 4)}},
+                '对话': [{'question': _sentence(rng, 8), 'answer': _sentence(rng, 30)} for _ in range(turns)]
+            })
+
+    _write_json(marker, params)
+    return case_ids
+
+
+def _server_connection(database=None):
+    return mysql.connector.connect(
+        host=os.getenv('DB_HOST'),
+        port=int(os.getenv('DB_PORT', '3306')),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        database=database
+    )
+
+
+def prepare_database(db_name):
+    """删除并重建压测库，执行全部迁移建表"""
+    connection = _server_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f'DROP DATABASE IF EXISTS `{db_name}`')
+        cursor.execute(f'CREATE DATABASE `{db_name}` CHARACTER SET utf8mb4')
+        cursor.execute(f'USE `{db_name}`')
+        cursor.close()
+        migrate(connection, log=lambda message: None)
+    finally:
+        connection.close()
+
+
+def seed_database(db_name, case_ids, users, score_ratio, seed=0, **_):
+    """写入压测用户和评分，并重新生成评分汇总；返回用户名列表"""
+    rng = random.Random(seed)
+    password_hash = generate_password_hash(BENCH_PASSWORD, method=PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH)
+    usernames = [f'{BENCH_USER_PREFIX}{i}' for i in range(users)]
+
+    connection = _server_connection(db_name)
+    try:
+        cursor = connection.cursor()
+        cursor.executemany(
+            "INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s)",
+            [(name, f'{name}@bench.local', password_hash) for name in usernames]
+        )
+        cursor.execute("SELECT id FROM users WHERE username LIKE %s", (BENCH_USER_PREFIX + '%',))
+        user_ids = [row[0] for row in cursor.fetchall()]
+
+        rows = []
+        per_user = max(1, int(len(case_ids) * score_ratio))
+        for user_id in user_ids:
+            for case_id in rng.sample(case_ids, per_user):
+                rows.append((user_id, case_id, min(max(int(rng.gauss(75, 12)), 0), 100), _sentence(rng, 6)))
+        for start in range(0, len(rows), 5000):
+            cursor.executemany(
+                "INSERT INTO scores (user_id, report_id, score, comments) VALUES (%s, %s, %s, %s)",
+                rows[start:start + 5000]
+            )
+        cursor.close()
+        rebuild_report_stats(case_ids, connection)
+        connection.commit()
+    finally:
+        connection.close()
+    return usernames
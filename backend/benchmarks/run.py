@@ -0,0 +1,189 @@
+"""压测入口
+
+在 backend 目录下运行：
+    python -m benchmarks.run --scale small --duration 30 --concurrency 8 --save benchmarks/baselines/small.json
+    python -m benchmarks.run --scale small --baseline benchmarks/baselines/small.json
+
+需要一个 MySQL 兼容的数据库（DB_HOST / DB_PORT / DB_USER / DB_PASSWORD），
+压测会删除并重建 --db-name 指定的库，不会使用 DB_NAME 中的业务数据。
+"""
+import os
+import sys
+import json
+import math
+import shutil
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_WORK_DIR = os.path.join(BACKEND_DIR, 'benchmarks', '.work')
+
+
+def percentile(sorted_values, p):
+    """最近秩法百分位数"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for name, latencies in sorted(recorder.latencies.items()):
+        values = sorted(latencies)
+        endpoints[name] = {
+            'requests': len(values),
+            'errors': recorder.errors.get(name, 0),
+            'throughput': round(len(values) / elapsed, 2),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2),
+        }
+    total = sum(e['requests'] for e in endpoints.values())
+    return {
+        'total_requests': total,
+        'total_errors': sum(e['errors'] for e in endpoints.values()),
+        'throughput': round(total / elapsed, 2),
+        'elapsed': round(elapsed, 2),
+        'endpoints': endpoints,
+    }
+
+
+def print_summary(summary):
+    print(f"{'endpoint':<20}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, e in summary['endpoints'].items():
+        print(f"{name:<20}{e['requests']:>10}{e['errors']:>8}{e['throughput']:>10}"
+              f"{e['p50_ms']:>10}{e['p95_ms']:>10}{e['p99_ms']:>10}")
+    print(f"\n共 {summary['total_requests']} 个请求，{summary['total_errors']} 个错误，"
+          f"{summary['throughput']} req/s，耗时 {summary['elapsed']} 秒")
+
+
+def compare(summary, baseline, threshold):
+    """与基线比较，返回回归项列表：p95 变慢或吞吐下降超过 threshold（比例），或出现新的错误"""
+    regressions = []
+    for name, base in baseline['endpoints'].items():
+        current = summary['endpoints'].get(name)
+        if current is None:
+            continue
+        if base['p95_ms'] > 0 and current['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {current['p95_ms']} ms")
+        if base['throughput'] > 0 and current['throughput'] < base['throughput'] * (1 - threshold):
+            regressions.append(f"{name}: 吞吐 {base['throughput']} -> {current['throughput']} req/s")
+        if current['errors'] > base['errors']:
+            regressions.append(f"{name}: 错误 {base['errors']} -> {current['errors']}")
+    return regressions
+
+
+def parse_args(argv=None):
+    from benchmarks.dataset import SCALES
+    parser = argparse.ArgumentParser(description="端到端压测")
+    parser.add_argument('--scale', choices=list(SCALES), default='small', help="数据规模")
+    parser.add_argument('--duration', type=float, default=30, help="压测时长（秒）")
+    parser.add_argument('--warmup', type=float, default=5, help="正式计时前的预热时长（秒）")
+    parser.add_argument('--concurrency', type=int, default=8, help="并发虚拟用户数")
+    parser.add_argument('--mix', help="流量构成 JSON，如 '{\"report\": 5, \"submit_score\": 1}'")
+    parser.add_argument('--url', help="压测已启动的服务；不指定时在当前进程内启动应用")
+    parser.add_argument('--db-name', default=os.getenv('BENCH_DB_NAME', 'fire_gpt_bench'), help="压测使用的数据库")
+    parser.add_argument('--work-dir', default=DEFAULT_WORK_DIR, help="合成案例目录和上传目录的位置")
+    parser.add_argument('--skip-seed', action='store_true', help="复用上次生成的数据库")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    parser.add_argument('--save', help="把结果保存为 JSON 基线")
+    parser.add_argument('--baseline', help="与该基线比较，出现回归时以非零状态退出")
+    parser.add_argument('--threshold', type=float, default=0.2, help="判定回归的比例，默认 0.2")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # 应用模块在导入时读取 CASE_DIR / DB_NAME，必须先设置环境变量
+    case_dir = os.path.join(args.work_dir, 'case_show')
+    os.makedirs(case_dir, exist_ok=True)
+    os.environ['CASE_DIR'] = case_dir
+    os.environ['DB_NAME'] = args.db_name
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-secret')
+
+    from benchmarks.dataset import SCALES, BENCH_USER_PREFIX, build_case_tree, prepare_database, seed_database
+    from benchmarks.workload import DEFAULT_MIX, InProcessClient, HttpClient, run_workload
+
+    scale = dict(SCALES[args.scale], seed=args.seed)
+    print(f"生成合成案例: {case_dir}")
+    case_ids = build_case_tree(case_dir, **scale)
+
+    if args.skip_seed:
+        usernames = [f'{BENCH_USER_PREFIX}{i}' for i in range(scale['users'])]
+    else:
+        print(f"重建数据库 {args.db_name} 并写入 {scale['users']} 个用户的评分")
+        prepare_database(args.db_name)
+        usernames = seed_database(args.db_name, case_ids, **scale)
+
+    dataset = {
+        'case_ids': case_ids,
+        'records': {c: sorted(os.listdir(os.path.join(case_dir, c, 'record'))) for c in case_ids},
+        'pictures': {c: sorted(os.listdir(os.path.join(case_dir, c, 'pic'))) for c in case_ids},
+        'search_terms': ['起火', '电动车充电', '物业', '灭火器', '凌晨', '烟头垃圾桶', '监控'],
+    }
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+
+    if args.url:
+        def client_factory():
+            return HttpClient(args.url)
+        target = args.url
+        upload_dir = None
+    else:
+        from app import create_app
+        upload_dir = tempfile.mkdtemp(prefix='uploads-', dir=args.work_dir)
+        app = create_app({'UPLOAD_FOLDER': upload_dir, 'TESTING': True})
+
+        def client_factory():
+            return InProcessClient(app)
+        target = 'in-process'
+
+    try:
+        if args.warmup > 0:
+            print(f"预热 {args.warmup} 秒")
+            run_workload(client_factory, dataset, usernames, args.warmup, args.concurrency, mix, args.seed)
+
+        print(f"压测 {target}: {args.concurrency} 并发，{args.duration} 秒")
+        recorder, elapsed = run_workload(client_factory, dataset, usernames, args.duration,
+                                         args.concurrency, mix, args.seed + 1000)
+    finally:
+        if upload_dir:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+
+    summary = summarize(recorder, elapsed)
+    summary['meta'] = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'target': target,
+        'scale': args.scale,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'mix': mix,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+    print_summary(summary)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(summary, json.load(f), args.threshold)
+        if regressions:
+            print("\n性能回归：")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\n与基线相比没有回归")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+import io
+import json
+import time
+import uuid
+import random
+import threading
+import urllib.parse
+import urllib.request
+import urllib.error
+from benchmarks.dataset import BENCH_PASSWORD
+
+# 默认流量构成：场景名 -> 权重
+DEFAULT_MIX = {
+    'login': 2,
+    'list_cases': 8,
+    'case_files': 8,
+    'report': 12,
+    'record': 12,
+    'picture_thumb': 15,
+    'graph': 4,
+    'graph_data': 4,
+    'search': 6,
+    'submit_score': 10,
+    'submit_batch': 2,
+    'user_scores': 8,
+    'user_scores_delta': 6,
+    'report_stats': 5,
+    'upload': 2,
+}
+
+
+# 需要登录的场景；未登录时先登录
+AUTH_SCENARIOS = {'submit_score', 'submit_batch', 'user_scores', 'user_scores_delta', 'report_stats'}
+
+
+class InProcessClient:
+    """通过 Flask test client 在当前进程内发请求，不经过网络"""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, json_body=None, headers=None, upload=None):
+        kwargs = {'headers': headers or {}}
+        if json_body is not None:
+            kwargs['json'] = json_body
+        if upload is not None:
+            name, content = upload
+            kwargs['data'] = {'file': (io.BytesIO(content), name)}
+            kwargs['content_type'] = 'multipart/form-data'
+        response = self._client.open(path, method=method, **kwargs)
+        body = response.get_data()
+        response.close()
+        return response.status_code, body
+
+
+class HttpClient:
+    """向已启动的服务（gunicorn 或开发服务器）发 HTTP 请求"""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, json_body=None, headers=None, upload=None):
+        headers = dict(headers or {})
+        data = None
+        if json_body is not None:
+            data = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if upload is not None:
+            name, content = upload
+            boundary = uuid.uuid4().hex
+            data = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'
+                    f'Content-Type: application/octet-stream\r\n\r\n').encode('utf-8') + content + \
+                f'\r\n--{boundary}--\r\n'.encode('utf-8')
+            headers['Content-Type'] = f'multipart/form-data; boundary={boundary}'
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+class Recorder:
+    """按场景记录每次请求的耗时和错误"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+
+class VirtualUser:
+    """一个模拟专家：登录后按权重随机执行场景"""
+
+    def __init__(self, client, recorder, username, dataset, rng):
+        self.client = client
+        self.recorder = recorder
+        self.username = username
+        self.dataset = dataset
+        self.rng = rng
+        self.token = None
+        self.cursor = ''
+
+    def _call(self, name, method, path, expect=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            status, body = self.client.request(method, path, **kwargs)
+            ok = status in expect
+        except Exception:
+            status, body, ok = None, b'', False
+        self.recorder.record(name, time.perf_counter() - started, ok)
+        return status, body
+
+    def _auth(self):
+        return {'Authorization': f'Bearer {self.token}'}
+
+    def _case(self):
+        return self.rng.choice(self.dataset['case_ids'])
+
+    def login(self):
+        status, body = self._call('login', 'POST', '/api/auth/login',
+                                  json_body={'username': self.username, 'password': BENCH_PASSWORD})
+        if status == 200:
+            self.token = json.loads(body)['token']
+
+    def list_cases(self):
+        self._call('list_cases', 'GET', '/api/cases/list')
+
+    def case_files(self):
+        self._call('case_files', 'GET', f'/api/cases/{self._case()}/files')
+
+    def report(self):
+        self._call('report', 'GET', f'/api/reports/{self._case()}/report')
+
+    def record(self):
+        case_id = self._case()
+        name = self.rng.choice(self.dataset['records'][case_id])
+        self._call('record', 'GET', f'/api/cases/{case_id}/file?' +
+                   urllib.parse.urlencode({'path': f'record/{name}'}))
+
+    def picture_thumb(self):
+        case_id = self._case()
+        name = self.rng.choice(self.dataset['pictures'][case_id])
+        self._call('picture_thumb', 'GET', f'/api/cases/{case_id}/file?' +
+                   urllib.parse.urlencode({'path': f'pic/{name}', 'size': 'thumb'}))
+
+    def graph(self):
+        self._call('graph', 'GET', f'/api/reports/{self._case()}/graph')
+
+    def graph_data(self):
+        self._call('graph_data', 'GET', f'/api/reports/{self._case()}/graph.json?limit=50')
+
+    def search(self):
+        query = self.rng.choice(self.dataset['search_terms'])
+        self._call('search', 'GET', '/api/search?' + urllib.parse.urlencode({'q': query, 'limit': 20}))
+
+    def submit_score(self):
+        self._call('submit_score', 'POST', '/api/scoring', headers=self._auth(),
+                   json_body={'report_id': self._case(), 'score': self.rng.randint(0, 100), 'comments': '压测'})
+
+    def submit_batch(self):
+        items = [{'report_id': case_id, 'score': self.rng.randint(0, 100)}
+                 for case_id in self.rng.sample(self.dataset['case_ids'], min(10, len(self.dataset['case_ids'])))]
+        self._call('submit_batch', 'POST', '/api/scoring/batch', headers=self._auth(), json_body=items)
+
+    def user_scores(self):
+        self._call('user_scores', 'GET', '/api/user_scores', headers=self._auth())
+
+    def user_scores_delta(self):
+        status, body = self._call('user_scores_delta', 'GET', '/api/user_scores?' +
+                                  urllib.parse.urlencode({'since': self.cursor}), headers=self._auth())
+        if status == 200:
+            self.cursor = json.loads(body)['cursor']
+
+    def report_stats(self):
+        self._call('report_stats', 'GET', f'/api/scoring/{self._case()}/stats', headers=self._auth())
+
+    def upload(self):
+        content = self.rng.randbytes(self.rng.randint(16, 256) * 1024)
+        self._call('upload', 'POST', '/api/upload', upload=(f'bench_{uuid.uuid4().hex[:8]}.pdf', content))
+
+    def run(self, deadline, mix):
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        self.login()
+        while time.monotonic() < deadline:
+            name = self.rng.choices(names, weights)[0]
+            if name in AUTH_SCENARIOS and self.token is None:
+                name = 'login'
+            getattr(self, name)()
+
+
+def run_workload(client_factory, dataset, usernames, duration, concurrency, mix=None, seed=0):
+    """并发运行 concurrency 个虚拟用户 duration 秒，返回 (Recorder, 实际耗时)"""
+    mix = mix or DEFAULT_MIX
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    threads = []
+    for i in range(concurrency):
+        user = VirtualUser(client_factory(), recorder, usernames[i % len(usernames)],
+                           dataset, random.Random(seed + i))
+        threads.append(threading.Thread(target=user.run, args=(deadline, mix), daemon=True))
+
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.monotonic() - started
@@ -0,0 +1,28 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _env_bool(name, default='0'):
+    return os.getenv(name, default).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class Config:
+    """Flask 配置，均可通过环境变量覆盖"""
+
+    SECRET_KEY = os.getenv('SECRET_KEY')
+    DEBUG = _env_bool('FLASK_DEBUG')
+
+    # 文件上传目录，相对路径相对于 backend 目录
+    UPLOAD_FOLDER = os.path.join(BASE_DIR, os.getenv('UPLOAD_FOLDER') or 'uploads')
+    # 单次请求大小上限，默认5MB，更大的文件使用 /api/upload/init 分片上传
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', str(5 * 1024 * 1024)))
+
+    # 允许跨域访问 /api/* 的前端地址，多个用逗号分隔，* 表示不限制
+    CORS_ORIGINS = [origin.strip() for origin in os.getenv('CORS_ORIGINS', '*').split(',') if origin.strip()]
+
+    # 创建应用时预先建立案例目录索引
+    WARM_CASE_CATALOG = _env_bool('WARM_CASE_CATALOG', '1')
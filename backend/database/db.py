@@ -1,45 +1,319 @@
 import mysql.connector
 from mysql.connector import Error
 import os
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from utils.metrics import observe_query
 
 # 加载环境变量
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# 连接池配置（均可通过环境变量覆盖）
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))                     # 最大连接数
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))              # 等待空闲连接的最长秒数
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')) # 连接最长存活秒数，超过后回收重建
+DB_POOL_PING_INTERVAL = float(os.getenv('DB_POOL_PING_INTERVAL', '30')) # 空闲超过该秒数的连接借出前先做健康检查
+
+# stream_query 每次从服务器读取的行数
+DB_STREAM_BATCH_SIZE = int(os.getenv('DB_STREAM_BATCH_SIZE', '1000'))
+
+
 def get_db_connection():
     try:
         connection = mysql.connector.connect(
             host=os.getenv('DB_HOST'),
+            port=int(os.getenv('DB_PORT', '3306')),
             user=os.getenv('DB_USER'),
             password=os.getenv('DB_PASSWORD'),
             database=os.getenv('DB_NAME')
         )
         return connection
     except Error as e:
-        print(f"Error connecting to MySQL database: {e}")
+        logger.error("Error connecting to MySQL database: %s", e)
         return None
 
-def execute_query(query, params=None):
-    connection = get_db_connection()
-    if connection is None:
-        return False, "Database connection failed"
-    
+
+class _PooledConnection:
+    """连接池中的一条连接及其创建、最近使用时间"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """有界、线程安全的 MySQL 连接池
+
+    - 最多同时借出 size 条连接，超出时等待 timeout 秒后放弃
+    - 超过 max_lifetime 的连接在归还或借出时关闭重建
+    - 空闲超过 ping_interval 的连接借出前先 ping，失效则丢弃重连
+    """
+
+    def __init__(self, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 max_lifetime=DB_POOL_MAX_LIFETIME, ping_interval=DB_POOL_PING_INTERVAL,
+                 connect=get_db_connection):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self._connect = connect
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._closed = False
+
+    def _expired(self, item):
+        return self.max_lifetime > 0 and time.monotonic() - item.created_at > self.max_lifetime
+
+    def _healthy(self, item):
+        if time.monotonic() - item.last_used < self.ping_interval:
+            return True
+        try:
+            item.connection.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    @staticmethod
+    def _discard(item):
+        try:
+            item.connection.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """借出一条可用连接，池已耗尽或无法连接数据库时返回 None"""
+        if self._closed or not self._slots.acquire(timeout=self.timeout):
+            return None
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    break
+                if not self._expired(item) and self._healthy(item):
+                    return item
+                self._discard(item)
+
+            connection = self._connect()
+            if connection is None:
+                self._slots.release()
+                return None
+            return _PooledConnection(connection)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, item, discard=False):
+        """归还连接；出错的连接、已过期的连接直接关闭"""
+        try:
+            if not discard and not self._closed and not self._expired(item):
+                try:
+                    # 结束只读查询遗留的隐式事务，避免下次借出时读到旧快照
+                    if item.connection.in_transaction:
+                        item.connection.rollback()
+                    item.last_used = time.monotonic()
+                    with self._lock:
+                        self._idle.append(item)
+                    return
+                except Error:
+                    pass
+            self._discard(item)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """关闭所有空闲连接，之后不再借出新连接"""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for item in idle:
+            self._discard(item)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """获取当前进程的连接池；fork 出的子进程会重新创建自己的连接池"""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool()
+                _pool_pid = pid
+    return _pool
+
+
+def close_pool():
+    """关闭当前进程的连接池"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+        _pool_pid = None
+
+
+@contextmanager
+def pooled_connection():
+    """从连接池借出一个连接，with 块结束后自动归还；数据库不可用时得到 None"""
+    pool = get_pool()
+    item = pool.acquire()
+    if item is None:
+        yield None
+        return
+    broken = False
+    try:
+        yield item.connection
+    except Error:
+        broken = True
+        raise
+    finally:
+        pool.release(item, discard=broken)
+
+
+@contextmanager
+def transaction():
+    """在同一连接上执行多条语句，全部成功后提交，发生异常则回滚
+
+    用法：
+        with transaction() as conn:
+            execute_query("UPDATE ...", params, connection=conn)
+            execute_query("INSERT ...", params, connection=conn)
+    """
+    with pooled_connection() as connection:
+        if connection is None:
+            raise Error("Database connection failed")
+        try:
+            yield connection
+            connection.commit()
+        except Exception:
+            try:
+                connection.rollback()
+            except Error:
+                pass
+            raise
+
+
+def _run(connection, query, params, commit):
     cursor = connection.cursor(dictionary=True)
+    started = time.perf_counter()
+    error = True
     try:
         if params:
             cursor.execute(query, params)
         else:
             cursor.execute(query)
-        
+
         if query.strip().upper().startswith(('SELECT', 'SHOW')):
             result = cursor.fetchall()
+            error = False
             return True, result
         else:
-            connection.commit()
+            if commit:
+                connection.commit()
+            error = False
             return True, cursor.lastrowid
-            
-    except Error as e:
-        return False, str(e)
     finally:
         cursor.close()
-        connection.close()
+        observe_query(query, time.perf_counter() - started, error)
+
+
+def execute_query(query, params=None, connection=None):
+    """执行一条 SQL，返回 (success, result)
+
+    不传 connection 时从连接池借出连接并自动提交；
+    传入 transaction() 得到的连接时在该事务中执行，由事务统一提交。
+    事务中的语句出错会抛出异常，以便整个事务回滚。
+    """
+    if connection is not None:
+        return _run(connection, query, params, commit=False)
+
+    with pooled_connection() as connection:
+        if connection is None:
+            return False, "Database connection failed"
+        try:
+            return _run(connection, query, params, commit=True)
+        except Error as e:
+            try:
+                connection.rollback()
+            except Error:
+                pass
+            return False, str(e)
+
+
+def execute_many(query, seq_params, connection=None):
+    """用 executemany 批量执行同一条语句，返回 (success, rowcount)
+
+    INSERT 语句会被驱动改写为一条多行 INSERT，只需一次往返。
+    connection 的用法与 execute_query 相同。
+    """
+    def run(conn, commit):
+        cursor = conn.cursor()
+        started = time.perf_counter()
+        error = True
+        try:
+            cursor.executemany(query, seq_params)
+            if commit:
+                conn.commit()
+            error = False
+            return True, cursor.rowcount
+        finally:
+            cursor.close()
+            observe_query(query, time.perf_counter() - started, error)
+
+    if connection is not None:
+        return run(connection, commit=False)
+
+    with pooled_connection() as connection:
+        if connection is None:
+            return False, "Database connection failed"
+        try:
+            return run(connection, commit=True)
+        except Error as e:
+            try:
+                connection.rollback()
+            except Error:
+                pass
+            return False, str(e)
+
+
+def stream_query(query, params=None, batch_size=DB_STREAM_BATCH_SIZE):
+    """逐行产出 SELECT 结果的生成器，用于导出等大结果集
+
+    使用不缓冲的游标按 batch_size 分批 fetchmany，内存中最多保留一批数据。
+    遍历期间一直占用一条连接；生成器未读完就被关闭时该连接的结果集未读尽，
+    直接丢弃而不放回连接池。数据库不可用或查询出错时抛出 Error。
+    """
+    pool = get_pool()
+    item = pool.acquire()
+    if item is None:
+        raise Error("Database connection failed")
+
+    finished = False
+    started = time.perf_counter()
+    try:
+        cursor = item.connection.cursor(dictionary=True, buffered=False)
+        cursor.execute(query, params or ())
+        # 流式查询只统计到服务器开始返回结果为止
+        observe_query(query, time.perf_counter() - started)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+        cursor.close()
+        finished = True
+    finally:
+        pool.release(item, discard=not finished)
@@ -0,0 +1,172 @@
+"""数据库迁移
+
+在 backend 目录下运行：
+    python -m database.migrate            # 升级到最新版本（新库从零建表）
+    python -m database.migrate status     # 查看已执行和待执行的迁移
+    python -m database.migrate check      # 对热点语句执行 EXPLAIN，发现全表扫描时以非零状态退出
+
+迁移脚本放在 database/migrations/，文件名为 <4 位版本号>_<说明>.py，定义 upgrade(cursor)。
+MySQL 的 DDL 会隐式提交，迁移中断后重新执行时会从头再跑一遍该版本，迁移必须可重复执行
+（CREATE TABLE IF NOT EXISTS、ensure_index 等）。
+"""
+import os
+import re
+import sys
+import argparse
+import importlib
+from database.db import get_db_connection
+from routes.auth import FIND_USER_SQL, LOGIN_USER_SQL, REHASH_PASSWORD_SQL
+from routes.scoring import AUTH_USER_SQL, GET_SCORE_SQL, USER_SCORES_SQL
+from utils.score_stats import (
+    MEDIAN_SQL, MEDIANS_SQL, SELECT_ALL_STATS_SQL, SELECT_EXTREMES_SQL, SELECT_LOCKED_STATS_SQL, SELECT_STATS_SQL,
+    SELECT_USER_SCORES_SQL
+)
+from utils.score_sync import (
+    ALL_SCORES_SQL, CHANGED_SCORES_SQL, DELETED_SCORES_SQL, PURGE_TOMBSTONES_SQL, SELECT_SCORE_FOR_DELETE_SQL
+)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE_PATTERN = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+# 多个实例同时启动时只让一个执行迁移
+MIGRATION_LOCK = 'fire_gpt_schema_migrations'
+MIGRATION_LOCK_TIMEOUT = 60
+
+# 需要走索引的热点语句：(名称, SQL, 示例参数)，直接引用接口实际执行的语句
+_IN_2 = '%s, %s'
+_SINCE = '2000-01-01 00:00:00'
+HOT_QUERIES = [
+    ('auth.register 查重', FIND_USER_SQL, ('u', 'e')),
+    ('auth.login', LOGIN_USER_SQL, ('u',)),
+    ('auth.login 重新哈希', REHASH_PASSWORD_SQL, ('h', 1, 'h')),
+    ('scoring.authenticate', AUTH_USER_SQL, (1,)),
+    ('scoring.get_score', GET_SCORE_SQL, (1, 'r')),
+    ('scoring.user_scores', USER_SCORES_SQL, (1,)),
+    ('scoring.user_scores 全量', ALL_SCORES_SQL, (1,)),
+    ('scoring.user_scores 增量', CHANGED_SCORES_SQL, (1, _SINCE)),
+    ('scoring.user_scores 墓碑', DELETED_SCORES_SQL, (1, _SINCE)),
+    ('scoring.delete_score', SELECT_SCORE_FOR_DELETE_SQL, (1, 'r')),
+    ('scoring.delete_score 清理墓碑', PURGE_TOMBSTONES_SQL, (1, 30)),
+    ('scoring.stats', SELECT_STATS_SQL, ('r',)),
+    ('scoring.stats 中位数', MEDIAN_SQL, ('r', 2, 0)),
+    ('scoring.all_stats', SELECT_ALL_STATS_SQL.format(where=f'WHERE report_id IN ({_IN_2})'), ('r', 's')),
+    ('scoring.all_stats 中位数', MEDIANS_SQL.format(where=f'WHERE report_id IN ({_IN_2})'), ('r', 's')),
+    ('scoring.submit 原分数', SELECT_USER_SCORES_SQL.format(placeholders=_IN_2), (1, 'r', 's')),
+    ('scoring.submit 统计行', SELECT_LOCKED_STATS_SQL.format(placeholders=_IN_2), ('r', 's')),
+    ('scoring.submit 极值', SELECT_EXTREMES_SQL, ('r',)),
+]
+
+
+def discover():
+    """按版本号排序的 [(version, 模块名)]"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if match:
+            migrations.append((match.group(1), filename[:-3]))
+    return sorted(migrations)
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(16) NOT NULL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    _ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(connection, target=None, log=print):
+    """执行所有未执行的迁移（或直到 target 版本），返回本次执行的版本列表"""
+    # 带缓冲的游标：迁移中的查询结果不必逐行读完就能执行下一条语句
+    cursor = connection.cursor(buffered=True)
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        raise RuntimeError("等待迁移锁超时，可能有其他进程正在执行迁移")
+    try:
+        done = applied_versions(cursor)
+        applied = []
+        for version, name in discover():
+            if version in done or (target is not None and version > target):
+                continue
+            log(f"执行迁移 {name}")
+            module = importlib.import_module(f'database.migrations.{name}')
+            module.upgrade(cursor)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            connection.commit()
+            applied.append(version)
+        return applied
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+        cursor.fetchall()
+        cursor.close()
+
+
+def check_queries(connection):
+    """对 HOT_QUERIES 执行 EXPLAIN，返回 [(名称, 表, 访问类型, 可用索引, 级别)]
+
+    没有可用索引的全表扫描为 error；有可用索引但优化器仍选择全表或全索引扫描（通常是表太小）为 warning。
+    """
+    problems = []
+    cursor = connection.cursor(dictionary=True)
+    try:
+        for name, query, params in HOT_QUERIES:
+            cursor.execute(f"EXPLAIN {query}", params)
+            for row in cursor.fetchall():
+                access = row.get('type')
+                if access not in ('ALL', 'index'):
+                    continue
+                level = 'error' if access == 'ALL' and not row.get('possible_keys') else 'warning'
+                problems.append((name, row.get('table'), access, row.get('possible_keys'), level))
+    finally:
+        cursor.close()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="数据库迁移")
+    parser.add_argument('command', nargs='?', default='upgrade', choices=['upgrade', 'status', 'check'])
+    parser.add_argument('--target', help="只升级到该版本（含）")
+    args = parser.parse_args(argv)
+
+    connection = get_db_connection()
+    if connection is None:
+        print("无法连接数据库，请检查 DB_HOST / DB_USER / DB_PASSWORD / DB_NAME")
+        return 1
+    try:
+        if args.command == 'upgrade':
+            applied = migrate(connection, args.target)
+            print(f"已执行 {len(applied)} 个迁移" if applied else "数据库已是最新版本")
+            return 0
+
+        if args.command == 'status':
+            cursor = connection.cursor(buffered=True)
+            done = applied_versions(cursor)
+            cursor.close()
+            for version, name in discover():
+                print(f"{'[x]' if version in done else '[ ]'} {name}")
+            return 0
+
+        problems = check_queries(connection)
+        for name, table, access, possible_keys, level in problems:
+            print(f"{level:<8}{name}: 表 {table} 访问类型 {access}，可用索引 {possible_keys or '无'}")
+        errors = [p for p in problems if p[-1] == 'error']
+        if errors:
+            print(f"\n{len(errors)} 条语句没有可用索引，请执行 python -m database.migrate")
+            return 1
+        print(f"检查了 {len(HOT_QUERIES)} 条语句，没有缺少索引的全表扫描")
+        return 0
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
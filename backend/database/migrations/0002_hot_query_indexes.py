@@ -0,0 +1,24 @@
+"""登录、注册和评分查询所需的索引
+
+早期手工建的库可能缺少这些唯一键，补建前先合并重复的评分（保留 id 最大的一条）。
+"""
+from database.schema import ensure_index, find_index
+
+
+def upgrade(cursor):
+    # 登录按用户名查询，注册按用户名或邮箱查重
+    ensure_index(cursor, 'users', 'username', ['username'], unique=True)
+    ensure_index(cursor, 'users', 'email', ['email'], unique=True)
+
+    # 评分 upsert 依赖 (user_id, report_id) 唯一键
+    if find_index(cursor, 'scores', ['user_id', 'report_id'], unique=True) is None:
+        cursor.execute("""
+            DELETE older FROM scores older
+            JOIN scores newer
+              ON newer.user_id = older.user_id AND newer.report_id = older.report_id AND newer.id > older.id
+        """)
+        ensure_index(cursor, 'scores', 'unique_user_report', ['user_id', 'report_id'], unique=True)
+
+    # 按报告统计和求中位数，按用户增量同步
+    ensure_index(cursor, 'scores', 'idx_report_score', ['report_id', 'score'])
+    ensure_index(cursor, 'scores', 'idx_user_updated', ['user_id', 'updated_at'])
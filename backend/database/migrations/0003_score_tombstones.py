@@ -0,0 +1,14 @@
+"""已删除评分的墓碑，供 /api/user_scores?since= 增量同步返回删除"""
+
+
+def upgrade(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS score_tombstones (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            report_id VARCHAR(100) NOT NULL,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY unique_user_report (user_id, report_id),
+            KEY idx_user_deleted (user_id, deleted_at)
+        )
+    """)
@@ -0,0 +1,37 @@
+"""每个报告的评分汇总表，并根据已有评分生成汇总"""
+
+BUCKETS = 10
+
+
+def upgrade(cursor):
+    # 分数直方图：bucket_0 为 0-9 分 …… bucket_9 为 90-100 分
+    buckets = ', '.join(f'bucket_{i} INT NOT NULL DEFAULT 0' for i in range(BUCKETS))
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS report_score_stats (
+            report_id VARCHAR(100) NOT NULL PRIMARY KEY,
+            score_count INT NOT NULL DEFAULT 0,
+            score_sum BIGINT NOT NULL DEFAULT 0,
+            score_sum_sq BIGINT NOT NULL DEFAULT 0,
+            score_min INT,
+            score_max INT,
+            {buckets},
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+
+    columns = ', '.join(f'bucket_{i}' for i in range(BUCKETS))
+    sums = ', '.join(f'SUM(LEAST(score DIV 10, 9) = {i})' for i in range(BUCKETS))
+    updates = ', '.join(f'bucket_{i} = VALUES(bucket_{i})' for i in range(BUCKETS))
+    cursor.execute(f"""
+        INSERT INTO report_score_stats (report_id, score_count, score_sum, score_sum_sq, score_min, score_max, {columns})
+        SELECT report_id, COUNT(*), SUM(score), SUM(score * score), MIN(score), MAX(score), {sums}
+        FROM scores
+        GROUP BY report_id
+        ON DUPLICATE KEY UPDATE
+            score_count = VALUES(score_count),
+            score_sum = VALUES(score_sum),
+            score_sum_sq = VALUES(score_sum_sq),
+            score_min = VALUES(score_min),
+            score_max = VALUES(score_max),
+            {updates}
+    """)
@@ -0,0 +1,46 @@
+"""迁移中使用的表结构辅助函数，均基于 information_schema 查询当前库"""
+
+
+def table_exists(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,)
+    )
+    return cursor.fetchone() is not None
+
+
+def list_indexes(cursor, table):
+    """返回 {索引名: (是否唯一, (列, ...))}"""
+    cursor.execute(
+        """SELECT INDEX_NAME, NON_UNIQUE, COLUMN_NAME
+           FROM information_schema.STATISTICS
+           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+           ORDER BY INDEX_NAME, SEQ_IN_INDEX""",
+        (table,)
+    )
+    indexes = {}
+    for name, non_unique, column in cursor.fetchall():
+        unique, columns = indexes.get(name, (not non_unique, ()))
+        indexes[name] = (unique, columns + (column,))
+    return indexes
+
+
+def find_index(cursor, table, columns, unique=False):
+    """查找以 columns 为前缀的索引（要求唯一时必须列完全相同），返回索引名或 None"""
+    columns = tuple(columns)
+    for name, (is_unique, index_columns) in list_indexes(cursor, table).items():
+        if unique:
+            if is_unique and index_columns == columns:
+                return name
+        elif index_columns[:len(columns)] == columns:
+            return name
+    return None
+
+
+def ensure_index(cursor, table, name, columns, unique=False):
+    """已有等价索引时跳过，否则创建；返回是否新建"""
+    if find_index(cursor, table, columns, unique) is not None:
+        return False
+    kind = 'UNIQUE INDEX' if unique else 'INDEX'
+    cursor.execute(f"CREATE {kind} `{name}` ON `{table}` ({', '.join(f'`{c}`' for c in columns)})")
+    return True
@@ -0,0 +1,34 @@
+import sys
+import argparse
+from database.db import stream_query
+from utils.score_export import EXPORT_FORMATS, build_export_query, iter_export
+
+def export_scores(fmt, output, report_ids=None):
+    # 边查询边写出，内存占用与表大小无关
+    query, params = build_export_query(report_ids)
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    for chunk in iter_export(counted(stream_query(query, params)), fmt):
+        output.write(chunk)
+    output.flush()
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出评分记录")
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv', help="导出格式")
+    parser.add_argument('--output', '-o', help="输出文件，默认输出到标准输出")
+    parser.add_argument('--report-id', action='append', help="只导出指定报告，可重复")
+    args = parser.parse_args()
+
+    if args.output:
+        with open(args.output, 'wb') as f:
+            total = export_scores(args.format, f, args.report_id)
+    else:
+        total = export_scores(args.format, sys.stdout.buffer, args.report_id)
+    print(f"已导出 {total} 条评分记录", file=sys.stderr)
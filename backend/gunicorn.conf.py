@@ -0,0 +1,71 @@
+import os
+import multiprocessing
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 监听地址
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# worker 模型：默认 gthread（每个进程多个线程），/api/scoring/stream 的每个连接会占用一个线程；
+# 安装 gevent 后可设为 gevent 以支持大量长连接
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('GUNICORN_WORKERS', str(multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+
+# 超时与优雅退出：收到 SIGTERM 后最多等待 graceful_timeout 秒让进行中的请求完成
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# 处理一定数量请求后重启 worker，防止内存缓慢增长
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '10000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '1000'))
+
+# 在 master 中加载应用，worker fork 后共享已建立的案例索引等只读数据
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+# 应用自己记录带请求 ID 的 JSON 访问日志（LOG_ACCESS），gunicorn 的访问日志默认关闭
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = os.getenv('GUNICORN_ERROR_LOG', '-')
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+
+def on_starting(server):
+    # 清空上次运行留下的各 worker 指标快照
+    from utils.metrics import clear_metrics_dir
+    clear_metrics_dir()
+
+
+def post_fork(server, worker):
+    # 不使用 master 进程中可能已建立的数据库连接，每个 worker 创建自己的连接池
+    from database.db import close_pool
+    close_pool()
+
+
+def post_worker_init(worker):
+    # 收到 SIGTERM 时先结束 SSE 长连接，进行中的普通请求照常在 graceful_timeout 内完成
+    import signal
+    from utils.events import close_broker
+
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def handle_term(signum, frame):
+        close_broker()
+        if callable(handle_exit):
+            handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+
+
+def worker_exit(server, worker):
+    # worker 退出时关闭连接池中的空闲连接和密码哈希进程池，把指标合并到 retired 快照，并写完队列中的日志
+    from database.db import close_pool
+    from utils.metrics import retire_metrics
+    from utils.log_config import stop_logging
+    from utils.password_hashing import close_hash_pool
+    close_pool()
+    close_hash_pool()
+    retire_metrics()
+    stop_logging()
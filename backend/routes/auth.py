@@ -1,14 +1,29 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
 import os
+import logging
 from database.db import execute_query
+from utils.password_hashing import HashingBusy, hash_password, verify_password
+from utils.token_cache import invalidate_user
 from dotenv import load_dotenv
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 auth_bp = Blueprint('auth', __name__)
 
+FIND_USER_SQL = "SELECT id FROM users WHERE username = %s OR email = %s"
+INSERT_USER_SQL = "INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s)"
+LOGIN_USER_SQL = "SELECT id, username, password_hash FROM users WHERE username = %s"
+# 只在哈希未被并发登录改写时更新
+REHASH_PASSWORD_SQL = "UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s"
+
+def busy_response():
+    """密码哈希任务已排满时快速失败，客户端稍后重试"""
+    response = jsonify({'error': '服务繁忙，请稍后重试'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -20,10 +35,7 @@ def register():
         return jsonify({'error': '所有字段都是必填的'}), 400
 
     # 检查用户名是否已存在
-    success, result = execute_query(
-        "SELECT id FROM users WHERE username = %s OR email = %s",
-        (username, email)
-    )
+    success, result = execute_query(FIND_USER_SQL, (username, email))
     
     if not success:
         return jsonify({'error': '数据库错误'}), 500
@@ -31,12 +43,12 @@ def register():
     if result:
         return jsonify({'error': '用户名或邮箱已存在'}), 409
 
-    # 创建新用户
-    hashed_password = generate_password_hash(password)
-    success, user_id = execute_query(
-        "INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s)",
-        (username, email, hashed_password)
-    )
+    # 创建新用户（哈希在进程池中计算）
+    try:
+        hashed_password = hash_password(password)
+    except HashingBusy:
+        return busy_response()
+    success, user_id = execute_query(INSERT_USER_SQL, (username, email, hashed_password))
 
     if not success:
         return jsonify({'error': '注册失败'}), 500
@@ -53,10 +65,7 @@ def login():
         return jsonify({'error': '用户名和密码都是必填的'}), 400
 
     # 查询用户
-    success, users = execute_query(
-        "SELECT id, username, password_hash FROM users WHERE username = %s",
-        (username,)
-    )
+    success, users = execute_query(LOGIN_USER_SQL, (username,))
 
     if not success:
         return jsonify({'error': '数据库错误'}), 500
@@ -65,9 +74,21 @@ def login():
         return jsonify({'error': '用户名或密码错误'}), 401
 
     user = users[0]
-    if not check_password_hash(user['password_hash'], password):
+    try:
+        ok, new_hash = verify_password(user['password_hash'], password)
+    except HashingBusy:
+        return busy_response()
+    if not ok:
         return jsonify({'error': '用户名或密码错误'}), 401
 
+    # 哈希参数已调整时，用本次登录的明文密码重新计算并保存；并发登录时只有一个更新生效
+    if new_hash is not None:
+        success, _ = execute_query(REHASH_PASSWORD_SQL, (new_hash, user['id'], user['password_hash']))
+        if success:
+            invalidate_user(user['id'])
+        else:
+            logger.error("更新密码哈希失败: user_id=%s", user['id'])
+
     # 生成 JWT token
     token = jwt.encode({
         'user_id': user['id'],
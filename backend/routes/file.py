@@ -1,12 +1,8 @@
-from flask import Blueprint, request, jsonify, send_file
-from utils.file_handler import save_file, generate_preview
-import os
+from flask import Blueprint, request, jsonify, send_file, current_app
+from utils.file_handler import save_file, generate_preview, get_file_type, resolve_upload
 
 bp = Blueprint('file', __name__, url_prefix='/api/files')
 
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
 @bp.route('/upload', methods=['POST'])
 def upload_file():
     """上传文件"""
@@ -17,7 +13,7 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': '没有选择文件'}), 400
     
-    result = save_file(file, UPLOAD_FOLDER)
+    result = save_file(file, current_app.config['UPLOAD_FOLDER'])
     if result:
         return jsonify(result)
     return jsonify({'error': '文件上传失败'}), 400
@@ -25,11 +21,11 @@ def upload_file():
 @bp.route('/preview/<path:filename>', methods=['GET'])
 def preview_file(filename):
     """获取文件预览"""
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
-    if not os.path.exists(file_path):
+    file_path = resolve_upload(filename, current_app.config['UPLOAD_FOLDER'])
+    if file_path is None:
         return jsonify({'error': '文件不存在'}), 404
     
-    preview = generate_preview(file_path)
+    preview = generate_preview(file_path, filename)
     if preview:
         return jsonify(preview)
     return jsonify({'error': '无法生成预览'}), 400
@@ -37,8 +33,8 @@ def preview_file(filename):
 @bp.route('/download/<path:filename>', methods=['GET'])
 def download_file(filename):
     """下载文件"""
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
-    if not os.path.exists(file_path):
+    file_path = resolve_upload(filename, current_app.config['UPLOAD_FOLDER'])
+    if file_path is None:
         return jsonify({'error': '文件不存在'}), 404
     
-    return send_file(file_path, as_attachment=True)
+    return send_file(file_path, mimetype=get_file_type(filename), as_attachment=True, download_name=filename)
@@ -1,68 +1,51 @@
-from flask import Blueprint, jsonify, send_file, abort
-import os
-import json
+from flask import Blueprint, jsonify, abort, request, current_app, url_for, stream_with_context
+import hashlib
 import logging
+from urllib.parse import quote
+from werkzeug.utils import secure_filename
+from utils.case_catalog import CASE_DIR, IMAGE_EXTENSIONS, get_case_catalog
+from utils.json_cache import json_file_response, load_cached_json
+from utils.image_derivatives import image_response
+from utils.static_assets import dynamic_response, send_asset
+from utils.zip_stream import iter_zip, case_zip_entries
+from utils.knowledge_graph import load_case_graph
 
-# 配置日志
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 bp = Blueprint('report', __name__, url_prefix='/api')
 
-CASE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'case_show')
-logger.info(f"CASE_DIR set to: {CASE_DIR}")
-
 @bp.route('/reports')
 def get_reports():
     """获取所有案例列表"""
-    logger.info("Handling /reports request")
-    cases = []
+    logger.debug("Handling /reports request")
     try:
-        if not os.path.exists(CASE_DIR):
-            logger.error(f"CASE_DIR does not exist: {CASE_DIR}")
+        catalog = get_case_catalog()
+        if not catalog.exists():
+            logger.error("CASE_DIR does not exist: %s", CASE_DIR)
             return jsonify({'error': 'Case directory not found'}), 404
-            
-        logger.debug(f"Listing directory: {CASE_DIR}")
-        for case_name in os.listdir(CASE_DIR):
-            case_path = os.path.join(CASE_DIR, case_name)
-            logger.debug(f"Found case: {case_name}, path: {case_path}")
-            if os.path.isdir(case_path):
-                cases.append({
-                    'id': case_name,
-                    'name': f'{case_name}火灾事故'
-                })
-        logger.info(f"Found {len(cases)} cases")
+
+        cases = catalog.list_cases()
+        logger.debug("Found %s cases", len(cases))
         return jsonify(cases)
     except Exception as e:
-        logger.error(f"Error in get_reports: {str(e)}", exc_info=True)
+        logger.error("Error in get_reports: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/reports/<case_id>/files')
 def get_case_files(case_id):
     """获取案例文件列表"""
-    logger.info(f"Handling /reports/{case_id}/files request")
-    case_path = os.path.join(CASE_DIR, case_id)
-    if not os.path.exists(case_path):
-        logger.error(f"Case directory not found: {case_path}")
+    logger.debug("Handling /reports/%s/files request", case_id)
+    catalog = get_case_catalog()
+    if catalog.get_case(case_id) is None:
+        logger.warning("Case not found: %s", case_id)
         abort(404)
-        
-    pics = []
-    records = []
-    
-    # 获取图片列表
-    pic_path = os.path.join(case_path, 'pic')
-    logger.debug(f"Listing directory: {pic_path}")
-    if os.path.exists(pic_path):
-        pics = [f for f in os.listdir(pic_path) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif'))]
-        logger.info(f"Found {len(pics)} pictures")
-        
-    # 获取记录列表
-    record_path = os.path.join(case_path, 'record')
-    logger.debug(f"Listing directory: {record_path}")
-    if os.path.exists(record_path):
-        records = [f for f in os.listdir(record_path) if f.lower().endswith('.json')]
-        logger.info(f"Found {len(records)} records")
-        
+
+    pics = [entry['name'] for entry in catalog.list_files(case_id, 'pic')
+            if entry['name'].lower().endswith(IMAGE_EXTENSIONS)]
+    records = [entry['name'] for entry in catalog.list_files(case_id, 'record')
+               if entry['name'].lower().endswith('.json')]
+    logger.debug("Found %s pictures, %s records", len(pics), len(records))
+
     return jsonify({
         'pics': pics,
         'records': records
@@ -71,39 +54,196 @@ def get_case_files(case_id):
 @bp.route('/reports/<case_id>/report')
 def get_case_report(case_id):
     """获取案例报告"""
-    logger.info(f"Handling /reports/{case_id}/report request")
-    report_path = os.path.join(CASE_DIR, case_id, 'report.json')
-    if not os.path.exists(report_path):
-        logger.error(f"Report file not found: {report_path}")
+    logger.debug("Handling /reports/%s/report request", case_id)
+    report_path = get_case_catalog().local_path(case_id, 'report.json')
+    if report_path is None:
+        logger.warning("Report file not found: %s/report.json", case_id)
         abort(404)
         
-    logger.debug(f"Loading report from: {report_path}")
-    with open(report_path, 'r', encoding='utf-8') as f:
-        return jsonify(json.load(f))
+    logger.debug("Loading report from: %s", report_path)
+    return json_file_response(report_path)
 
 @bp.route('/reports/<case_id>/file/<folder>/<filename>')
 def get_case_file(case_id, folder, filename):
     """获取案例文件内容"""
-    logger.info(f"Handling /reports/{case_id}/file/{folder}/{filename} request")
-    file_path = os.path.join(CASE_DIR, case_id, folder, filename)
-    if not os.path.exists(file_path):
-        logger.error(f"File not found: {file_path}")
+    logger.debug("Handling /reports/%s/file/%s/%s request", case_id, folder, filename)
+    file_path = get_case_catalog().local_path(case_id, f'{folder}/{filename}')
+    if file_path is None:
+        logger.warning("File not found: %s/%s/%s", case_id, folder, filename)
         abort(404)
         
-    logger.debug(f"Loading file from: {file_path}")
+    logger.debug("Loading file from: %s", file_path)
     if file_path.endswith('.json'):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return jsonify(json.load(f))
-    return send_file(file_path)
+        return json_file_response(file_path)
+    if file_path.lower().endswith(IMAGE_EXTENSIONS):
+        try:
+            return image_response(file_path)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    return send_asset(file_path)
 
 @bp.route('/reports/<case_id>/graph')
 def get_case_graph(case_id):
     """获取案例知识图谱"""
-    logger.info(f"Handling /reports/{case_id}/graph request")
-    graph_path = os.path.join(CASE_DIR, case_id, 'graph.html')
-    if not os.path.exists(graph_path):
-        logger.error(f"Graph file not found: {graph_path}")
+    logger.debug("Handling /reports/%s/graph request", case_id)
+    graph_path = get_case_catalog().local_path(case_id, 'graph.html')
+    if graph_path is None:
+        logger.warning("Graph file not found: %s/graph.html", case_id)
         abort(404)
         
-    logger.debug(f"Loading graph from: {graph_path}")
-    return send_file(graph_path)
+    logger.debug("Loading graph from: %s", graph_path)
+    return send_asset(graph_path)
+
+# 知识图谱查询的上限
+GRAPH_MAX_HOPS = 3
+GRAPH_MAX_LIMIT = 1000
+
+@bp.route('/reports/<case_id>/graph.json')
+def get_case_graph_data(case_id):
+    """知识图谱的节点和边（从 graph.html 中解析，按 mtime 缓存）
+
+    参数：node 中心节点，hops 跳数（默认1，最大3），type 节点类型（逗号分隔，如 实体,别名），
+    limit、offset 按节点分页。不带参数时返回整个图谱。
+    """
+    logger.debug("Handling /reports/%s/graph.json request", case_id)
+    catalog = get_case_catalog()
+    case = catalog.get_case(case_id)
+    if case is None or case['graph'] is None:
+        logger.warning("Graph file not found: %s", case_id)
+        abort(404)
+
+    try:
+        hops = min(max(int(request.args.get('hops', 1)), 0), GRAPH_MAX_HOPS)
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = request.args.get('limit')
+        limit = min(max(int(limit), 1), GRAPH_MAX_LIMIT) if limit else None
+    except ValueError:
+        return jsonify({'error': 'hops、limit和offset必须是整数'}), 400
+    types = {t for t in request.args.get('type', '').split(',') if t}
+
+    graph_path = catalog.local_path(case_id, 'graph.html')
+    if graph_path is None:
+        abort(404)
+    try:
+        graph = load_case_graph(graph_path)
+    except OSError as e:
+        # 目录扫描之后文件被删除或替换
+        logger.warning("Graph file of %s is gone: %s", case_id, e)
+        abort(404)
+    except ValueError as e:
+        logger.error("Error parsing graph of %s: %s", case_id, e)
+        return jsonify({'error': '知识图谱解析失败'}), 500
+
+    try:
+        result = graph.query(center=request.args.get('node'), hops=hops, types=types,
+                             offset=offset, limit=limit)
+    except KeyError:
+        return jsonify({'error': '节点不存在'}), 404
+
+    etag = hashlib.sha1(f'{graph.etag}|{request.query_string.decode("latin-1")}'.encode('utf-8')).hexdigest()
+    return dynamic_response(current_app.json.dumps(result).encode('utf-8'), etag)
+
+
+# bundle 可选的字段
+BUNDLE_FIELDS = ('report', 'records', 'pics', 'graph')
+
+@bp.route('/reports/<case_id>/bundle')
+def get_case_bundle(case_id):
+    """一次返回案例的报告、全部询问记录内容、图片清单和知识图谱地址
+
+    ?fields=report,records,pics,graph 可只返回需要的部分。
+    报告和记录直接拼接 JSON 缓存中已序列化的字节，不重新解析。
+    ETag 由字段列表和每个文件的名称、版本计算，请求的 If-None-Match 匹配时不压缩响应体直接返回 304。
+    """
+    logger.debug("Handling /reports/%s/bundle request", case_id)
+    catalog = get_case_catalog()
+    case = catalog.get_case(case_id)
+    if case is None:
+        logger.warning("Case not found: %s", case_id)
+        abort(404)
+
+    fields = request.args.get('fields')
+    fields = [f for f in fields.split(',') if f in BUNDLE_FIELDS] if fields else list(BUNDLE_FIELDS)
+    dumps = current_app.json.dumps
+
+    parts = [b'{"id":', dumps(case['id']).encode('utf-8'), b',"name":', dumps(case['name']).encode('utf-8')]
+    etags = [case['id'], ','.join(fields)]
+
+    if 'report' in fields:
+        parts.append(b',"report":')
+        report_path = catalog.local_path(case_id, 'report.json') if case['report'] is not None else None
+        if report_path is not None:
+            entry = load_cached_json(report_path)
+            parts.append(entry.body.rstrip())
+            etags.append(f'report.json:{entry.etag}')
+        else:
+            parts.append(b'null')
+
+    if 'records' in fields:
+        parts.append(b',"records":{')
+        records = [name for name in case['dirs'].get('record', {}) if name.lower().endswith('.json')]
+        first = True
+        for name in records:
+            path = catalog.local_path(case_id, f'record/{name}')
+            if path is None:
+                continue
+            entry = load_cached_json(path)
+            if not first:
+                parts.append(b',')
+            first = False
+            parts.extend([dumps(name).encode('utf-8'), b':', entry.body.rstrip()])
+            etags.append(f'record/{name}:{entry.etag}')
+        parts.append(b'}')
+
+    if 'pics' in fields:
+        pics = []
+        for entry in case['dirs'].get('pic', {}).values():
+            if not entry['name'].lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            url = url_for('report.get_case_file', case_id=case_id, folder='pic', filename=entry['name'])
+            pics.append({
+                'name': entry['name'],
+                'size': entry['size'],
+                'mtime': entry['mtime'],
+                'type': entry['type'],
+                'url': url,
+                'thumb_url': f'{url}?size=thumb'
+            })
+            etags.append(f"{entry['name']}:{entry['size']}:{entry['mtime']}")
+        parts.extend([b',"pics":', dumps(pics).encode('utf-8')])
+
+    if 'graph' in fields:
+        graph = None
+        if case['graph'] is not None:
+            graph = {
+                'url': url_for('report.get_case_graph', case_id=case_id),
+                'data_url': url_for('report.get_case_graph_data', case_id=case_id),
+                'size': case['graph']['size'],
+                'mtime': case['graph']['mtime']
+            }
+            etags.append(f"graph:{case['graph']['size']}:{case['graph']['mtime']}")
+        parts.extend([b',"graph":', dumps(graph).encode('utf-8')])
+
+    parts.append(b'}\n')
+    etag = hashlib.sha1('|'.join(etags).encode('utf-8')).hexdigest()
+    return dynamic_response(b''.join(parts), etag)
+
+@bp.route('/reports/<case_id>/bundle.zip')
+def get_case_bundle_zip(case_id):
+    """以 ZIP 流的形式下载整个案例目录，边压缩边发送"""
+    logger.debug("Handling /reports/%s/bundle.zip request", case_id)
+    catalog = get_case_catalog()
+    case = catalog.get_case(case_id)
+    if case is None:
+        logger.warning("Case not found: %s", case_id)
+        abort(404)
+
+    response = current_app.response_class(
+        stream_with_context(iter_zip(case_zip_entries(catalog, case))), mimetype='application/zip'
+    )
+    # 案例名多为中文，按 RFC 6266 同时提供 ASCII 回退名和 UTF-8 文件名
+    fallback = secure_filename(case_id) or 'case'
+    response.headers['Content-Disposition'] = (
+        f"attachment; filename=\"{fallback}.zip\"; filename*=UTF-8''{quote(case_id)}.zip"
+    )
+    return response
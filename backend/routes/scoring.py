@@ -1,116 +1,292 @@
-from flask import Blueprint, request, jsonify
-from database.db import execute_query
+from flask import Blueprint, Response, request, jsonify
+from database.db import execute_query, execute_many, stream_query, transaction
+from mysql.connector import Error
+from utils.token_cache import get_token_cache, token_cache_key
+from utils.score_stats import lock_report_stats, update_report_stats, get_report_stats, get_all_stats
+from utils.score_export import EXPORT_FORMATS, build_export_query, iter_export
+from utils.score_sync import get_changes, decode_cursor, delete_score
+from utils.events import get_broker, publish_event, iter_sse
+from utils.metrics import record_cache
+from itertools import chain
 from functools import wraps
 import jwt
 import os
+import time
 from dotenv import load_dotenv
 import logging
 
-# 配置日志
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 scoring_bp = Blueprint('scoring', __name__)
 
+AUTH_USER_SQL = "SELECT id, username FROM users WHERE id = %s"
+GET_SCORE_SQL = """SELECT score, comments, created_at, updated_at
+                   FROM scores
+                   WHERE user_id = %s AND report_id = %s"""
+USER_SCORES_SQL = """SELECT report_id, score, comments
+                     FROM scores
+                     WHERE user_id = %s"""
+
+def authenticate(token):
+    """校验 token，返回 (current_user, error_response)"""
+    try:
+        # 已验证过的 token 直接使用缓存的用户信息，不再查询数据库
+        cache = get_token_cache()
+        cache_key = token_cache_key(token)
+        current_user = cache.get(cache_key)
+        record_cache('token', current_user is not None)
+
+        if current_user is None:
+            data = jwt.decode(token, os.getenv('JWT_SECRET_KEY'), algorithms=['HS256'])
+            success, users = execute_query(AUTH_USER_SQL, (data['user_id'],))
+
+            if not success or not users:
+                logger.error("用户验证失败: user_id=%s", data['user_id'])
+                return None, (jsonify({'error': '用户不存在'}), 401)
+
+            current_user = users[0]
+            cache.set(cache_key, current_user, data.get('exp'))
+    except Exception as e:
+        logger.error("Token验证失败: %s", e)
+        return None, (jsonify({'error': '无效的token'}), 401)
+
+    return current_user, None
+
+def bearer_token():
+    """从 Authorization: Bearer <token> 请求头取出 token，缺失或格式不对时返回 None"""
+    parts = request.headers.get('Authorization', '').split()
+    if len(parts) != 2 or parts[0].lower() != 'bearer':
+        return None
+    return parts[1]
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split(" ")[1]
+        token = bearer_token()
         
         if not token:
             return jsonify({'error': '未提供token'}), 401
         
-        try:
-            data = jwt.decode(token, os.getenv('JWT_SECRET_KEY'), algorithms=['HS256'])
-            success, users = execute_query(
-                "SELECT id, username FROM users WHERE id = %s",
-                (data['user_id'],)
-            )
-            
-            if not success or not users:
-                logger.error(f"用户验证失败: user_id={data['user_id']}")
-                return jsonify({'error': '用户不存在'}), 401
-                
-            current_user = users[0]
-        except Exception as e:
-            logger.error(f"Token验证失败: {str(e)}")
-            return jsonify({'error': '无效的token'}), 401
+        current_user, error = authenticate(token)
+        if error:
+            return error
         
         return f(current_user, *args, **kwargs)
     
     return decorated
 
+# 以 (user_id, report_id) 唯一键做原子 upsert，一条语句完成新增或更新
+UPSERT_SCORE_SQL = """INSERT INTO scores (user_id, report_id, score, comments)
+                      VALUES (%s, %s, %s, %s)
+                      ON DUPLICATE KEY UPDATE
+                          score = VALUES(score),
+                          comments = VALUES(comments),
+                          updated_at = CURRENT_TIMESTAMP"""
+
+# 批量评分单次请求允许的最大条目数
+MAX_BATCH_SIZE = 500
+
+def validate_score_item(item):
+    """校验一条评分数据，返回 (report_id, score, comments, error)"""
+    if not isinstance(item, dict):
+        return None, None, None, '评分数据格式错误'
+
+    report_id = item.get('report_id')
+    score = item.get('score')
+    comments = item.get('comments', '')
+
+    if not report_id or score is None:
+        return report_id, score, comments, '缺少必要参数'
+
+    if not isinstance(score, int) or isinstance(score, bool) or score < 0 or score > 100:
+        return report_id, score, comments, '分数必须是0-100之间的整数'
+
+    return report_id, score, comments, None
+
+def publish_score_event(action, current_user, report_id, score=None):
+    """评分写入提交后推送给 /api/scoring/stream 的订阅者"""
+    publish_event({
+        'type': 'score',
+        'action': action,
+        'report_id': report_id,
+        'user_id': current_user['id'],
+        'username': current_user['username'],
+        'score': score,
+        'time': time.time()
+    })
+
 @scoring_bp.route('/api/scoring', methods=['POST'])
 @token_required
 def submit_score(current_user):
     try:
         data = request.get_json()
-        report_id = data.get('report_id')
-        score = data.get('score')
-        comments = data.get('comments', '')
-        
-        logger.debug(f"收到评分请求: user_id={current_user['id']}, report_id={report_id}, score={score}")
-        
-        if not all([report_id, score]):
-            return jsonify({'error': '缺少必要参数'}), 400
-            
-        if not isinstance(score, int) or score < 0 or score > 100:
-            return jsonify({'error': '分数必须是0-100之间的整数'}), 400
-        
-        # 检查是否已有评分记录
-        success, existing = execute_query(
-            "SELECT id FROM scores WHERE user_id = %s AND report_id = %s",
-            (current_user['id'], report_id)
-        )
-        
-        if not success:
-            logger.error("检查已有评分记录失败")
-            return jsonify({'error': '数据库查询失败'}), 500
-        
-        if existing:
-            # 更新评分
-            logger.debug(f"更新评分记录: user_id={current_user['id']}, report_id={report_id}")
-            success, _ = execute_query(
-                """UPDATE scores 
-                   SET score = %s, comments = %s, updated_at = CURRENT_TIMESTAMP 
-                   WHERE user_id = %s AND report_id = %s""",
-                (score, comments, current_user['id'], report_id)
-            )
-        else:
-            # 新增评分
-            logger.debug(f"创建新评分记录: user_id={current_user['id']}, report_id={report_id}")
-            success, _ = execute_query(
-                """INSERT INTO scores (user_id, report_id, score, comments) 
-                   VALUES (%s, %s, %s, %s)""",
-                (current_user['id'], report_id, score, comments)
-            )
-        
-        if not success:
-            logger.error("保存评分记录失败")
+        report_id, score, comments, error = validate_score_item(data)
+
+        logger.debug("收到评分请求: user_id=%s, report_id=%s, score=%s", current_user['id'], report_id, score)
+
+        if error:
+            return jsonify({'error': error}), 400
+
+        try:
+            with transaction() as connection:
+                stats, old_scores = lock_report_stats(current_user['id'], [report_id], connection)
+                execute_query(UPSERT_SCORE_SQL, (current_user['id'], report_id, score, comments),
+                              connection=connection)
+                update_report_stats(stats, old_scores, {report_id: score}, connection)
+        except Error as e:
+            logger.error("保存评分记录失败: %s", e)
             return jsonify({'error': '评分提交失败'}), 500
-            
+
+        publish_score_event('submit', current_user, report_id, score)
         return jsonify({'message': '评分提交成功'}), 200
     except Exception as e:
-        logger.error(f"评分提交过程中发生错误: {str(e)}")
+        logger.error("评分提交过程中发生错误: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@scoring_bp.route('/api/scoring/batch', methods=['POST'])
+@token_required
+def submit_score_batch(current_user):
+    """批量提交评分
+
+    请求体为评分数组，或 {"items": [...]}；每项包含 report_id、score、comments。
+    所有合法条目在一个事务内用一次 executemany 写入，返回逐条结果。
+    """
+    try:
+        data = request.get_json()
+        items = data.get('items') if isinstance(data, dict) else data
+
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': '缺少评分数据'}), 400
+
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'单次最多提交{MAX_BATCH_SIZE}条评分'}), 400
+
+        results = []
+        rows = []
+        for index, item in enumerate(items):
+            report_id, score, comments, error = validate_score_item(item)
+            if error:
+                results.append({'index': index, 'report_id': report_id, 'success': False, 'error': error})
+                continue
+            results.append({'index': index, 'report_id': report_id, 'success': True})
+            rows.append((current_user['id'], report_id, score, comments))
+
+        logger.debug("收到批量评分请求: user_id=%s, total=%s, valid=%s", current_user['id'], len(items), len(rows))
+
+        if rows:
+            try:
+                with transaction() as connection:
+                    stats, old_scores = lock_report_stats(current_user['id'], [row[1] for row in rows], connection)
+                    execute_many(UPSERT_SCORE_SQL, rows, connection=connection)
+                    # 同一报告出现多次时以最后一条为准，与 upsert 的结果一致
+                    update_report_stats(stats, old_scores, {row[1]: row[2] for row in rows}, connection)
+            except Error as e:
+                logger.error("批量保存评分记录失败: %s", e)
+                for result in results:
+                    if result['success']:
+                        result['success'] = False
+                        result['error'] = '评分提交失败'
+                return jsonify({'saved': 0, 'failed': len(results), 'results': results}), 500
+
+        for _, report_id, score, _ in rows:
+            publish_score_event('submit', current_user, report_id, score)
+
+        saved = len(rows)
+        return jsonify({'saved': saved, 'failed': len(results) - saved, 'results': results}), 200
+    except Exception as e:
+        logger.error("批量评分提交过程中发生错误: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@scoring_bp.route('/api/scoring/stats', methods=['GET'])
+@token_required
+def get_scores_stats(current_user):
+    """所有报告的评分统计，可用 ?report_id=a&report_id=b 只取部分报告"""
+    try:
+        report_ids = request.args.getlist('report_id')
+        success, stats = get_all_stats(report_ids)
+
+        if not success:
+            logger.error("获取评分统计失败: %s", stats)
+            return jsonify({'error': '获取评分统计失败'}), 500
+
+        return jsonify(stats), 200
+    except Exception as e:
+        logger.error("获取评分统计时发生错误: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@scoring_bp.route('/api/scoring/stream', methods=['GET'])
+def stream_scores():
+    """以 Server-Sent Events 推送评分变化，可用 ?report_id= 只订阅部分报告
+
+    EventSource 无法设置请求头，token 也可以通过 ?token= 传入。
+    积压过多时会收到 resync 事件，客户端应重新拉取评分。
+    """
+    token = bearer_token() or request.args.get('token')
+    if not token:
+        return jsonify({'error': '未提供token'}), 401
+
+    current_user, error = authenticate(token)
+    if error:
+        return error
+
+    broker = get_broker()
+    logger.debug("评分事件订阅: user_id=%s, subscribers=%s", current_user['id'], broker.subscriber_count)
+    return Response(iter_sse(broker, request.args.getlist('report_id')), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@scoring_bp.route('/api/scoring/export', methods=['GET'])
+@token_required
+def export_scores(current_user):
+    """流式导出评分（含评分人），?format=csv|ndjson，可用 ?report_id= 指定报告"""
+    try:
+        fmt = request.args.get('format', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'error': '不支持的导出格式'}), 400
+
+        query, params = build_export_query(request.args.getlist('report_id'))
+        rows = stream_query(query, params)
+        # 先取出第一行，让连接或查询错误在返回响应头之前暴露出来
+        try:
+            first = next(rows, None)
+        except Error as e:
+            logger.error("导出评分失败: %s", e)
+            return jsonify({'error': '导出评分失败'}), 500
+        if first is not None:
+            rows = chain([first], rows)
+
+        logger.debug("导出评分: user_id=%s, format=%s", current_user['id'], fmt)
+        return Response(iter_export(rows, fmt), content_type=EXPORT_FORMATS[fmt],
+                        headers={'Content-Disposition': f'attachment; filename=scores.{fmt}'})
+    except Exception as e:
+        logger.error("导出评分时发生错误: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@scoring_bp.route('/api/scoring/<report_id>/stats', methods=['GET'])
+@token_required
+def get_report_score_stats(current_user, report_id):
+    """单个报告的评分统计：人数、均值、中位数、标准差、直方图和评分一致性"""
+    try:
+        success, stats = get_report_stats(report_id)
+
+        if not success:
+            logger.error("获取评分统计失败: report_id=%s", report_id)
+            return jsonify({'error': '获取评分统计失败'}), 500
+
+        return jsonify(stats), 200
+    except Exception as e:
+        logger.error("获取评分统计时发生错误: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @scoring_bp.route('/api/scoring/<report_id>', methods=['GET'])
 @token_required
 def get_score(current_user, report_id):
     try:
-        success, scores = execute_query(
-            """SELECT score, comments, created_at, updated_at 
-               FROM scores 
-               WHERE user_id = %s AND report_id = %s""",
-            (current_user['id'], report_id)
-        )
+        success, scores = execute_query(GET_SCORE_SQL, (current_user['id'], report_id))
         
         if not success:
-            logger.error(f"获取评分记录失败: user_id={current_user['id']}, report_id={report_id}")
+            logger.error("获取评分记录失败: user_id=%s, report_id=%s", current_user['id'], report_id)
             return jsonify({'error': '获取评分失败'}), 500
             
         if not scores:
@@ -118,27 +294,63 @@ def get_score(current_user, report_id):
             
         return jsonify(scores[0]), 200
     except Exception as e:
-        logger.error(f"获取评分记录时发生错误: {str(e)}")
+        logger.error("获取评分记录时发生错误: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@scoring_bp.route('/api/scoring/<report_id>', methods=['DELETE'])
+@token_required
+def remove_score(current_user, report_id):
+    """删除当前用户对某报告的评分，并留下墓碑供增量同步"""
+    try:
+        try:
+            with transaction() as connection:
+                stats, old_scores = lock_report_stats(current_user['id'], [report_id], connection)
+                deleted = delete_score(current_user['id'], report_id, connection)
+                update_report_stats(stats, old_scores, {report_id: None}, connection)
+        except Error as e:
+            logger.error("删除评分记录失败: %s", e)
+            return jsonify({'error': '删除评分失败'}), 500
+
+        if not deleted:
+            return jsonify({'message': '未找到评分记录'}), 404
+
+        publish_score_event('delete', current_user, report_id)
+        return jsonify({'message': '评分已删除'}), 200
+    except Exception as e:
+        logger.error("删除评分记录时发生错误: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @scoring_bp.route('/api/user_scores', methods=['GET'])
 @token_required
 def get_user_scores(current_user):
-    """获取当前用户的所有评分记录"""
+    """获取当前用户的所有评分记录
+
+    带 since 参数时增量返回 {"full", "changed", "deleted", "cursor"}：
+    since 为空表示首次同步，之后传入上次返回的 cursor 只获取变化的记录。
+    """
     try:
-        success, scores = execute_query(
-            """SELECT report_id, score, comments 
-               FROM scores 
-               WHERE user_id = %s""",
-            (current_user['id'],)
-        )
+        if 'since' in request.args:
+            since = request.args.get('since')
+            try:
+                since = decode_cursor(since) if since else None
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+            success, changes = get_changes(current_user['id'], since)
+            if not success:
+                logger.error("获取增量评分失败: user_id=%s", current_user['id'])
+                return jsonify({'error': '获取评分列表失败'}), 500
+
+            return jsonify(changes), 200
+
+        success, scores = execute_query(USER_SCORES_SQL, (current_user['id'],))
         
         if not success:
-            logger.error(f"获取用户评分列表失败: user_id={current_user['id']}")
+            logger.error("获取用户评分列表失败: user_id=%s", current_user['id'])
             return jsonify({'error': '获取评分列表失败'}), 500
             
         return jsonify(scores), 200
         
     except Exception as e:
-        logger.error(f"获取用户评分列表时发生错误: {str(e)}")
+        logger.error("获取用户评分列表时发生错误: %s", e)
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,39 @@
+import logging
+from flask import Blueprint, jsonify, request
+from utils.search_index import get_search_index
+
+logger = logging.getLogger(__name__)
+
+search_bp = Blueprint('search', __name__, url_prefix='/api')
+
+MAX_SEARCH_LIMIT = 100
+SEARCH_KINDS = ('dialogue', 'record_info', 'report')
+
+
+@search_bp.route('/search', methods=['GET'])
+def search():
+    """在询问记录和报告中全文检索
+
+    参数：q 查询词，case 限定案例，kind 限定类型（dialogue/record_info/report），limit、offset 分页
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': '缺少查询参数q'}), 400
+
+        kind = request.args.get('kind')
+        if kind and kind not in SEARCH_KINDS:
+            return jsonify({'error': '不支持的类型'}), 400
+
+        try:
+            limit = min(max(int(request.args.get('limit', 20)), 1), MAX_SEARCH_LIMIT)
+            offset = max(int(request.args.get('offset', 0)), 0)
+        except ValueError:
+            return jsonify({'error': 'limit和offset必须是整数'}), 400
+
+        total, hits = get_search_index().search(query, case_id=request.args.get('case'),
+                                                kind=kind, limit=limit, offset=offset)
+        return jsonify({'query': query, 'total': total, 'hits': hits})
+    except Exception as e:
+        logger.error("Error in search: %s", e, exc_info=True)
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,83 @@
+from flask import Blueprint, request, jsonify, current_app
+from utils.file_handler import allowed_file
+from utils.chunked_upload import (
+    UploadError, init_upload, get_status, write_chunk, finalize_upload, abort_upload
+)
+
+upload_bp = Blueprint('upload', __name__, url_prefix='/api/upload')
+
+
+def _error_response(e):
+    return jsonify({'error': str(e), **e.extra}), e.status
+
+
+@upload_bp.route('/init', methods=['POST'])
+def init():
+    """创建分片上传会话
+
+    请求体：{"filename": "...", "size": 总字节数, "sha256": "可选，用于秒传和完成时校验"}
+    """
+    try:
+        data = request.get_json() or {}
+        filename = data.get('filename')
+        if not filename or not allowed_file(filename):
+            return jsonify({'error': '不支持的文件类型'}), 400
+
+        status = init_upload(current_app.config['UPLOAD_FOLDER'], filename,
+                             data.get('size'), data.get('sha256'))
+        # 服务器已有相同内容时直接完成（秒传）
+        if status.get('complete'):
+            return jsonify(status), 200
+        return jsonify(status), 201
+    except UploadError as e:
+        return _error_response(e)
+    except (TypeError, ValueError):
+        return jsonify({'error': '参数格式错误'}), 400
+
+
+@upload_bp.route('/<upload_id>', methods=['GET'])
+def status(upload_id):
+    """查询上传进度，断线后根据返回的 offset 续传"""
+    try:
+        return jsonify(get_status(current_app.config['UPLOAD_FOLDER'], upload_id))
+    except UploadError as e:
+        return _error_response(e)
+
+
+@upload_bp.route('/<upload_id>', methods=['PUT'])
+def put_chunk(upload_id):
+    """在 offset 处写入一个分片，请求体为原始字节
+
+    offset 通过查询参数 ?offset= 或请求头 Upload-Offset 指定。
+    """
+    try:
+        offset = request.args.get('offset', request.headers.get('Upload-Offset'))
+        if offset is None:
+            return jsonify({'error': '缺少offset参数'}), 400
+
+        new_offset = write_chunk(current_app.config['UPLOAD_FOLDER'], upload_id,
+                                 int(offset), request.stream)
+        return jsonify({'upload_id': upload_id, 'offset': new_offset})
+    except UploadError as e:
+        return _error_response(e)
+    except ValueError:
+        return jsonify({'error': 'offset必须是整数'}), 400
+
+
+@upload_bp.route('/<upload_id>/finalize', methods=['POST'])
+def finalize(upload_id):
+    """校验并完成上传，返回与普通上传相同的文件信息"""
+    try:
+        return jsonify(finalize_upload(current_app.config['UPLOAD_FOLDER'], upload_id))
+    except UploadError as e:
+        return _error_response(e)
+
+
+@upload_bp.route('/<upload_id>', methods=['DELETE'])
+def abort(upload_id):
+    """取消上传"""
+    try:
+        abort_upload(current_app.config['UPLOAD_FOLDER'], upload_id)
+        return jsonify({'message': '上传已取消'})
+    except UploadError as e:
+        return _error_response(e)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 测试从 backend 目录导入模块（与 app.py 的导入方式一致）
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
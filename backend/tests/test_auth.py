@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+import pytest
+from flask import Flask
+from routes import auth
+from utils.password_hashing import HashingBusy
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv('JWT_SECRET_KEY', 'test-secret')
+    app = Flask(__name__)
+    app.register_blueprint(auth.auth_bp, url_prefix='/api/auth')
+    return app.test_client()
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """替换 execute_query，记录执行的 SQL，按 SQL 返回预设结果"""
+    calls = []
+    results = {}
+
+    def execute_query(query, params=None):
+        calls.append((query, params))
+        return results.get(query, (True, []))
+
+    monkeypatch.setattr(auth, 'execute_query', execute_query)
+    return SimpleNamespace(calls=calls, results=results)
+
+
+USER = {'id': 7, 'username': 'alice', 'password_hash': 'pbkdf2:sha256:1000$salt$old'}
+
+
+def test_login_rehashes_outdated_password(client, queries, monkeypatch):
+    invalidated = []
+    queries.results[auth.LOGIN_USER_SQL] = (True, [USER])
+    queries.results[auth.REHASH_PASSWORD_SQL] = (True, 1)
+    monkeypatch.setattr(auth, 'verify_password', lambda stored, password: (True, 'scrypt:32768:8:1$new$hash'))
+    monkeypatch.setattr(auth, 'invalidate_user', invalidated.append)
+
+    response = client.post('/api/auth/login', json={'username': 'alice', 'password': 'secret'})
+    assert response.status_code == 200
+    assert (auth.REHASH_PASSWORD_SQL, ('scrypt:32768:8:1$new$hash', 7, USER['password_hash'])) in queries.calls
+    assert invalidated == [7]
+
+
+def test_login_skips_rehash_when_hash_is_current(client, queries, monkeypatch):
+    queries.results[auth.LOGIN_USER_SQL] = (True, [USER])
+    monkeypatch.setattr(auth, 'verify_password', lambda stored, password: (True, None))
+
+    response = client.post('/api/auth/login', json={'username': 'alice', 'password': 'secret'})
+    assert response.status_code == 200
+    assert [query for query, _ in queries.calls] == [auth.LOGIN_USER_SQL]
+
+
+def test_failed_rehash_update_still_logs_in(client, queries, monkeypatch):
+    invalidated = []
+    queries.results[auth.LOGIN_USER_SQL] = (True, [USER])
+    queries.results[auth.REHASH_PASSWORD_SQL] = (False, 'error')
+    monkeypatch.setattr(auth, 'verify_password', lambda stored, password: (True, 'scrypt:32768:8:1$new$hash'))
+    monkeypatch.setattr(auth, 'invalidate_user', invalidated.append)
+
+    response = client.post('/api/auth/login', json={'username': 'alice', 'password': 'secret'})
+    assert response.status_code == 200
+    assert invalidated == []
+
+
+def _busy(*args):
+    raise HashingBusy()
+
+
+def test_login_returns_503_when_hashing_is_busy(client, queries, monkeypatch):
+    queries.results[auth.LOGIN_USER_SQL] = (True, [USER])
+    monkeypatch.setattr(auth, 'verify_password', _busy)
+
+    response = client.post('/api/auth/login', json={'username': 'alice', 'password': 'secret'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_register_returns_503_when_hashing_is_busy(client, queries, monkeypatch):
+    monkeypatch.setattr(auth, 'hash_password', _busy)
+
+    response = client.post('/api/auth/register', json={'username': 'bob', 'email': 'bob@example.com',
+                                                       'password': 'secret'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert auth.INSERT_USER_SQL not in [query for query, _ in queries.calls]
@@ -0,0 +1,137 @@
+import os
+import hashlib
+import sqlite3
+import pytest
+from utils.blob_store import BlobStore
+
+
+def _tmp_file(folder, data, name='part'):
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path, hashlib.sha256(data).hexdigest(), len(data)
+
+
+def _refcount(store, sha256):
+    conn = sqlite3.connect(store.index_path)
+    try:
+        row = conn.execute('SELECT refcount FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / 'uploads'))
+
+
+def test_store_file_moves_content_into_blob_dir(store, tmp_path):
+    src, sha, size = _tmp_file(str(tmp_path), b'hello')
+    info = store.store_file(src, sha, size, 'a.pdf')
+
+    assert not os.path.exists(src)
+    assert info['path'] == store.blob_path(sha)
+    assert info['original_name'] == 'a.pdf'
+    assert info['type'] == 'application/pdf'
+    assert store.resolve(info['filename']) == info['path']
+    assert _refcount(store, sha) == 1
+
+
+def test_same_content_is_stored_once(store, tmp_path):
+    src, sha, size = _tmp_file(str(tmp_path), b'hello')
+    first = store.store_file(src, sha, size, 'a.pdf')
+    src, _, _ = _tmp_file(str(tmp_path), b'hello')
+    second = store.store_file(src, sha, size, 'a.pdf')
+
+    assert first['filename'] != second['filename']
+    assert first['path'] == second['path']
+    assert not os.path.exists(src)
+    assert _refcount(store, sha) == 2
+    assert len(os.listdir(os.path.dirname(first['path']))) == 1
+
+
+def test_delete_keeps_content_until_last_reference(store, tmp_path):
+    src, sha, size = _tmp_file(str(tmp_path), b'hello')
+    first = store.store_file(src, sha, size, 'a.pdf')
+    second = store.add_reference(sha, 'b.pdf', size)
+
+    assert store.delete_reference(first['filename']) is True
+    assert os.path.exists(store.blob_path(sha))
+    assert store.get(first['filename']) is None
+    assert store.resolve(second['filename']) == store.blob_path(sha)
+    assert _refcount(store, sha) == 1
+
+    assert store.delete_reference(second['filename']) is True
+    assert not os.path.exists(store.blob_path(sha))
+    assert _refcount(store, sha) is None
+
+
+def test_delete_unknown_uid(store):
+    assert store.delete_reference('missing.pdf') is False
+
+
+def test_add_reference_requires_matching_content(store, tmp_path):
+    src, sha, size = _tmp_file(str(tmp_path), b'hello')
+    store.store_file(src, sha, size, 'a.pdf')
+
+    assert store.add_reference('0' * 64, 'b.pdf') is None
+    assert store.add_reference(sha, 'b.pdf', size + 1) is None
+    assert store.add_reference(sha.upper(), 'b.pdf', size)['sha256'] == sha
+
+
+def test_add_reference_after_blob_file_lost(store, tmp_path):
+    src, sha, size = _tmp_file(str(tmp_path), b'hello')
+    store.store_file(src, sha, size, 'a.pdf')
+    os.remove(store.blob_path(sha))
+
+    assert store.add_reference(sha, 'b.pdf', size) is None
+    # 重新上传相同内容时恢复文件
+    src, _, _ = _tmp_file(str(tmp_path), b'hello')
+    info = store.store_file(src, sha, size, 'b.pdf')
+    assert os.path.exists(info['path'])
+
+
+def test_uids_in_the_same_second_are_unique(store, tmp_path):
+    uids = set()
+    for i in range(3):
+        src, sha, size = _tmp_file(str(tmp_path), f'content {i}'.encode())
+        uids.add(store.store_file(src, sha, size, 'a.pdf', upload_time='20240101_120000')['filename'])
+    assert uids == {'a_20240101_120000.pdf', 'a_20240101_120000_1.pdf', 'a_20240101_120000_2.pdf'}
+
+
+def test_legacy_files_are_imported(tmp_path):
+    folder = tmp_path / 'uploads'
+    folder.mkdir()
+    (folder / 'report_20240102_030405.pdf').write_bytes(b'legacy')
+    (folder / 'report_20240102_030405_preview.png').write_bytes(b'preview')
+
+    store = BlobStore(str(folder))
+
+    info = store.get('report_20240102_030405.pdf')
+    assert info['original_name'] == 'report.pdf'
+    assert info['upload_time'] == '20240102_030405'
+    assert not (folder / 'report_20240102_030405.pdf').exists()
+    assert (folder / 'report_20240102_030405_preview.png').exists()
+    # 再次打开不会重复导入
+    assert len(BlobStore(str(folder)).list()) == 1
+
+
+def test_index_without_shared_column_is_upgraded(tmp_path):
+    folder = tmp_path / 'uploads'
+    folder.mkdir()
+    conn = sqlite3.connect(str(folder / '.index.sqlite3'))
+    conn.executescript("""
+        CREATE TABLE blobs (sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, refcount INTEGER NOT NULL);
+        CREATE TABLE files (uid TEXT PRIMARY KEY, sha256 TEXT NOT NULL, original_name TEXT NOT NULL,
+                            size INTEGER NOT NULL, type TEXT NOT NULL, upload_time TEXT NOT NULL,
+                            created_at REAL NOT NULL);
+        INSERT INTO blobs VALUES ('ab', 1, 1);
+        INSERT INTO files VALUES ('old.txt', 'ab', 'old.txt', 1, 'text/plain', '20240101_000000', 0);
+    """)
+    conn.close()
+
+    store = BlobStore(str(folder))
+    assert store.get('old.txt')['sha256'] == 'ab'
+    src, sha, size = _tmp_file(str(tmp_path), b'new')
+    assert store.store_file(src, sha, size, 'new.txt')['sha256'] == sha
@@ -0,0 +1,131 @@
+import io
+import hashlib
+import pytest
+from utils import chunked_upload
+from utils.chunked_upload import (
+    UploadError, abort_upload, finalize_upload, get_status, init_upload, store_stream, write_chunk
+)
+
+DATA = b'0123456789' * 1000
+
+
+class _FailingStream:
+    """读出 n 字节后抛出异常，模拟客户端断线"""
+
+    def __init__(self, data, n):
+        self._data = io.BytesIO(data)
+        self._left = n
+
+    def read(self, size):
+        if self._left <= 0:
+            raise ConnectionError('client disconnected')
+        block = self._data.read(min(size, self._left))
+        self._left -= len(block)
+        return block
+
+
+@pytest.fixture
+def upload_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunked_upload, 'COPY_BUFFER_SIZE', 1000)
+    chunked_upload._hashers.clear()
+    return str(tmp_path)
+
+
+def test_chunks_are_appended_in_order(upload_folder):
+    upload_id = init_upload(upload_folder, 'a.pdf', size=len(DATA))['upload_id']
+
+    assert write_chunk(upload_folder, upload_id, 0, io.BytesIO(DATA[:4000])) == 4000
+    assert write_chunk(upload_folder, upload_id, 4000, io.BytesIO(DATA[4000:])) == len(DATA)
+
+    info = finalize_upload(upload_folder, upload_id)
+    assert info['sha256'] == hashlib.sha256(DATA).hexdigest()
+    assert info['size'] == len(DATA)
+    with open(info['path'], 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_wrong_offset_returns_current_offset(upload_folder):
+    upload_id = init_upload(upload_folder, 'a.pdf', size=len(DATA))['upload_id']
+    write_chunk(upload_folder, upload_id, 0, io.BytesIO(DATA[:3000]))
+
+    with pytest.raises(UploadError) as exc:
+        write_chunk(upload_folder, upload_id, 1000, io.BytesIO(DATA[1000:2000]))
+    assert exc.value.status == 409
+    assert exc.value.extra['offset'] == 3000
+
+
+def test_interrupted_chunk_is_truncated_and_resumable(upload_folder):
+    upload_id = init_upload(upload_folder, 'a.pdf', size=len(DATA))['upload_id']
+    write_chunk(upload_folder, upload_id, 0, io.BytesIO(DATA[:2000]))
+
+    with pytest.raises(ConnectionError):
+        write_chunk(upload_folder, upload_id, 2000, _FailingStream(DATA[2000:], 2500))
+    assert get_status(upload_folder, upload_id)['offset'] == 2000
+
+    write_chunk(upload_folder, upload_id, 2000, io.BytesIO(DATA[2000:]))
+    assert finalize_upload(upload_folder, upload_id)['sha256'] == hashlib.sha256(DATA).hexdigest()
+
+
+def test_resume_after_hasher_state_is_lost(upload_folder):
+    # 换 worker 或重启后内存中没有哈希状态，需要从分片文件重建
+    upload_id = init_upload(upload_folder, 'a.pdf', size=len(DATA))['upload_id']
+    write_chunk(upload_folder, upload_id, 0, io.BytesIO(DATA[:5000]))
+    chunked_upload._hashers.clear()
+
+    write_chunk(upload_folder, upload_id, 5000, io.BytesIO(DATA[5000:]))
+    assert finalize_upload(upload_folder, upload_id)['sha256'] == hashlib.sha256(DATA).hexdigest()
+
+
+def test_data_beyond_declared_size_is_rejected(upload_folder):
+    upload_id = init_upload(upload_folder, 'a.pdf', size=100)['upload_id']
+
+    with pytest.raises(UploadError) as exc:
+        write_chunk(upload_folder, upload_id, 0, io.BytesIO(DATA[:500]))
+    assert exc.value.status == 413
+    assert get_status(upload_folder, upload_id)['offset'] == 0
+
+
+def test_finalize_incomplete_upload(upload_folder):
+    upload_id = init_upload(upload_folder, 'a.pdf', size=len(DATA))['upload_id']
+    write_chunk(upload_folder, upload_id, 0, io.BytesIO(DATA[:100]))
+
+    with pytest.raises(UploadError) as exc:
+        finalize_upload(upload_folder, upload_id)
+    assert exc.value.status == 409
+    assert exc.value.extra['offset'] == 100
+
+
+def test_checksum_mismatch_discards_session(upload_folder):
+    upload_id = init_upload(upload_folder, 'a.pdf', size=len(DATA), sha256='0' * 64)['upload_id']
+    write_chunk(upload_folder, upload_id, 0, io.BytesIO(DATA))
+
+    with pytest.raises(UploadError) as exc:
+        finalize_upload(upload_folder, upload_id)
+    assert exc.value.status == 422
+    with pytest.raises(UploadError) as exc:
+        get_status(upload_folder, upload_id)
+    assert exc.value.status == 404
+
+
+def test_known_sha256_completes_without_upload(upload_folder):
+    first = store_stream(io.BytesIO(DATA), 'a.pdf', upload_folder)
+
+    result = init_upload(upload_folder, 'b.pdf', size=len(DATA), sha256=first['sha256'])
+    assert result['complete'] is True
+    assert result['file']['path'] == first['path']
+    assert result['file']['filename'] != first['filename']
+
+
+def test_abort_removes_session(upload_folder):
+    upload_id = init_upload(upload_folder, 'a.pdf')['upload_id']
+    abort_upload(upload_folder, upload_id)
+
+    with pytest.raises(UploadError) as exc:
+        write_chunk(upload_folder, upload_id, 0, io.BytesIO(b'x'))
+    assert exc.value.status == 404
+
+
+def test_invalid_upload_id(upload_folder):
+    with pytest.raises(UploadError) as exc:
+        get_status(upload_folder, '../etc')
+    assert exc.value.status == 404
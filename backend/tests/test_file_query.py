@@ -0,0 +1,84 @@
+import os
+import hashlib
+import pytest
+from utils.blob_store import get_blob_store
+from utils.file_handler import query_files
+
+# (原始文件名, 上传时间, 大小)
+FILES = [
+    ('a.pdf', '20240101_090000', 30),
+    ('b.png', '20240101_100000', 10),
+    ('c.jpg', '20240102_090000', 20),
+    ('d.pdf', '20240102_090000', 20),
+    ('e.png', '20240103_120000', 50),
+    ('f.docx', '20240105_080000', 40),
+    ('g.jpg', '20240105_080000', 5),
+]
+
+
+@pytest.fixture
+def upload_folder(tmp_path):
+    folder = str(tmp_path / 'uploads')
+    store = get_blob_store(folder)
+    for i, (name, upload_time, size) in enumerate(FILES):
+        data = bytes([i]) * size
+        src = os.path.join(str(tmp_path), 'part')
+        with open(src, 'wb') as f:
+            f.write(data)
+        store.store_file(src, hashlib.sha256(data).hexdigest(), size, name, upload_time=upload_time)
+    return folder
+
+
+def _all_pages(upload_folder, limit, **kwargs):
+    pages = []
+    cursor = None
+    while True:
+        result = query_files(upload_folder, limit=limit, cursor=cursor, **kwargs)
+        pages.append([item['original_name'] for item in result['files']])
+        cursor = result['next_cursor']
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize('sort,order', [
+    ('upload_time', 'desc'), ('upload_time', 'asc'), ('size', 'desc'), ('size', 'asc'),
+    ('name', 'desc'), ('name', 'asc'),
+])
+@pytest.mark.parametrize('limit', [1, 2, 3, 7, 10])
+def test_pages_cover_every_file_once_in_order(upload_folder, sort, order, limit):
+    column = {'upload_time': 1, 'size': 2, 'name': 0}[sort]
+    expected = sorted(FILES, key=lambda f: (f[column], f[0]), reverse=order == 'desc')
+
+    pages = _all_pages(upload_folder, limit, sort=sort, order=order)
+
+    assert [name for page in pages for name in page] == [f[0] for f in expected]
+    assert all(len(page) == limit for page in pages[:-1])
+
+
+def test_filters(upload_folder):
+    def names(**kwargs):
+        return sorted(item['original_name'] for item in query_files(upload_folder, **kwargs)['files'])
+
+    assert names(file_type='image') == ['b.png', 'c.jpg', 'e.png', 'g.jpg']
+    assert names(file_type='application/pdf') == ['a.pdf', 'd.pdf']
+    assert names(date_from='2024-01-02', date_to='2024-01-03') == ['c.jpg', 'd.pdf', 'e.png']
+    assert names(date_from='20240105') == ['f.docx', 'g.jpg']
+
+
+def test_cursor_is_bound_to_sort_and_order(upload_folder):
+    cursor = query_files(upload_folder, limit=2, sort='size')['next_cursor']
+
+    with pytest.raises(ValueError):
+        query_files(upload_folder, limit=2, cursor=cursor, sort='name')
+    with pytest.raises(ValueError):
+        query_files(upload_folder, limit=2, cursor=cursor, sort='size', order='asc')
+    with pytest.raises(ValueError):
+        query_files(upload_folder, limit=2, cursor='not-a-cursor')
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'limit': 0}, {'limit': 501}, {'sort': 'type'}, {'order': 'up'}, {'date_from': '2024/01/01'},
+])
+def test_invalid_parameters(upload_folder, kwargs):
+    with pytest.raises(ValueError):
+        query_files(upload_folder, **kwargs)
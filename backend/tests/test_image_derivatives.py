@@ -0,0 +1,73 @@
+import pytest
+from flask import Flask
+from PIL import Image
+from utils import image_derivatives
+from utils.disk_cache import DiskCacheLimit
+from utils.image_derivatives import get_derivative, image_response
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_derivatives, 'DERIVATIVE_CACHE_DIR', str(tmp_path / 'derivatives'))
+    monkeypatch.setattr(image_derivatives, 'derivative_limit', DiskCacheLimit(str(tmp_path / 'derivatives'), 1 << 30))
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def _save(path, mode, fmt='JPEG', size=(64, 48)):
+    Image.new(mode, size).save(str(path), fmt)
+    return str(path)
+
+
+@pytest.mark.parametrize('fmt', ['png', 'webp', 'jpeg'])
+def test_cmyk_source_converted(tmp_path, fmt):
+    # 扫描仪生成的 JPEG 常为 CMYK，PNG / WEBP 不能直接保存
+    src = _save(tmp_path / 'scan.jpg', 'CMYK')
+    path, mimetype = get_derivative(src, 32, fmt)
+    assert mimetype == f'image/{fmt}'
+    with Image.open(path) as img:
+        assert img.mode == 'RGB'
+        assert img.width == 32
+
+
+def test_alpha_kept_for_png_and_webp(tmp_path):
+    src = _save(tmp_path / 'icon.png', 'LA', 'PNG')
+    for fmt in ('png', 'webp'):
+        path, _ = get_derivative(src, None, fmt)
+        with Image.open(path) as img:
+            assert 'A' in img.mode
+    path, _ = get_derivative(src, None, 'jpeg')
+    with Image.open(path) as img:
+        assert img.mode == 'RGB'
+
+
+def test_cmyk_png_request_is_served(app, tmp_path):
+    src = _save(tmp_path / 'scan.jpg', 'CMYK')
+    with app.test_request_context('/?format=png&size=thumb'):
+        response = image_response(src)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+
+
+def test_corrupt_image_falls_back_to_original(app, tmp_path):
+    src = tmp_path / 'broken.jpg'
+    src.write_bytes(b'not an image at all')
+    with app.test_request_context('/?size=thumb'):
+        response = image_response(str(src))
+        response.direct_passthrough = False
+        assert response.status_code == 200
+        assert response.get_data() == b'not an image at all'
+
+
+def test_decompression_bomb_falls_back_to_original(app, tmp_path, monkeypatch):
+    src = _save(tmp_path / 'huge.jpg', 'RGB', size=(200, 200))
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 100)
+    with app.test_request_context('/?w=64'):
+        response = image_response(src)
+        response.direct_passthrough = False
+        assert response.status_code == 200
+        assert response.mimetype == 'image/jpeg'
+        assert len(response.get_data()) == len(open(src, 'rb').read())
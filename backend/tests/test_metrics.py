@@ -0,0 +1,100 @@
+import os
+import pytest
+from flask import Flask
+from utils import metrics
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(metrics, 'registry', metrics.Registry())
+    monkeypatch.setattr(metrics, '_snapshot_pid', None)
+    return tmp_path
+
+
+def _new_worker(monkeypatch):
+    """模拟一个新的 worker 进程（PID 可能与已退出的 worker 相同）"""
+    monkeypatch.setattr(metrics, 'registry', metrics.Registry())
+    monkeypatch.setattr(metrics, '_snapshot_pid', None)
+
+
+def _counter(name):
+    counters, _, _ = metrics._merge(metrics._collect())
+    return sum(value for (counter, _), value in counters.items() if counter == name)
+
+
+def test_snapshot_name_is_unique_per_process(metrics_dir, monkeypatch):
+    metrics.flush_metrics()
+    first = sorted(os.listdir(metrics_dir))
+    assert len(first) == 1 and first[0].startswith(f'{os.getpid()}-')
+
+    metrics.flush_metrics()
+    assert sorted(os.listdir(metrics_dir)) == first
+
+    _new_worker(monkeypatch)
+    metrics.flush_metrics()
+    assert len(os.listdir(metrics_dir)) == 2
+
+
+def test_retired_worker_is_folded(metrics_dir, monkeypatch):
+    metrics.registry.inc('jobs_total', (('kind', 'a'),), 3)
+    metrics.registry.observe('latency_seconds', (), 0.2, (0.1, 1.0))
+    metrics.registry.gauge_add('in_flight', (), 1)
+    metrics.retire_metrics()
+    assert [p.name for p in metrics_dir.glob('*.json')] == [metrics.RETIRED_SNAPSHOT]
+
+    _new_worker(monkeypatch)
+    metrics.registry.inc('jobs_total', (('kind', 'a'),), 2)
+    metrics.retire_metrics()
+
+    _new_worker(monkeypatch)
+    counters, gauges, histograms = metrics._merge(metrics._collect())
+    assert counters[('jobs_total', (('kind', 'a'),))] == 5
+    assert histograms[('latency_seconds', ())]['counts'] == [0, 1]
+    assert not gauges
+
+
+def test_counters_survive_pid_reuse(metrics_dir, monkeypatch):
+    metrics.registry.inc('jobs_total', (), 10)
+    metrics.retire_metrics()
+    before = _counter('jobs_total')
+
+    # 新 worker 复用了同一个 PID，计数从 0 开始
+    _new_worker(monkeypatch)
+    metrics.registry.inc('jobs_total', (), 1)
+    assert _counter('jobs_total') == before + 1
+
+
+def test_crashed_worker_snapshot_is_folded(metrics_dir, monkeypatch):
+    metrics.registry.inc('jobs_total', (), 4)
+    metrics.flush_metrics()
+    [crashed] = os.listdir(metrics_dir)
+    os.rename(metrics_dir / crashed, metrics_dir / '999999-1.json')
+    monkeypatch.setattr(metrics, '_pid_alive', lambda pid: pid != 999999)
+
+    _new_worker(monkeypatch)
+    assert _counter('jobs_total') == 4
+    assert not (metrics_dir / '999999-1.json').exists()
+    assert _counter('jobs_total') == 4
+
+
+@pytest.fixture
+def client(metrics_dir, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', True)
+    app = Flask(__name__)
+    metrics.install_metrics(app)
+    return app.test_client()
+
+
+def test_metrics_requires_token(client, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', 'secret')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert 'http_requests_total' in response.get_data(as_text=True)
+
+
+def test_metrics_without_token_is_open(client, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', '')
+    assert client.get('/metrics').status_code == 200
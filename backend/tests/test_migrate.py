@@ -0,0 +1,170 @@
+import re
+import sys
+import types
+import pytest
+from database import migrate as migrate_module
+from database.migrate import HOT_QUERIES, check_queries, migrate
+from database.schema import ensure_index, find_index
+
+
+class StubCursor:
+    """按语句内容应答的假游标：indexes 为 {表: {索引名: (是否唯一, (列, ...))}}"""
+
+    def __init__(self, indexes=None, applied=(), lock=1, explain=None):
+        self.indexes = indexes or {}
+        self.applied = list(applied)
+        self.lock = lock
+        self.explain = explain or {}
+        self.statements = []
+        self._rows = []
+
+    def execute(self, query, params=None):
+        query = ' '.join(query.split())
+        self.statements.append((query, params))
+        self._rows = []
+        if 'information_schema.STATISTICS' in query:
+            for name, (unique, columns) in self.indexes.get(params[0], {}).items():
+                self._rows.extend((name, 0 if unique else 1, column) for column in columns)
+        elif query.startswith('SELECT GET_LOCK'):
+            self._rows = [(self.lock,)]
+        elif query == 'SELECT version FROM schema_migrations':
+            self._rows = [(version,) for version in self.applied]
+        elif query.startswith('INSERT INTO schema_migrations'):
+            self.applied.append(params[0])
+        elif query.startswith('CREATE UNIQUE INDEX') or query.startswith('CREATE INDEX'):
+            name, table, columns = re.match(r'CREATE (?:UNIQUE )?INDEX `(\w+)` ON `(\w+)` \((.*)\)', query).groups()
+            self.indexes.setdefault(table, {})[name] = (
+                query.startswith('CREATE UNIQUE'), tuple(c.strip('` ') for c in columns.split(','))
+            )
+        elif query.startswith('EXPLAIN'):
+            self._rows = self.explain.get(query[len('EXPLAIN '):], [])
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        pass
+
+
+class StubConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+
+    def cursor(self, **_):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+
+def _created(cursor):
+    return [q for q, _ in cursor.statements if q.startswith('CREATE')]
+
+
+def test_find_index_matches_prefix_and_exact_unique():
+    cursor = StubCursor({'scores': {
+        'PRIMARY': (True, ('id',)),
+        'unique_user_report': (True, ('user_id', 'report_id')),
+        'idx_report_score': (False, ('report_id', 'score')),
+    }})
+    assert find_index(cursor, 'scores', ['user_id']) == 'unique_user_report'
+    assert find_index(cursor, 'scores', ['report_id', 'score']) == 'idx_report_score'
+    assert find_index(cursor, 'scores', ['user_id'], unique=True) is None
+    assert find_index(cursor, 'scores', ['user_id', 'report_id'], unique=True) == 'unique_user_report'
+    assert find_index(cursor, 'scores', ['score']) is None
+
+
+def test_ensure_index_skips_equivalent_index():
+    cursor = StubCursor({'scores': {'legacy': (False, ('report_id', 'score', 'id'))}})
+    assert ensure_index(cursor, 'scores', 'idx_report_score', ['report_id', 'score']) is False
+    assert ensure_index(cursor, 'scores', 'idx_user_updated', ['user_id', 'updated_at']) is True
+    assert _created(cursor) == ['CREATE INDEX `idx_user_updated` ON `scores` (`user_id`, `updated_at`)']
+    # 再执行一次不会重复建索引
+    assert ensure_index(cursor, 'scores', 'idx_user_updated', ['user_id', 'updated_at']) is False
+
+
+def test_hot_query_index_migration_is_repeatable():
+    module = __import__('database.migrations.0002_hot_query_indexes', fromlist=['upgrade'])
+    cursor = StubCursor({'users': {'PRIMARY': (True, ('id',))}, 'scores': {'PRIMARY': (True, ('id',))}})
+    module.upgrade(cursor)
+    statements = [q for q, _ in cursor.statements]
+    assert any(q.startswith('DELETE older FROM scores') for q in statements)
+    assert len(_created(cursor)) == 5
+
+    cursor.statements.clear()
+    module.upgrade(cursor)
+    assert _created(cursor) == []
+    assert not any(q.startswith('DELETE') for q, _ in cursor.statements)
+
+
+@pytest.fixture
+def fake_migrations(monkeypatch):
+    """用三个只记录调用的迁移替换 database/migrations/ 中的真实迁移"""
+    calls = []
+    names = ['0001_first', '0002_second', '0003_third']
+    for name in names:
+        module = types.ModuleType(f'database.migrations.{name}')
+        module.upgrade = lambda cursor, name=name: calls.append(name)
+        monkeypatch.setitem(sys.modules, module.__name__, module)
+    monkeypatch.setattr(migrate_module, 'discover', lambda: [(name[:4], name) for name in names])
+    return calls
+
+
+def test_migrate_runs_pending_in_order(fake_migrations):
+    cursor = StubCursor(applied=['0001'])
+    connection = StubConnection(cursor)
+    assert migrate(connection, log=lambda message: None) == ['0002', '0003']
+    assert fake_migrations == ['0002_second', '0003_third']
+    assert connection.commits == 2
+    assert cursor.statements[-1][0] == 'SELECT RELEASE_LOCK(%s)'
+
+    # 已是最新版本时什么都不做
+    assert migrate(connection, log=lambda message: None) == []
+
+
+def test_migrate_stops_at_target(fake_migrations):
+    cursor = StubCursor()
+    assert migrate(StubConnection(cursor), target='0002', log=lambda message: None) == ['0001', '0002']
+    assert fake_migrations == ['0001_first', '0002_second']
+
+
+def test_migrate_gives_up_without_lock(fake_migrations):
+    cursor = StubCursor(lock=0)
+    with pytest.raises(RuntimeError):
+        migrate(StubConnection(cursor), log=lambda message: None)
+    assert fake_migrations == []
+
+
+def test_migrate_releases_lock_on_failure(monkeypatch, fake_migrations):
+    def fail(cursor):
+        raise ValueError('boom')
+    monkeypatch.setattr(sys.modules['database.migrations.0002_second'], 'upgrade', fail)
+    cursor = StubCursor()
+    with pytest.raises(ValueError):
+        migrate(StubConnection(cursor), log=lambda message: None)
+    assert cursor.applied == ['0001']
+    assert cursor.statements[-1][0] == 'SELECT RELEASE_LOCK(%s)'
+
+
+def test_hot_queries_placeholders_match_params():
+    for name, query, params in HOT_QUERIES:
+        assert query.count('%s') == len(params), name
+        assert '{' not in query, name
+
+
+def test_check_queries_levels():
+    name_scan, query_scan, _ = HOT_QUERIES[0]
+    name_small, query_small, _ = HOT_QUERIES[1]
+    cursor = StubCursor(explain={
+        ' '.join(query_scan.split()): [{'table': 'users', 'type': 'ALL', 'possible_keys': None}],
+        ' '.join(query_small.split()): [{'table': 'users', 'type': 'index', 'possible_keys': 'username'}],
+    })
+    assert check_queries(StubConnection(cursor)) == [
+        (name_scan, 'users', 'ALL', None, 'error'),
+        (name_small, 'users', 'index', 'username', 'warning'),
+    ]
+    assert len(cursor.statements) == len(HOT_QUERIES)
@@ -0,0 +1,107 @@
+import threading
+import time
+import pytest
+from utils import password_hashing
+from utils.password_hashing import HashingBusy, HashPool, NodeSlots, needs_rehash
+
+requires_fcntl = pytest.mark.skipif(password_hashing.fcntl is None, reason='整机名额依赖 fcntl')
+
+
+@pytest.mark.parametrize('stored, method', [
+    ('scrypt:32768:8:1', 'scrypt'),
+    ('scrypt', 'scrypt:32768:8:1'),
+    ('pbkdf2:sha256:%d' % password_hashing.DEFAULT_PBKDF2_ITERATIONS, 'pbkdf2'),
+    ('pbkdf2', 'pbkdf2:sha256'),
+])
+def test_default_parameters_do_not_trigger_rehash(stored, method):
+    assert not needs_rehash(f'{stored}$' + 's' * 16 + '$abc', method, 16)
+
+
+@pytest.mark.parametrize('stored, salt, method, salt_length', [
+    ('scrypt:32768:8:1', 16, 'scrypt:65536:8:1', 16),
+    ('scrypt:32768:8:1', 8, 'scrypt:32768:8:1', 16),
+    ('pbkdf2:sha256:600000', 16, 'scrypt:32768:8:1', 16),
+    ('pbkdf2:sha256:100000', 16, 'pbkdf2:sha256:600000', 16),
+])
+def test_changed_parameters_trigger_rehash(stored, salt, method, salt_length):
+    assert needs_rehash(f'{stored}$' + 's' * salt + '$abc', method, salt_length)
+
+
+def test_malformed_hash_triggers_rehash():
+    assert needs_rehash('plaintext')
+
+
+def test_verify_returns_new_hash_after_method_change():
+    old = password_hashing._hash('secret', 'pbkdf2:sha256:1000', 8)
+    ok, new_hash = password_hashing._verify(old, 'secret', 'scrypt:16384:8:1', 16)
+    assert ok and new_hash.startswith('scrypt:16384:8:1$')
+    assert not needs_rehash(new_hash, 'scrypt:16384:8:1', 16)
+    assert password_hashing._verify(new_hash, 'secret', 'scrypt:16384:8:1', 16) == (True, None)
+    assert password_hashing._verify(old, 'wrong', 'scrypt:16384:8:1', 16) == (False, None)
+
+
+@requires_fcntl
+def test_node_slots_are_shared_between_instances(tmp_path):
+    # 两个实例相当于两个 gunicorn worker，共用同一个锁目录
+    first, second = NodeSlots(str(tmp_path), 2), NodeSlots(str(tmp_path), 2)
+    a = first.acquire(0)
+    b = second.acquire(0)
+    assert a is not None and b is not None
+    assert first.acquire(0) is None
+    assert second.acquire(0) is None
+
+    NodeSlots.release(a)
+    c = second.acquire(0)
+    assert c is not None
+    NodeSlots.release(b)
+    NodeSlots.release(c)
+
+
+@requires_fcntl
+def test_node_slots_wait_for_release(tmp_path):
+    slots = NodeSlots(str(tmp_path), 1)
+    held = slots.acquire(0)
+    threading.Timer(0.05, NodeSlots.release, (held,)).start()
+    started = time.monotonic()
+    fd = slots.acquire(2)
+    assert fd is not None and time.monotonic() - started < 2
+    NodeSlots.release(fd)
+
+
+@requires_fcntl
+def test_pool_rejects_when_node_is_busy(tmp_path):
+    slots = NodeSlots(str(tmp_path), 1)
+    held = slots.acquire(0)
+    # 首次提交要先启动 spawn 子进程，timeout 留足
+    pool = HashPool(workers=1, queue_size=2, timeout=30, node_slots=slots, node_wait=0.05)
+    try:
+        with pytest.raises(HashingBusy):
+            pool.run(needs_rehash, 'x$y$z')
+        NodeSlots.release(held)
+        assert pool.run(needs_rehash, 'x$y$z') is True
+        # 任务完成后名额归还
+        fd = slots.acquire(1)
+        assert fd is not None
+        NodeSlots.release(fd)
+    finally:
+        pool.shutdown()
+
+
+@requires_fcntl
+def test_queued_tasks_do_not_hold_node_slots(tmp_path):
+    slots = NodeSlots(str(tmp_path), 2)
+    pool = HashPool(workers=1, queue_size=4, timeout=30, node_slots=slots)
+    try:
+        pool.run(needs_rehash, 'x$y$z')  # 先启动子进程
+        threads = [threading.Thread(target=pool.run, args=(time.sleep, 0.5)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        # 一个任务在执行，两个在队列中：整机仍有一个空闲名额留给其他 worker
+        fd = NodeSlots(str(tmp_path), 2).acquire(0)
+        assert fd is not None
+        NodeSlots.release(fd)
+        for thread in threads:
+            thread.join()
+    finally:
+        pool.shutdown()
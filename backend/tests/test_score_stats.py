@@ -0,0 +1,135 @@
+import random
+import pytest
+from utils import score_stats
+from utils.score_stats import HISTOGRAM_BUCKETS, lock_report_stats, update_report_stats
+
+
+class FakeDb:
+    """按语句模拟 scores 和 report_score_stats 两张表，记录执行过的语句"""
+
+    def __init__(self):
+        self.scores = {}   # (user_id, report_id) -> score
+        self.stats = {}    # report_id -> 统计行
+        self.queries = []
+
+    def execute_query(self, query, params=None, connection=None):
+        self.queries.append(query)
+        if query == score_stats.UPDATE_STATS_SQL:
+            count, total, total_sq, score_min, score_max, *rest = params
+            buckets, report_id = rest[:-1], rest[-1]
+            row = self.stats[report_id]
+            row.update(score_count=row['score_count'] + count, score_sum=row['score_sum'] + total,
+                       score_sum_sq=row['score_sum_sq'] + total_sq, score_min=score_min, score_max=score_max)
+            for i, delta in enumerate(buckets):
+                row[f'bucket_{i}'] += delta
+            return True, 0
+        if query == score_stats.DELETE_STATS_SQL:
+            self.stats.pop(params[0], None)
+            return True, 0
+        if query == score_stats.SELECT_EXTREMES_SQL:
+            values = [s for (_, r), s in self.scores.items() if r == params[0]]
+            return True, [{'score_min': min(values, default=None), 'score_max': max(values, default=None)}]
+        if query.startswith('INSERT INTO report_score_stats (report_id)'):
+            for report_id in params:
+                self.stats.setdefault(report_id, self.empty_row(report_id))
+            return True, 0
+        if query.startswith(f'SELECT {score_stats.STATS_COLUMNS} FROM report_score_stats'):
+            return True, [dict(self.stats[r]) for r in params if r in self.stats]
+        if query.startswith('SELECT report_id, score FROM scores'):
+            user_id, *report_ids = params
+            return True, [{'report_id': r, 'score': self.scores[(user_id, r)]}
+                          for r in report_ids if (user_id, r) in self.scores]
+        raise AssertionError(f'unexpected query: {query}')
+
+    @staticmethod
+    def empty_row(report_id):
+        row = {'report_id': report_id, 'score_count': 0, 'score_sum': 0, 'score_sum_sq': 0,
+               'score_min': None, 'score_max': None}
+        row.update({f'bucket_{i}': 0 for i in range(HISTOGRAM_BUCKETS)})
+        return row
+
+    def expected(self):
+        """按全部评分重新汇总的结果"""
+        stats = {}
+        for (_, report_id), score in self.scores.items():
+            row = stats.setdefault(report_id, self.empty_row(report_id))
+            row['score_count'] += 1
+            row['score_sum'] += score
+            row['score_sum_sq'] += score * score
+            row['score_min'] = score if row['score_min'] is None else min(row['score_min'], score)
+            row['score_max'] = score if row['score_max'] is None else max(row['score_max'], score)
+            row[f'bucket_{min(score // 10, 9)}'] += 1
+        return stats
+
+    # 与 routes/scoring.py 中的事务相同的调用顺序
+    def submit(self, user_id, items):
+        stats, old = lock_report_stats(user_id, [r for r, _ in items], None)
+        for report_id, score in items:
+            self.scores[(user_id, report_id)] = score
+        update_report_stats(stats, old, dict(items), None)
+
+    def delete(self, user_id, report_id):
+        stats, old = lock_report_stats(user_id, [report_id], None)
+        self.scores.pop((user_id, report_id), None)
+        update_report_stats(stats, old, {report_id: None}, None)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDb()
+    monkeypatch.setattr(score_stats, 'execute_query', db.execute_query)
+    return db
+
+
+def test_random_changes_match_full_recompute(db):
+    rng = random.Random(7)
+    for _ in range(2000):
+        user_id = rng.randrange(6)
+        action = rng.random()
+        if action < 0.6:
+            db.submit(user_id, [(rng.choice('abc'), rng.choice([0, 9, 10, 55, 89, 90, 100, rng.randrange(101)]))])
+        elif action < 0.8:
+            items = [(rng.choice('abcd'), rng.randrange(101)) for _ in range(rng.randrange(1, 5))]
+            db.submit(user_id, items)
+        else:
+            db.delete(user_id, rng.choice('abcd'))
+        assert db.stats == db.expected()
+
+
+def test_extremes_only_requeried_when_removed(db):
+    db.submit(1, [('a', 50)])
+    db.submit(2, [('a', 80)])
+    db.submit(3, [('a', 20)])
+    db.queries.clear()
+
+    db.submit(1, [('a', 60)])
+    assert score_stats.SELECT_EXTREMES_SQL not in db.queries
+
+    db.submit(2, [('a', 70)])
+    assert score_stats.SELECT_EXTREMES_SQL in db.queries
+    assert (db.stats['a']['score_min'], db.stats['a']['score_max']) == (20, 70)
+
+
+def test_unchanged_score_writes_nothing(db):
+    db.submit(1, [('a', 50)])
+    db.queries.clear()
+    db.submit(1, [('a', 50)])
+    assert score_stats.UPDATE_STATS_SQL not in db.queries
+
+
+def test_deleting_missing_score_leaves_no_empty_row(db):
+    db.delete(1, 'a')
+    assert db.stats == {}
+
+
+def test_last_score_removes_stats_row(db):
+    db.submit(1, [('a', 50)])
+    db.delete(1, 'a')
+    assert db.stats == {}
+
+
+def test_duplicate_reports_in_batch_use_last_score(db):
+    db.submit(1, [('a', 10), ('a', 90)])
+    assert db.stats == db.expected()
+    assert db.stats['a']['score_count'] == 1
+    assert db.stats['a']['bucket_9'] == 1
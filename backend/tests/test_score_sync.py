@@ -0,0 +1,69 @@
+import base64
+import json
+from datetime import datetime
+import pytest
+from utils import score_sync
+from utils.score_sync import decode_cursor, encode_cursor, get_changes
+
+
+def test_cursor_round_trip():
+    moment = datetime(2024, 3, 5, 14, 7, 9)
+    cursor = encode_cursor(moment)
+    assert decode_cursor(cursor) == moment
+    # URL 安全，可以直接放进查询参数
+    assert set(cursor) <= set('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=')
+
+
+def test_cursor_drops_sub_second_precision():
+    assert decode_cursor(encode_cursor(datetime(2024, 3, 5, 14, 7, 9, 999999))) == datetime(2024, 3, 5, 14, 7, 9)
+
+
+@pytest.mark.parametrize('cursor', [
+    '', 'not-base64!', base64.urlsafe_b64encode(b'[]').decode(),
+    base64.urlsafe_b64encode(json.dumps(['2024-13-01 00:00:00']).encode()).decode(),
+    base64.urlsafe_b64encode(b'{"a": 1}').decode(),
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+class _FakeQuery:
+    def __init__(self, now):
+        self.now = now
+        self.calls = []
+
+    def __call__(self, query, params=None):
+        self.calls.append((' '.join(query.split()), params))
+        if 'cursor_time' in query:
+            return True, [{'cursor_time': self.now, 'retained_from': datetime(2024, 1, 1)}]
+        if 'score_tombstones' in query:
+            return True, [{'report_id': 'gone'}]
+        return True, [{'report_id': 'r', 'score': 80, 'comments': '', 'updated_at': self.now}]
+
+
+def test_first_sync_is_full(monkeypatch):
+    fake = _FakeQuery(datetime(2024, 3, 5, 12, 0, 0))
+    monkeypatch.setattr(score_sync, 'execute_query', fake)
+
+    success, result = get_changes(1)
+    assert success and result['full'] and result['deleted'] == []
+    assert decode_cursor(result['cursor']) == datetime(2024, 3, 5, 12, 0, 0)
+    assert not any('score_tombstones' in query for query, _ in fake.calls)
+
+
+def test_cursor_older_than_retention_is_full(monkeypatch):
+    monkeypatch.setattr(score_sync, 'execute_query', _FakeQuery(datetime(2024, 3, 5)))
+    _, result = get_changes(1, datetime(2023, 12, 31))
+    assert result['full'] is True
+
+
+def test_incremental_sync(monkeypatch):
+    fake = _FakeQuery(datetime(2024, 3, 5, 12, 0, 0))
+    monkeypatch.setattr(score_sync, 'execute_query', fake)
+    since = datetime(2024, 3, 1)
+
+    _, result = get_changes(1, since)
+    assert result['full'] is False
+    assert result['deleted'] == ['gone']
+    assert [params for _, params in fake.calls[1:]] == [(1, since), (1, since)]
@@ -0,0 +1,93 @@
+import os
+import json
+import pytest
+from utils.case_catalog import CaseCatalog
+from utils.search_index import SearchIndex, tokenize
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def _record(*turns, name='张三'):
+    return {'基本信息': {'姓名': name}, '对话': [{'question': q, 'answer': a} for q, a in turns]}
+
+
+@pytest.fixture
+def case_dir(tmp_path):
+    root = str(tmp_path)
+    _write_json(os.path.join(root, '宁夏', 'report.json'), {'起火原因': '吧台电线短路引燃装修材料'})
+    _write_json(os.path.join(root, '宁夏', 'record', '1.json'), _record(
+        ('当时你在哪里？', '我在吧台后面整理酒水。'),
+        ('你看到起火了吗？', '看到吧台上方冒烟，然后起火了。'),
+    ))
+    _write_json(os.path.join(root, '陕西', 'record', '1.json'), _record(
+        ('起火时间是几点？', '大约晚上10点左右，仓库先起火。'),
+    ))
+    return root
+
+
+@pytest.fixture
+def index(case_dir):
+    index = SearchIndex(CaseCatalog(case_dir, poll_interval=0), refresh_interval=0)
+    index.refresh(force=True)
+    return index
+
+
+def test_tokenize():
+    assert tokenize('起火原因') == ['起火', '火原', '原因']
+    assert tokenize('火') == ['火']
+    assert tokenize('ＫＴＶ吧台 10点') == ['吧台', '点', 'ktv', '10']
+    assert tokenize('，。!') == []
+
+
+def test_results_are_sorted_by_score(index):
+    total, results = index.search('吧台')
+    assert total == 3
+    assert {(r['file'], r['turn']) for r in results} == {('report.json', None), ('record/1.json', 0),
+                                                         ('record/1.json', 1)}
+    assert results == sorted(results, key=lambda r: -r['score'])
+
+
+def test_phrase_match_gets_bonus(index):
+    _, results = index.search('仓库先起火')
+    assert results[0]['case'] == '陕西'
+    assert results[0]['kind'] == 'dialogue'
+    assert results[0]['question'] == '起火时间是几点？'
+    assert '仓库先起火' in results[0]['snippet']
+
+
+def test_filters_and_paging(index):
+    total, results = index.search('起火', case_id='宁夏', kind='dialogue')
+    assert total == 1
+    assert results[0]['turn'] == 1
+
+    total, page = index.search('起火', limit=1, offset=1)
+    _, everything = index.search('起火', limit=10)
+    assert total == len(everything)
+    assert page == everything[1:2]
+
+
+def test_no_tokens_falls_back_to_substring(index):
+    total, results = index.search('？')
+    assert total == 3
+    assert all(r['kind'] == 'dialogue' for r in results)
+    assert index.search('   ') == (0, [])
+
+
+def test_refresh_picks_up_changed_and_removed_files(index, case_dir):
+    path = os.path.join(case_dir, '宁夏', 'record', '1.json')
+    _write_json(path, _record(('后来呢？', '消防队赶到后扑灭了明火。')))
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    index.refresh(force=True)
+
+    assert index.search('整理酒水') == (0, [])
+    assert index.search('扑灭')[0] == 1
+
+    os.remove(os.path.join(case_dir, '陕西', 'record', '1.json'))
+    index.catalog.refresh(force=True)
+    index.refresh(force=True)
+    assert index.search('仓库') == (0, [])
@@ -0,0 +1,127 @@
+import os
+import time
+import json
+import pytest
+from flask import Flask
+from utils.json_cache import json_file_response
+from utils.static_assets import send_asset
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+@pytest.fixture
+def case_dir(tmp_path):
+    (tmp_path / 'report.json').write_text(json.dumps({'text': '火灾' * 1000}, ensure_ascii=False), encoding='utf-8')
+    (tmp_path / 'graph.html').write_text('<html>' + 'x' * 2000 + '</html>', encoding='utf-8')
+    (tmp_path / 'photo.jpg').write_bytes(b'\xff\xd8' + b'\0' * 2000)
+    return tmp_path
+
+
+def test_json_is_revalidated(app, case_dir):
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = json_file_response(str(case_dir / 'report.json'))
+    assert response.cache_control.no_cache
+    assert response.cache_control.max_age is None
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.vary
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'"{response.get_etag()[0]}"'}):
+        assert json_file_response(str(case_dir / 'report.json')).status_code == 304
+
+
+def test_html_is_revalidated(app, case_dir):
+    with app.test_request_context():
+        response = send_asset(str(case_dir / 'graph.html'))
+    assert response.cache_control.no_cache
+    assert response.cache_control.max_age is None
+
+
+def test_binary_assets_are_cached(app, case_dir):
+    with app.test_request_context():
+        response = send_asset(str(case_dir / 'photo.jpg'))
+    assert not response.cache_control.no_cache
+    assert response.cache_control.max_age > 0
+    assert response.cache_control.public
+
+
+def test_dynamic_response_checks_etag_before_compressing(app, monkeypatch):
+    import utils.static_assets as static_assets
+    calls = []
+    monkeypatch.setattr(static_assets, 'compress_fast', lambda body, encoding: calls.append(encoding) or body)
+    body = b'{"a":"' + b'x' * 4000 + b'"}'
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = static_assets.dynamic_response(body, 'abc')
+    assert response.get_etag()[0] == 'abc-gzip'
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.cache_control.no_cache
+    assert calls == ['gzip']
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"abc-gzip"'}):
+        response = static_assets.dynamic_response(body, 'abc')
+    assert response.status_code == 304
+    assert calls == ['gzip']
+
+
+def test_dynamic_response_small_body_is_not_compressed(app):
+    from utils.static_assets import dynamic_response
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = dynamic_response(b'{}', 'abc')
+    assert response.get_etag()[0] == 'abc'
+    assert 'Content-Encoding' not in response.headers
+
+
+@pytest.fixture
+def precompressed_dir(tmp_path, monkeypatch):
+    import utils.static_assets as static_assets
+    from utils.disk_cache import DiskCacheLimit
+    root = tmp_path / 'precompressed'
+    monkeypatch.setattr(static_assets, 'PRECOMPRESSED_CACHE_DIR', str(root))
+    monkeypatch.setattr(static_assets, 'precompressed_limit', DiskCacheLimit(str(root), 1 << 30))
+    return root
+
+
+def _variants(root):
+    return sorted(p.name for p in root.rglob('*') if p.is_file())
+
+
+def _age(path, seconds):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns - seconds * 10 ** 9, st.st_mtime_ns))
+
+
+def test_edit_replaces_precompressed_variant(app, case_dir, precompressed_dir):
+    graph = case_dir / 'graph.html'
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        send_asset(str(graph)).close()
+    [old] = _variants(precompressed_dir)
+    _age(next(precompressed_dir.rglob(old)), 3600)
+
+    graph.write_text('<html>' + 'y' * 3000 + '</html>', encoding='utf-8')
+    os.utime(graph, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        send_asset(str(graph)).close()
+    [new] = _variants(precompressed_dir)
+    assert new != old and new.endswith('.gz')
+
+
+def test_precompressed_cache_is_bounded(app, tmp_path, precompressed_dir, monkeypatch):
+    import random
+    import utils.static_assets as static_assets
+    from utils.disk_cache import DiskCacheLimit
+    limit = DiskCacheLimit(str(precompressed_dir), 20 * 1000)
+    monkeypatch.setattr(static_assets, 'precompressed_limit', limit)
+    rng = random.Random(0)
+    for i in range(40):
+        path = tmp_path / f'page{i}.html'
+        # 随机内容几乎不可压缩，每个压缩文件约 2KB
+        path.write_text(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(2500)))
+        with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+            send_asset(str(path)).close()
+        for variant in precompressed_dir.rglob('*.gz'):
+            _age(variant, 3600)
+    total = sum(p.stat().st_size for p in precompressed_dir.rglob('*.gz'))
+    assert total <= limit.max_bytes
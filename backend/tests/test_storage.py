@@ -0,0 +1,197 @@
+import os
+import time
+import hashlib
+import pytest
+from utils import storage
+from utils.blob_store import BlobStore
+from utils.storage import LocalBackend, ReadThroughCache, Storage
+
+
+@pytest.fixture
+def cache_events(monkeypatch):
+    events = []
+    monkeypatch.setattr(storage, 'record_cache', lambda cache, hit: events.append(hit))
+    return events
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """用本地目录充当远程对象存储"""
+    return LocalBackend(str(tmp_path / 'remote'))
+
+
+def _age(path, seconds):
+    """把 atime 往前拨，模拟很久没有访问"""
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns - seconds * 10 ** 9, st.st_mtime_ns))
+
+
+def test_cache_miss_then_hit(tmp_path, remote, cache_events):
+    remote.put_bytes('case/report.json', b'{"a": 1}')
+    cache = ReadThroughCache(str(tmp_path / 'cache'), max_bytes=1 << 20)
+    info = remote.stat('case/report.json')
+
+    path = cache.get(remote, info)
+    assert path.endswith('.json')
+    with open(path, 'rb') as f:
+        assert f.read() == b'{"a": 1}'
+    assert cache.get(remote, info) == path
+    assert cache_events == [False, True]
+
+
+def test_new_version_uses_new_file(tmp_path, remote, cache_events):
+    cache = ReadThroughCache(str(tmp_path / 'cache'), max_bytes=1 << 20)
+    remote.put_bytes('a.txt', b'old')
+    old = cache.get(remote, remote.stat('a.txt'))
+    time.sleep(0.01)
+    remote.put_bytes('a.txt', b'new content')
+    new = cache.get(remote, remote.stat('a.txt'))
+    assert new != old
+    with open(new, 'rb') as f:
+        assert f.read() == b'new content'
+    assert cache_events == [False, False]
+
+
+def test_cache_file_mtime_is_object_mtime(tmp_path, remote):
+    remote.put_bytes('pic/1.jpg', b'x' * 100)
+    info = remote.stat('pic/1.jpg')
+    cache = ReadThroughCache(str(tmp_path / 'cache'), max_bytes=1 << 20)
+
+    path = cache.get(remote, info)
+    assert os.stat(path).st_mtime == pytest.approx(info.mtime, abs=1e-6)
+
+    # 命中时只记录访问时间，mtime（ETag、Last-Modified 的依据）不变
+    _age(path, ReadThroughCache.TOUCH_INTERVAL * 2)
+    before = os.stat(path)
+    cache.get(remote, info)
+    after = os.stat(path)
+    assert after.st_mtime_ns == before.st_mtime_ns
+    assert after.st_atime_ns > before.st_atime_ns
+
+
+def test_evict_removes_least_recently_used(tmp_path, remote):
+    cache = ReadThroughCache(str(tmp_path / 'cache'), max_bytes=10 * 1000)
+    paths = {}
+    for name in 'abcdefghijkl':
+        remote.put_bytes(f'{name}.bin', name.encode() * 1000)
+        paths[name] = cache.get(remote, remote.stat(f'{name}.bin'))
+    # 按访问时间由远到近为 a、b、c、d，其余都在保护期内
+    for i, name in enumerate('abcd'):
+        _age(paths[name], 3600 - i * 600)
+
+    # 共 12000 字节，降到 9000 需要删掉最久未访问的三个
+    cache.evict()
+    remaining = {name for name, path in paths.items() if os.path.exists(path)}
+    assert remaining == set('defghijkl')
+    assert not os.path.exists(paths['a'] + '.lock')
+
+
+def test_evict_keeps_recently_used_files(tmp_path, remote):
+    cache = ReadThroughCache(str(tmp_path / 'cache'), max_bytes=1000)
+    paths = []
+    for name in 'abc':
+        remote.put_bytes(f'{name}.bin', b'x' * 1000)
+        paths.append(cache.get(remote, remote.stat(f'{name}.bin')))
+    # 全部超出容量，但都刚访问过，调用方可能正要打开
+    cache.evict()
+    assert all(os.path.exists(path) for path in paths)
+
+
+def test_download_without_fcntl(tmp_path, remote, monkeypatch, cache_events):
+    monkeypatch.setattr(storage, 'fcntl', None)
+    remote.put_bytes('a.txt', b'data')
+    cache = ReadThroughCache(str(tmp_path / 'cache'), max_bytes=1 << 20)
+    path = cache.get(remote, remote.stat('a.txt'))
+    assert not os.path.exists(path + '.lock')
+    assert cache.get(remote, remote.stat('a.txt')) == path
+    assert cache_events == [False, True]
+
+
+
+# ---- 两个节点共享远程存储的上传文件 ----
+
+@pytest.fixture
+def nodes(tmp_path):
+    """两个节点：各自的上传目录和读缓存，共用一个远程存储"""
+    remote = LocalBackend(str(tmp_path / 'remote'), remote=True)
+
+    def node(name):
+        cache = ReadThroughCache(str(tmp_path / name / 'cache'), max_bytes=1 << 20)
+        return BlobStore(str(tmp_path / name / 'uploads'), Storage(remote, cache), sync_interval=0)
+
+    return node('a'), node('b'), remote
+
+
+def _upload(store, tmp_path, data, name):
+    src = tmp_path / f'src-{name}'
+    src.write_bytes(data)
+    return store.store_file(str(src), hashlib.sha256(data).hexdigest(), len(data), name)
+
+
+def test_upload_is_visible_on_other_node(nodes, tmp_path):
+    a, b, remote = nodes
+    info = _upload(a, tmp_path, b'report body', 'r.pdf')
+
+    assert remote.stat(f"refs/{info['filename']}") is not None
+    found = b.get(info['filename'])
+    assert found['sha256'] == info['sha256'] and found['original_name'] == 'r.pdf'
+    with open(b.resolve(info['filename']), 'rb') as f:
+        assert f.read() == b'report body'
+
+
+def test_list_and_query_sync_remote_refs(nodes, tmp_path):
+    a, b, _ = nodes
+    first = _upload(a, tmp_path, b'one', 'one.txt')
+    second = _upload(b, tmp_path, b'two', 'two.txt')
+
+    for store in (a, b):
+        assert {f['filename'] for f in store.list()} == {first['filename'], second['filename']}
+        files, _ = store.query(limit=10)
+        assert len(files) == 2
+
+    # 一个节点删除后，另一个节点同步时移除
+    assert a.delete_reference(second['filename']) is True
+    assert [f['filename'] for f in b.list()] == [first['filename']]
+    assert b.resolve(second['filename']) is None
+
+
+def test_delete_unknown_locally_uses_remote_ref(nodes, tmp_path):
+    a, b, remote = nodes
+    info = _upload(a, tmp_path, b'payload', 'p.bin')
+
+    assert b.delete_reference(info['filename']) is True
+    assert remote.stat(f"refs/{info['filename']}") is None
+    assert remote.stat(f"blobs/{info['sha256'][:2]}/{info['sha256']}") is None
+    assert a.list() == []
+    assert b.delete_reference(info['filename']) is False
+
+
+def test_shared_content_kept_until_last_reference(nodes, tmp_path):
+    a, b, remote = nodes
+    data = b'same content'
+    sha = hashlib.sha256(data).hexdigest()
+    first = _upload(a, tmp_path, data, 'x.txt')
+    # b 没有这份内容的本地记录，秒传从远程找到它
+    second = b.add_reference(sha, 'y.txt', len(data))
+    assert second is not None and second['sha256'] == sha
+
+    blob_key = f'blobs/{sha[:2]}/{sha}'
+    assert a.delete_reference(first['filename']) is True
+    assert remote.stat(blob_key) is not None
+    with open(b.resolve(second['filename']), 'rb') as f:
+        assert f.read() == data
+
+    assert b.delete_reference(second['filename']) is True
+    assert remote.stat(blob_key) is None
+
+
+def test_uid_not_reused_across_nodes(nodes, tmp_path):
+    a, b, _ = nodes
+    uids = []
+    for store, data in ((a, b'1'), (b, b'2')):
+        src = tmp_path / f'src-{data.decode()}'
+        src.write_bytes(data)
+        info = store.store_file(str(src), hashlib.sha256(data).hexdigest(), 1, 'same.txt',
+                                upload_time='20240101_120000')
+        uids.append(info['filename'])
+    assert uids == ['same_20240101_120000.txt', 'same_20240101_120000_1.txt']
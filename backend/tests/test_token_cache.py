@@ -0,0 +1,125 @@
+import time
+import fnmatch
+import pytest
+from utils import token_cache
+from utils.token_cache import MemoryTokenCache, RedisTokenCache, token_cache_key
+
+
+class FakeRedis:
+    """RedisTokenCache 用到的几个命令，过期时间按秒记录"""
+
+    def __init__(self):
+        self.values = {}
+        self.expires = {}
+
+    def _alive(self, key):
+        if key in self.expires and self.expires[key] <= time.time():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.values
+
+    def get(self, key):
+        return self.values[key] if self._alive(key) else None
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value.encode('utf-8') if isinstance(value, str) else value
+        if ex is not None:
+            self.expires[key] = time.time() + ex
+
+    def sadd(self, key, member):
+        if not self._alive(key):
+            self.values[key] = set()
+        self.values[key].add(member.encode('utf-8'))
+
+    def smembers(self, key):
+        return set(self.values[key]) if self._alive(key) else set()
+
+    def expire(self, key, seconds):
+        self.expires[key] = time.time() + seconds
+
+    def delete(self, key):
+        self.values.pop(key, None)
+        self.expires.pop(key, None)
+
+    def scan_iter(self, pattern):
+        return [key for key in list(self.values) if fnmatch.fnmatch(key, pattern)]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        for name, args, kwargs in self.calls:
+            getattr(self.client, name)(*args, **kwargs)
+        self.calls = []
+
+
+def _redis_cache(ttl=300):
+    cache = RedisTokenCache.__new__(RedisTokenCache)
+    cache.ttl = ttl
+    cache._client = FakeRedis()
+    return cache
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def cache(request):
+    return MemoryTokenCache(max_size=100) if request.param == 'memory' else _redis_cache()
+
+
+ALICE = {'id': 1, 'username': 'alice'}
+BOB = {'id': 2, 'username': 'bob'}
+
+
+def test_set_and_get(cache):
+    cache.set(token_cache_key('t1'), ALICE)
+    assert cache.get(token_cache_key('t1')) == ALICE
+    assert cache.get(token_cache_key('other')) is None
+
+
+def test_expired_token_is_not_cached(cache):
+    cache.set(token_cache_key('t1'), ALICE, exp=time.time() - 1)
+    assert cache.get(token_cache_key('t1')) is None
+
+
+def test_invalidate_user_drops_all_their_tokens(cache):
+    for token in ('a1', 'a2'):
+        cache.set(token_cache_key(token), ALICE)
+    cache.set(token_cache_key('b1'), BOB)
+
+    cache.invalidate_user(ALICE['id'])
+    assert cache.get(token_cache_key('a1')) is None
+    assert cache.get(token_cache_key('a2')) is None
+    assert cache.get(token_cache_key('b1')) == BOB
+
+    # 之后重新缓存的 token 正常使用
+    cache.set(token_cache_key('a3'), ALICE)
+    assert cache.get(token_cache_key('a3')) == ALICE
+
+
+def test_module_invalidate_user_uses_global_cache(monkeypatch):
+    cache = MemoryTokenCache()
+    monkeypatch.setattr(token_cache, '_cache', cache)
+    cache.set(token_cache_key('t'), ALICE)
+    token_cache.invalidate_user(ALICE['id'])
+    assert cache.get(token_cache_key('t')) is None
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryTokenCache(max_size=2)
+    cache.set('a', ALICE)
+    cache.set('b', BOB)
+    cache.get('a')
+    cache.set('c', {'id': 3, 'username': 'carol'})
+    assert cache.get('b') is None
+    assert cache.get('a') == ALICE
+    # 被淘汰的条目不再出现在用户索引中
+    cache.invalidate_user(BOB['id'])
+    assert BOB['id'] not in cache._user_keys
@@ -0,0 +1,65 @@
+import io
+import os
+import zipfile
+from utils import zip_stream
+from utils.zip_stream import iter_zip
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def test_stream_reads_back_as_zip(tmp_path, monkeypatch):
+    monkeypatch.setattr(zip_stream, 'COPY_BUFFER_SIZE', 1000)
+    files = {
+        '宁夏/report.json': '{"报告": "内容"}'.encode('utf-8') * 500,
+        '宁夏/pic/001.jpg': os.urandom(5000),
+        '宁夏/record/空.json': b'',
+    }
+    entries = [(name, _write(str(tmp_path / f'f{i}{os.path.splitext(name)[1]}'), data)) for i, (name, data) in enumerate(files.items())]
+
+    chunks = list(iter_zip(iter(entries)))
+    assert len(chunks) > len(files)
+
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == list(files)
+        for name, data in files.items():
+            assert zf.read(name) == data
+        assert zf.getinfo('宁夏/report.json').compress_type == zipfile.ZIP_DEFLATED
+        assert zf.getinfo('宁夏/pic/001.jpg').compress_type == zipfile.ZIP_STORED
+
+
+def test_empty_archive(tmp_path):
+    with zipfile.ZipFile(io.BytesIO(b''.join(iter_zip([])))) as zf:
+        assert zf.namelist() == []
+
+
+class _Catalog:
+    def __init__(self, root):
+        self.root = root
+        self.resolved = []
+
+    def local_path(self, case_id, rel_path):
+        self.resolved.append(rel_path)
+        path = os.path.join(self.root, case_id, *rel_path.split('/'))
+        return path if os.path.isfile(path) else None
+
+
+def test_case_entries_are_resolved_lazily(tmp_path):
+    _write(str(tmp_path / 'c' / 'report.json'), b'{}')
+    _write(str(tmp_path / 'c' / 'pic' / '1.jpg'), b'x')
+    case = {
+        'id': 'c', 'report': {'name': 'report.json'}, 'graph': None,
+        'dirs': {'pic': {'1.jpg': {}}, 'record': {'gone.json': {}}},
+    }
+    catalog = _Catalog(str(tmp_path))
+
+    entries = zip_stream.case_zip_entries(catalog, case, root_name='案例')
+    assert catalog.resolved == []
+    # 已被删除的文件跳过，不中断整个压缩包
+    assert [name for name, _ in entries] == ['案例/report.json', '案例/pic/1.jpg']
+    assert catalog.resolved == ['report.json', 'pic/1.jpg', 'record/gone.json']
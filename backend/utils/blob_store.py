@@ -0,0 +1,463 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import mimetypes
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+from utils.storage import get_upload_storage
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 上传目录中的内部文件：按内容哈希存放的文件和元数据索引
+BLOB_DIR_NAME = '.blobs'
+INDEX_FILE_NAME = '.index.sqlite3'
+
+# 远程存储中的引用：refs/<uid> 保存文件元数据，blob-refs/<sha256>/<uid> 标记内容被哪些 uid 引用
+REF_PREFIX = 'refs/'
+BLOB_REF_PREFIX = 'blob-refs/'
+
+# 使用远程存储时，文件列表至少每隔这么多秒按远程引用同步一次本地索引
+UPLOAD_REF_SYNC_INTERVAL = float(os.getenv('UPLOAD_REF_SYNC_INTERVAL', '10'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    uid TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL REFERENCES blobs(sha256),
+    original_name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    upload_time TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    shared INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_files_upload_time ON files (upload_time, uid);
+CREATE INDEX IF NOT EXISTS idx_files_size ON files (size, uid);
+CREATE INDEX IF NOT EXISTS idx_files_name ON files (original_name, uid);
+CREATE INDEX IF NOT EXISTS idx_files_type ON files (type, upload_time);
+CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files (sha256);
+"""
+
+# 文件列表允许的排序字段 -> files 表中的列
+SORT_COLUMNS = {
+    'upload_time': 'upload_time',
+    'size': 'size',
+    'name': 'original_name',
+}
+
+
+def _file_info(row, blob_path):
+    return {
+        'filename': row['uid'],
+        'original_name': row['original_name'],
+        'path': blob_path,
+        'size': row['size'],
+        'type': row['type'],
+        'upload_time': row['upload_time'],
+        'sha256': row['sha256']
+    }
+
+
+class BlobStore:
+    """按内容哈希存储上传文件
+
+    相同内容只在 .blobs 中保存一份，每次上传在 files 表中登记一条引用
+    （uid 即对外的文件名），blobs.refcount 记录引用数，删除最后一个引用时才删除文件。
+    所有修改都在 SQLite 写事务中完成，多个 worker 共享同一份索引。
+
+    storage 为远程存储时，新内容写入本地后同时上传到 blobs/<sha256 前两位>/<sha256>，
+    本地没有的内容（其他节点上传的、或本地已清理的）从远程读取到读缓存。
+    每条引用也写到远程的 refs/<uid>，远程引用是各节点共享的记录，本地索引是它的副本：
+    按 uid 查不到时从远程引用补登记，列文件时定期同步（登记新增的、移除其他节点删除的）。
+    files.shared 标记引用已写到远程，只有这样的记录在远程消失时才视为被删除。
+    远程内容在没有任何 blob-refs 标记时才删除。对象存储没有事务，另一节点恰好同时秒传同一内容时
+    可能留下指向已删除内容的引用，这种情况下 resolve 返回 None，与文件不存在相同。
+    """
+
+    def __init__(self, upload_folder, storage=None, sync_interval=UPLOAD_REF_SYNC_INTERVAL):
+        self.upload_folder = upload_folder
+        self.storage = storage if storage is not None and not storage.is_local else None
+        self.sync_interval = sync_interval
+        self.blob_dir = os.path.join(upload_folder, BLOB_DIR_NAME)
+        self.index_path = os.path.join(upload_folder, INDEX_FILE_NAME)
+        self._synced_at = None
+        self._sync_lock = threading.Lock()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        with self._write() as conn:
+            # 旧版本的索引没有 shared 列
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(files)')}
+            if 'shared' not in columns:
+                conn.execute('ALTER TABLE files ADD COLUMN shared INTEGER NOT NULL DEFAULT 0')
+        self.import_legacy_files()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """写事务：BEGIN IMMEDIATE 取得写锁，文件的移动和删除也在锁内完成"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    def _blob_key(self, sha256):
+        return f'blobs/{sha256[:2]}/{sha256}'
+
+    @staticmethod
+    def _ref_key(uid):
+        return REF_PREFIX + uid
+
+    @staticmethod
+    def _blob_ref_key(sha256, uid):
+        return f'{BLOB_REF_PREFIX}{sha256}/{uid}'
+
+    def _blob_exists(self, sha256):
+        if os.path.exists(self.blob_path(sha256)):
+            return True
+        return self.storage is not None and self.storage.stat(self._blob_key(sha256)) is not None
+
+    def _uid_taken(self, conn, uid):
+        if conn.execute('SELECT 1 FROM files WHERE uid = ?', (uid,)).fetchone():
+            return True
+        # 其他节点已使用、本地还没同步到的 uid
+        return self.storage is not None and self.storage.stat(self._ref_key(uid)) is not None
+
+    def _unique_uid(self, conn, original_name, timestamp):
+        # 添加时间戳到文件名，同一秒内重名时追加序号
+        name, ext = os.path.splitext(original_name)
+        uid = f"{name}_{timestamp}{ext}"
+        n = 1
+        while self._uid_taken(conn, uid):
+            uid = f"{name}_{timestamp}_{n}{ext}"
+            n += 1
+        return uid
+
+    def _add_ref(self, conn, sha256, size, original_name, uid=None, upload_time=None, shared=False):
+        upload_time = upload_time or datetime.now().strftime('%Y%m%d_%H%M%S')
+        uid = uid or self._unique_uid(conn, original_name, upload_time)
+        file_type = mimetypes.guess_type(original_name)[0] or 'application/octet-stream'
+        conn.execute('UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = ?', (sha256,))
+        conn.execute(
+            'INSERT INTO files (uid, sha256, original_name, size, type, upload_time, created_at, shared) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (uid, sha256, original_name, size, file_type, upload_time, time.time(), int(shared))
+        )
+        row = conn.execute('SELECT * FROM files WHERE uid = ?', (uid,)).fetchone()
+        return _file_info(row, self.blob_path(sha256))
+
+    def _publish(self, info):
+        """把引用写到远程存储，其他节点据此找到这个文件"""
+        uid, sha256 = info['filename'], info['sha256']
+        # 先写内容的引用标记再写引用，删除内容前检查标记时不会漏掉这条引用
+        self.storage.put_bytes(self._blob_ref_key(sha256, uid), b'')
+        ref = {'sha256': sha256, 'original_name': info['original_name'], 'size': info['size'],
+               'upload_time': info['upload_time']}
+        self.storage.put_bytes(self._ref_key(uid), json.dumps(ref, ensure_ascii=False).encode('utf-8'))
+        with self._write() as conn:
+            conn.execute('UPDATE files SET shared = 1 WHERE uid = ?', (uid,))
+
+    def _publish_or_undo(self, info):
+        try:
+            self._publish(info)
+        except Exception:
+            self.delete_reference(info['filename'])
+            raise
+
+    def add_reference(self, sha256, original_name, size=None):
+        """内容已存在时直接登记一条新引用并返回文件信息（秒传），否则返回 None"""
+        sha256 = sha256.lower()
+        with self._write() as conn:
+            blob = conn.execute('SELECT size FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()
+            if blob is None and self.storage is not None:
+                # 其他节点上传过的内容
+                remote = self.storage.stat(self._blob_key(sha256))
+                if remote is not None:
+                    conn.execute('INSERT INTO blobs (sha256, size, refcount) VALUES (?, ?, 0)', (sha256, remote.size))
+                    blob = {'size': remote.size}
+            if blob is None or (size is not None and blob['size'] != size):
+                return None
+            if not self._blob_exists(sha256):
+                return None
+            info = self._add_ref(conn, sha256, blob['size'], original_name)
+
+        if self.storage is not None:
+            self._publish_or_undo(info)
+        return info
+
+    def store_file(self, src_path, sha256, size, original_name, uid=None, upload_time=None):
+        """把已计算好哈希的临时文件存入仓库；内容已存在时丢弃临时文件，不重复写入"""
+        sha256 = sha256.lower()
+        path = self.blob_path(sha256)
+        uploaded = False
+        with self._write() as conn:
+            blob = conn.execute('SELECT 1 FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()
+            if blob is not None and os.path.exists(path):
+                os.remove(src_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(src_path, path)
+                conn.execute(
+                    'INSERT INTO blobs (sha256, size, refcount) VALUES (?, ?, 0) '
+                    'ON CONFLICT(sha256) DO NOTHING',
+                    (sha256, size)
+                )
+                uploaded = self.storage is not None
+            info = self._add_ref(conn, sha256, size, original_name, uid, upload_time)
+
+        if self.storage is not None:
+            # 上传可能耗时较长，放在写事务之外；失败时撤销这次登记
+            if uploaded:
+                try:
+                    self.storage.put_file(self._blob_key(sha256), path)
+                except Exception:
+                    self.delete_reference(info['filename'])
+                    raise
+            self._publish_or_undo(info)
+        return info
+
+    def _remove_local(self, uid):
+        """从本地索引删除一条引用，本地引用数归零时删除本地文件；返回其 sha256，uid 不存在返回 None"""
+        with self._write() as conn:
+            row = conn.execute('SELECT sha256 FROM files WHERE uid = ?', (uid,)).fetchone()
+            if row is None:
+                return None
+            sha256 = row['sha256']
+            conn.execute('DELETE FROM files WHERE uid = ?', (uid,))
+            conn.execute('UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?', (sha256,))
+            blob = conn.execute('SELECT refcount FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()
+            if blob is not None and blob['refcount'] <= 0:
+                conn.execute('DELETE FROM blobs WHERE sha256 = ?', (sha256,))
+                try:
+                    os.remove(self.blob_path(sha256))
+                except FileNotFoundError:
+                    pass
+            return sha256
+
+    def delete_reference(self, uid):
+        """删除一条引用，引用数归零时删除文件；uid 不存在返回 False"""
+        if self.storage is not None and self.get(uid) is None:
+            return False
+        sha256 = self._remove_local(uid)
+        if sha256 is None:
+            return False
+        if self.storage is not None:
+            try:
+                self.storage.delete(self._ref_key(uid))
+                self.storage.delete(self._blob_ref_key(sha256, uid))
+                # 所有节点上都没有引用时才删除远程内容
+                if next(iter(self.storage.list(f'{BLOB_REF_PREFIX}{sha256}/')), None) is None:
+                    self.storage.delete(self._blob_key(sha256))
+            except Exception as e:
+                logger.error("删除远程文件失败 %s: %s", uid, e)
+        return True
+
+    def _import_ref(self, uid):
+        """把远程引用登记到本地索引，返回文件信息；远程也没有时返回 None"""
+        data = self.storage.read_bytes(self._ref_key(uid))
+        if data is None:
+            return None
+        ref = json.loads(data)
+        with self._write() as conn:
+            row = conn.execute('SELECT * FROM files WHERE uid = ?', (uid,)).fetchone()
+            if row is not None:
+                return _file_info(row, self.blob_path(row['sha256']))
+            conn.execute(
+                'INSERT INTO blobs (sha256, size, refcount) VALUES (?, ?, 0) ON CONFLICT(sha256) DO NOTHING',
+                (ref['sha256'], ref['size'])
+            )
+            return self._add_ref(conn, ref['sha256'], ref['size'], ref['original_name'], uid,
+                                 ref['upload_time'], shared=True)
+
+    def sync_refs(self, force=False):
+        """按远程引用同步本地索引：登记其他节点上传的文件，移除其他节点删除的文件
+
+        两次同步至少间隔 sync_interval 秒；本地存储时什么都不做。
+        """
+        if self.storage is None:
+            return
+        with self._sync_lock:
+            now = time.monotonic()
+            if not force and self._synced_at is not None and now - self._synced_at < self.sync_interval:
+                return
+            self._synced_at = now
+
+        # 先读本地再列远程：读到 shared 的记录时它的远程引用已经写好，列表中没有就是被删除了
+        conn = self._connect()
+        try:
+            local = {row['uid']: row['shared'] for row in conn.execute('SELECT uid, shared FROM files')}
+        finally:
+            conn.close()
+        remote = {info.key[len(REF_PREFIX):] for info in self.storage.list(REF_PREFIX)}
+
+        for uid in remote - set(local):
+            try:
+                self._import_ref(uid)
+            except (ValueError, KeyError) as e:
+                logger.error("远程引用格式错误 %s: %s", uid, e)
+        for uid, shared in local.items():
+            if shared and uid not in remote:
+                self._remove_local(uid)
+
+    def _sync_before_listing(self):
+        try:
+            self.sync_refs()
+        except Exception as e:
+            # 远程存储不可用时仍返回本地已知的文件
+            logger.error("同步远程引用失败: %s", e)
+
+    def get(self, uid):
+        """按 uid 获取文件信息，不存在返回 None"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM files WHERE uid = ?', (uid,)).fetchone()
+        finally:
+            conn.close()
+        if row is not None:
+            return _file_info(row, self.blob_path(row['sha256']))
+        if self.storage is not None:
+            return self._import_ref(uid)
+        return None
+
+    def resolve(self, uid):
+        """uid 对应的磁盘路径，不存在返回 None"""
+        info = self.get(uid)
+        if info is None:
+            return None
+        if os.path.exists(info['path']):
+            return info['path']
+        if self.storage is not None:
+            return self.storage.local_path(self._blob_key(info['sha256']))
+        return None
+
+    def list(self):
+        """所有文件信息，按上传时间倒序"""
+        self._sync_before_listing()
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT * FROM files ORDER BY upload_time DESC, uid DESC').fetchall()
+        finally:
+            conn.close()
+        return [_file_info(row, self.blob_path(row['sha256'])) for row in rows]
+
+    def query(self, limit=50, after=None, sort='upload_time', order='desc',
+              file_type=None, date_from=None, date_to=None):
+        """分页查询文件列表，返回 (files, last_key)
+
+        使用 (排序字段, uid) 做键集分页：after 为上一页最后一条的 last_key，
+        每页只读取 limit 条，与文件总数无关。
+        file_type 为完整 MIME 类型或前缀（如 image）；date_from / date_to 为 YYYYMMDD，均包含当天。
+        """
+        self._sync_before_listing()
+        column = SORT_COLUMNS[sort]
+        desc = order == 'desc'
+        conditions = []
+        params = []
+
+        if file_type:
+            if '/' in file_type:
+                conditions.append('type = ?')
+                params.append(file_type)
+            else:
+                conditions.append('type >= ? AND type < ?')
+                params.extend([f'{file_type}/', f'{file_type}0'])
+        if date_from:
+            conditions.append('upload_time >= ?')
+            params.append(date_from)
+        if date_to:
+            conditions.append('upload_time < ?')
+            params.append(f'{date_to}_999999')
+        if after is not None:
+            conditions.append(f"({column}, uid) {'<' if desc else '>'} (?, ?)")
+            params.extend(after)
+
+        direction = 'DESC' if desc else 'ASC'
+        sql = 'SELECT * FROM files'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += f' ORDER BY {column} {direction}, uid {direction} LIMIT ?'
+        params.append(limit + 1)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+        last_key = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_key = [rows[-1][column], rows[-1]['uid']]
+        return [_file_info(row, self.blob_path(row['sha256'])) for row in rows], last_key
+
+    def import_legacy_files(self):
+        """把旧版本直接保存在上传目录下的文件迁入仓库，保留原文件名作为 uid"""
+        for entry in os.scandir(self.upload_folder):
+            if entry.name.startswith('.') or not entry.is_file() or entry.name.endswith('_preview.png'):
+                continue
+            # 从 "原名_日期_时间.ext" 中解析原始文件名和上传时间
+            name, ext = os.path.splitext(entry.name)
+            name_parts = name.rsplit('_', 2)
+            if len(name_parts) >= 3 and name_parts[-2].isdigit() and name_parts[-1].isdigit():
+                original_name = name_parts[0] + ext
+                upload_time = name_parts[-2] + '_' + name_parts[-1]
+            else:
+                original_name = entry.name
+                upload_time = datetime.fromtimestamp(entry.stat().st_mtime).strftime('%Y%m%d_%H%M%S')
+
+            size = entry.stat().st_size
+            sha = hashlib.sha256()
+            with open(entry.path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(block)
+            try:
+                self.store_file(entry.path, sha.hexdigest(), size, original_name,
+                                uid=entry.name, upload_time=upload_time)
+            except sqlite3.IntegrityError:
+                continue
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_blob_store(upload_folder):
+    """每个上传目录一个 BlobStore 实例，首次使用时迁移旧文件"""
+    upload_folder = os.path.abspath(upload_folder)
+    store = _stores.get(upload_folder)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(upload_folder)
+            if store is None:
+                store = BlobStore(upload_folder, get_upload_storage(upload_folder))
+                _stores[upload_folder] = store
+    return store
@@ -0,0 +1,276 @@
+import os
+import time
+import mimetypes
+import threading
+import logging
+from dotenv import load_dotenv
+from utils.storage import get_case_storage
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# case_show 目录，默认位于项目根目录，可通过环境变量 CASE_DIR 指定
+CASE_DIR = os.getenv('CASE_DIR') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'case_show'
+)
+
+# 两次检查目录变化之间的最短间隔（秒）；期间的请求直接使用内存索引
+CASE_CATALOG_POLL_INTERVAL = float(os.getenv('CASE_CATALOG_POLL_INTERVAL', '5'))
+# 案例存放在对象存储中时，每次检查都要列出全部对象，间隔相应加长
+CASE_CATALOG_REMOTE_POLL_INTERVAL = float(os.getenv('CASE_CATALOG_REMOTE_POLL_INTERVAL', '60'))
+
+# 案例目录下会被索引的子目录
+CASE_SUBDIRS = ('pic', 'record')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+
+
+def _file_entry(name, st):
+    return {
+        'name': name,
+        'size': st.st_size,
+        'mtime': st.st_mtime,
+        'extension': os.path.splitext(name)[1],
+        'type': mimetypes.guess_type(name)[0] or 'application/octet-stream',
+    }
+
+
+def _object_entry(info):
+    name = info.key.rsplit('/', 1)[-1]
+    return {
+        'name': name,
+        'size': info.size,
+        'mtime': info.mtime,
+        'extension': os.path.splitext(name)[1],
+        'type': mimetypes.guess_type(name)[0] or 'application/octet-stream',
+    }
+
+
+def _dir_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class CaseCatalog:
+    """case_show 目录的内存索引
+
+    启动时扫描一次，记录每个案例的 report.json、graph.html 以及 pic、record
+    目录中文件的大小、修改时间和类型。之后按 poll_interval 轮询目录的 mtime，
+    只重新扫描发生变化的案例，请求本身不再访问文件系统。
+
+    storage 为远程存储（utils.storage）时没有目录 mtime 可用，每个轮询间隔列出一次
+    全部对象重建索引；文件通过 local_path 从本地读缓存中取得。
+    """
+
+    def __init__(self, root=CASE_DIR, poll_interval=None, storage=None):
+        self.root = root
+        self.storage = storage
+        self.remote = storage is not None and not storage.is_local
+        if poll_interval is None:
+            poll_interval = CASE_CATALOG_REMOTE_POLL_INTERVAL if self.remote else CASE_CATALOG_POLL_INTERVAL
+        self.poll_interval = poll_interval
+        self._cases = {}
+        self._root_mtime = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    # ---- 扫描 ----
+
+    def _scan_case(self, case_id):
+        case_path = os.path.join(self.root, case_id)
+        case = {
+            'id': case_id,
+            'name': f'{case_id}火灾事故',
+            'path': case_path,
+            'report': None,
+            'graph': None,
+            'dirs': {},
+            'dir_mtimes': {'': _dir_mtime(case_path)},
+        }
+        with os.scandir(case_path) as it:
+            for item in it:
+                if item.is_file():
+                    if item.name == 'report.json':
+                        case['report'] = _file_entry(item.name, item.stat())
+                    elif item.name == 'graph.html':
+                        case['graph'] = _file_entry(item.name, item.stat())
+                elif item.is_dir() and item.name in CASE_SUBDIRS:
+                    files = {}
+                    with os.scandir(item.path) as children:
+                        for child in children:
+                            if child.is_file():
+                                files[child.name] = _file_entry(child.name, child.stat())
+                    case['dirs'][item.name] = dict(sorted(files.items()))
+                    case['dir_mtimes'][item.name] = _dir_mtime(item.path)
+        case['dirs'] = {name: case['dirs'][name] for name in CASE_SUBDIRS if name in case['dirs']}
+        return case
+
+    def _scan_objects(self):
+        """按对象列表构建全部案例的索引：<案例>/report.json、<案例>/graph.html、<案例>/<pic|record>/<文件>"""
+        cases = {}
+        for info in self.storage.list():
+            parts = info.key.split('/')
+            if len(parts) == 2 and parts[1] in ('report.json', 'graph.html'):
+                case_id, rel_path = parts[0], parts[1]
+            elif len(parts) == 3 and parts[1] in CASE_SUBDIRS:
+                case_id, rel_path = parts[0], f'{parts[1]}/{parts[2]}'
+            else:
+                continue
+            case = cases.get(case_id)
+            if case is None:
+                case = cases[case_id] = {
+                    'id': case_id,
+                    'name': f'{case_id}火灾事故',
+                    'path': None,
+                    'report': None,
+                    'graph': None,
+                    'dirs': {},
+                    'objects': {},
+                }
+            entry = _object_entry(info)
+            case['objects'][rel_path] = info
+            if rel_path == 'report.json':
+                case['report'] = entry
+            elif rel_path == 'graph.html':
+                case['graph'] = entry
+            else:
+                case['dirs'].setdefault(parts[1], {})[parts[2]] = entry
+        for case in cases.values():
+            case['dirs'] = {name: dict(sorted(case['dirs'][name].items()))
+                            for name in CASE_SUBDIRS if name in case['dirs']}
+        return dict(sorted(cases.items()))
+
+    def _case_changed(self, case):
+        if _dir_mtime(case['path']) != case['dir_mtimes']['']:
+            return True
+        for subdir in CASE_SUBDIRS:
+            if _dir_mtime(os.path.join(case['path'], subdir)) != case['dir_mtimes'].get(subdir):
+                return True
+        return False
+
+    def refresh(self, force=False):
+        """检查目录变化并增量更新索引"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self.poll_interval:
+                return
+            self._checked_at = now
+
+            if self.remote:
+                try:
+                    self._cases = self._scan_objects()
+                    # 远程存储没有目录 mtime，列出成功即视为案例目录存在
+                    self._root_mtime = 0
+                except Exception as e:
+                    # 保留上一次的索引，下个间隔再重试
+                    logger.error("Error listing cases from %s: %s", self.storage.backend.name, e)
+                return
+
+            root_mtime = _dir_mtime(self.root)
+            if root_mtime is None:
+                self._cases = {}
+                self._root_mtime = None
+                return
+
+            if force or root_mtime != self._root_mtime:
+                names = sorted(
+                    entry.name for entry in os.scandir(self.root) if entry.is_dir()
+                )
+                self._root_mtime = root_mtime
+            else:
+                names = list(self._cases)
+
+            cases = {}
+            for case_id in names:
+                case = self._cases.get(case_id)
+                try:
+                    if force or case is None or self._case_changed(case):
+                        logger.debug("Indexing case: %s", case_id)
+                        case = self._scan_case(case_id)
+                except OSError as e:
+                    logger.error("Error indexing case %s: %s", case_id, e)
+                    continue
+                cases[case_id] = case
+            self._cases = cases
+
+    # ---- 查询 ----
+
+    def exists(self):
+        self.refresh()
+        return self._root_mtime is not None
+
+    def list_cases(self):
+        """所有案例的 id 与名称"""
+        self.refresh()
+        return [{'id': case['id'], 'name': case['name']} for case in self._cases.values()]
+
+    def get_case(self, case_id):
+        """单个案例的索引，不存在时返回 None"""
+        self.refresh()
+        return self._cases.get(case_id)
+
+    def list_files(self, case_id, subdir):
+        """案例子目录（pic / record）中的文件条目"""
+        case = self.get_case(case_id)
+        if case is None:
+            return []
+        return list(case['dirs'].get(subdir, {}).values())
+
+    def get_entry(self, case_id, rel_path):
+        """按相对路径查找案例中的文件条目，如 report.json、pic/001.jpg"""
+        case = self.get_case(case_id)
+        if case is None:
+            return None
+        rel_path = rel_path.replace('\\', '/').strip('/')
+        if rel_path == 'report.json':
+            return case['report']
+        if rel_path == 'graph.html':
+            return case['graph']
+        folder, _, name = rel_path.partition('/')
+        return case['dirs'].get(folder, {}).get(name)
+
+    def version(self, case_id, rel_path):
+        """文件的版本 (mtime, size)，用于判断内容是否变化；不存在时返回 None
+
+        本地文件直接 stat（原地修改文件不会改变目录 mtime），远程对象使用索引中的记录。
+        """
+        if not self.remote:
+            try:
+                st = os.stat(os.path.join(self.root, case_id, *rel_path.split('/')))
+            except OSError:
+                return None
+            return st.st_mtime_ns, st.st_size
+        entry = self.get_entry(case_id, rel_path)
+        return (entry['mtime'], entry['size']) if entry is not None else None
+
+    def local_path(self, case_id, rel_path):
+        """案例中文件的本地路径，远程存储时为读缓存中的副本（必要时先下载）；不存在时返回 None"""
+        parts = [part for part in rel_path.replace('\\', '/').split('/') if part]
+        if not parts or '..' in parts or case_id in ('', '.', '..'):
+            return None
+        if not self.remote:
+            path = os.path.join(self.root, case_id, *parts)
+            return path if os.path.isfile(path) else None
+        rel_path = '/'.join(parts)
+        case = self.get_case(case_id)
+        info = case['objects'].get(rel_path) if case is not None else None
+        return self.storage.local_path(f'{case_id}/{rel_path}', info)
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_case_catalog():
+    """全局案例索引，首次调用时完成扫描"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                catalog = CaseCatalog(storage=get_case_storage(CASE_DIR))
+                catalog.refresh(force=True)
+                _catalog = catalog
+    return _catalog
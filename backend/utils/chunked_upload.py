@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from werkzeug.utils import secure_filename
+from utils.blob_store import get_blob_store
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只使用进程内锁
+    fcntl = None
+
+load_dotenv()
+
+# 分片上传配置
+CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(4 * 1024 * 1024)))            # 建议的分片大小
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', str(2 * 1024 * 1024 * 1024)))   # 单个文件总大小上限
+UPLOAD_SESSION_EXPIRE = int(os.getenv('UPLOAD_SESSION_EXPIRE', str(24 * 3600)))    # 未完成的上传保留秒数
+
+SESSION_DIR_NAME = '.chunks'
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """分片上传协议错误，status 为对应的 HTTP 状态码"""
+
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+# upload_id -> (已哈希的字节数, sha256 对象)；进程重启或换 worker 后从分片文件重建
+_hashers = {}
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _session_dir(upload_folder, upload_id):
+    if not upload_id or secure_filename(upload_id) != upload_id:
+        raise UploadError('无效的上传ID', 404)
+    return os.path.join(upload_folder, SESSION_DIR_NAME, upload_id)
+
+
+def _read_meta(session_dir):
+    try:
+        with open(os.path.join(session_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise UploadError('上传不存在或已过期', 404)
+
+
+def _write_meta(session_dir, meta):
+    tmp_path = os.path.join(session_dir, 'meta.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(session_dir, 'meta.json'))
+
+
+class _SessionLock:
+    """同一上传的分片串行写入：进程内用线程锁，支持 fcntl 时再加文件锁防止多 worker 并发"""
+
+    def __init__(self, session_dir, upload_id):
+        with _locks_guard:
+            self._lock = _locks.setdefault(upload_id, threading.Lock())
+        self._path = os.path.join(session_dir, 'lock')
+        self._fd = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if fcntl is not None:
+            try:
+                self._fd = os.open(self._path, os.O_CREAT | os.O_RDWR)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except OSError:
+                self._lock.release()
+                raise UploadError('上传不存在或已过期', 404)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._lock.release()
+
+
+def _hasher_at(upload_id, part_path, offset):
+    """返回已覆盖前 offset 字节的 sha256 对象"""
+    cached = _hashers.get(upload_id)
+    if cached is not None and cached[0] == offset:
+        return cached[1]
+
+    sha = hashlib.sha256()
+    with open(part_path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+            sha.update(block)
+    return sha
+
+
+def cleanup_expired_sessions(upload_folder):
+    """删除超过 UPLOAD_SESSION_EXPIRE 未更新的上传"""
+    root = os.path.join(upload_folder, SESSION_DIR_NAME)
+    if not os.path.isdir(root):
+        return
+    deadline = time.time() - UPLOAD_SESSION_EXPIRE
+    for entry in os.scandir(root):
+        try:
+            if entry.is_dir() and entry.stat().st_mtime < deadline:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                _hashers.pop(entry.name, None)
+                with _locks_guard:
+                    _locks.pop(entry.name, None)
+        except OSError:
+            continue
+
+
+def init_upload(upload_folder, filename, size=None, sha256=None):
+    """创建上传会话，返回会话状态
+
+    客户端提供 sha256 且服务器已有相同内容时不再创建会话，直接登记文件并返回
+    {'complete': True, 'file': 文件信息}，无需再上传数据。
+    """
+    original_filename = secure_filename(filename or '')
+    if not original_filename:
+        raise UploadError('文件名无效')
+    if size is not None:
+        size = int(size)
+        if size < 0 or size > MAX_UPLOAD_SIZE:
+            raise UploadError(f'文件大小超出限制（最大{MAX_UPLOAD_SIZE}字节）', 413)
+
+    if sha256:
+        info = get_blob_store(upload_folder).add_reference(sha256, original_filename, size)
+        if info is not None:
+            return {'complete': True, 'file': info}
+
+    cleanup_expired_sessions(upload_folder)
+
+    upload_id = uuid.uuid4().hex
+    session_dir = _session_dir(upload_folder, upload_id)
+    os.makedirs(session_dir)
+    open(os.path.join(session_dir, 'data.part'), 'wb').close()
+    meta = {
+        'upload_id': upload_id,
+        'filename': original_filename,
+        'size': size,
+        'sha256': sha256.lower() if sha256 else None,
+        'created_at': time.time(),
+    }
+    _write_meta(session_dir, meta)
+    return get_status(upload_folder, upload_id)
+
+
+def get_status(upload_folder, upload_id):
+    """上传会话状态，offset 为服务端已收到的字节数，断线后从该位置续传"""
+    session_dir = _session_dir(upload_folder, upload_id)
+    meta = _read_meta(session_dir)
+    meta['complete'] = False
+    meta['offset'] = os.path.getsize(os.path.join(session_dir, 'data.part'))
+    meta['chunk_size'] = CHUNK_SIZE
+    return meta
+
+
+def write_chunk(upload_folder, upload_id, offset, stream):
+    """把 stream 中的数据追加到 offset 处并更新 sha256，返回新的 offset
+
+    offset 必须等于服务端已收到的字节数，否则返回 409 和当前 offset 供客户端续传。
+    数据边读边写，不在内存中缓存整个分片。
+    """
+    session_dir = _session_dir(upload_folder, upload_id)
+    meta = _read_meta(session_dir)
+    part_path = os.path.join(session_dir, 'data.part')
+
+    with _SessionLock(session_dir, upload_id):
+        current = os.path.getsize(part_path)
+        if offset != current:
+            raise UploadError('分片偏移量不匹配', 409, offset=current)
+
+        sha = _hasher_at(upload_id, part_path, current)
+        limit = meta['size'] if meta['size'] is not None else MAX_UPLOAD_SIZE
+        written = current
+        try:
+            with open(part_path, 'ab') as f:
+                while True:
+                    block = stream.read(COPY_BUFFER_SIZE)
+                    if not block:
+                        break
+                    written += len(block)
+                    if written > limit:
+                        raise UploadError('上传数据超出声明的文件大小', 413)
+                    f.write(block)
+                    sha.update(block)
+        except Exception:
+            # 写入中断时截断到本分片开始前，保证分片文件与哈希状态一致
+            with open(part_path, 'ab') as f:
+                f.truncate(current)
+            _hashers.pop(upload_id, None)
+            raise
+
+        _hashers[upload_id] = (written, sha)
+        os.utime(session_dir)
+        return written
+
+
+def finalize_upload(upload_folder, upload_id):
+    """校验大小和 sha256 后把分片文件存入内容仓库，返回文件信息"""
+    session_dir = _session_dir(upload_folder, upload_id)
+    meta = _read_meta(session_dir)
+    part_path = os.path.join(session_dir, 'data.part')
+
+    with _SessionLock(session_dir, upload_id):
+        size = os.path.getsize(part_path)
+        if meta['size'] is not None and size != meta['size']:
+            raise UploadError('文件尚未上传完整', 409, offset=size)
+
+        digest = _hasher_at(upload_id, part_path, size).hexdigest()
+        if meta['sha256'] and meta['sha256'] != digest:
+            shutil.rmtree(session_dir, ignore_errors=True)
+            _hashers.pop(upload_id, None)
+            raise UploadError('文件校验失败，请重新上传', 422)
+
+        info = get_blob_store(upload_folder).store_file(part_path, digest, size, meta['filename'])
+
+    shutil.rmtree(session_dir, ignore_errors=True)
+    _hashers.pop(upload_id, None)
+    with _locks_guard:
+        _locks.pop(upload_id, None)
+    return info
+
+
+def abort_upload(upload_folder, upload_id):
+    """取消上传并删除已收到的数据"""
+    session_dir = _session_dir(upload_folder, upload_id)
+    _read_meta(session_dir)
+    shutil.rmtree(session_dir, ignore_errors=True)
+    _hashers.pop(upload_id, None)
+    with _locks_guard:
+        _locks.pop(upload_id, None)
+
+
+def store_stream(stream, filename, upload_folder):
+    """一次性上传：以单个分片走完整个协议，边读边写并计算 sha256"""
+    os.makedirs(upload_folder, exist_ok=True)
+    upload_id = init_upload(upload_folder, filename)['upload_id']
+    try:
+        write_chunk(upload_folder, upload_id, 0, stream)
+        return finalize_upload(upload_folder, upload_id)
+    except Exception:
+        try:
+            abort_upload(upload_folder, upload_id)
+        except UploadError:
+            pass
+        raise
@@ -0,0 +1,79 @@
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCacheLimit:
+    """限制一个磁盘缓存目录的总大小，按最近访问时间淘汰
+
+    命中时调用 touch 记录访问时间。只改 atime，mtime 保持不变（缓存文件的 mtime 会被当作 ETag 等版本使用）。
+    写入新文件后调用 added，每累计写入约 1/10 容量扫描一次目录，删除最久未访问的文件，
+    直到总大小降到上限的 90%。max_bytes 为 0 时不限制。
+    """
+
+    # 命中时最多每隔这么多秒更新一次 atime；这段时间内访问过的文件不删除，
+    # 返回给调用方（其他 worker 中的也一样）的路径来得及打开
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._written = max_bytes  # 首次写入后先做一次清理
+        self._lock = threading.Lock()
+
+    def touch(self, path, st=None):
+        st = st or os.stat(path)
+        now = time.time_ns()
+        if now - st.st_atime_ns > self.TOUCH_INTERVAL * 10 ** 9:
+            os.utime(path, ns=(now, st.st_mtime_ns))
+
+    def recently_used(self, st):
+        return time.time() - st.st_atime < self.TOUCH_INTERVAL
+
+    def added(self, size):
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            self._written += size
+            if self._written < self.max_bytes // 10:
+                return
+            self._written = 0
+        self.evict()
+
+    def evict(self):
+        """删除最久未访问的文件（及同名的 .lock 文件），直到总大小降到上限的 90%"""
+        files = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(('.lock', '.tmp')):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_atime, st.st_size, path, st))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return
+        files.sort(key=lambda f: f[0])
+        target = self.max_bytes * 9 // 10
+        for _, size, path, st in files:
+            if total <= target:
+                break
+            if self.recently_used(st):
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+            try:
+                os.remove(path + '.lock')
+            except OSError:
+                pass
+        logger.info("缓存目录 %s 清理后大小: %s bytes", self.root, total)
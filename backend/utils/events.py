@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 评分事件推送配置
+EVENTS_BACKEND = os.getenv('EVENTS_BACKEND', 'local')            # local 或 redis（多进程部署时跨进程广播）
+EVENTS_REDIS_URL = os.getenv('EVENTS_REDIS_URL', 'redis://localhost:6379/0')
+EVENTS_CHANNEL = os.getenv('EVENTS_CHANNEL', 'fire_gpt:score_events')
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', '256'))   # 每个客户端最多积压的事件数
+EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', '15'))    # 没有事件时发送心跳的间隔（秒）
+
+# 客户端积压超过上限时丢弃旧事件，改为通知客户端重新拉取
+RESYNC = {'type': 'resync'}
+# 进程退出时结束所有事件流
+CLOSE = {'type': 'close'}
+
+
+class Subscription:
+    """一个 SSE 客户端的有界事件队列，可只订阅部分报告"""
+
+    def __init__(self, report_ids=None, max_size=EVENTS_QUEUE_SIZE):
+        self.report_ids = set(report_ids) if report_ids else None
+        self.max_size = max(1, max_size)
+        self._events = deque()
+        self._cond = threading.Condition()
+
+    def matches(self, event):
+        return self.report_ids is None or event.get('report_id') in self.report_ids
+
+    def put(self, event):
+        with self._cond:
+            if len(self._events) >= self.max_size:
+                self._events.clear()
+                self._events.append(RESYNC)
+            self._events.append(event)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """取出下一个事件，timeout 秒内没有事件时返回 None"""
+        with self._cond:
+            if not self._events:
+                self._cond.wait(timeout)
+            return self._events.popleft() if self._events else None
+
+
+class LocalFanout:
+    """单进程部署：发布的事件直接投递给本进程的订阅者"""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, event):
+        self.broker.deliver(event)
+
+
+class RedisFanout:
+    """多进程部署：事件经 Redis 频道广播，每个进程的后台线程收到后投递给本进程的订阅者"""
+
+    def __init__(self, broker, url=EVENTS_REDIS_URL, channel=EVENTS_CHANNEL):
+        import redis  # 仅在启用 redis 后端时需要
+        self.broker = broker
+        self.channel = channel
+        self._client = redis.Redis.from_url(url)
+        threading.Thread(target=self._listen, name='score-events', daemon=True).start()
+
+    def publish(self, event):
+        self._client.publish(self.channel, json.dumps(event, ensure_ascii=False))
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self.broker.deliver(json.loads(message['data']))
+            except Exception as e:
+                logger.error("评分事件订阅中断，稍后重连: %s", e)
+                time.sleep(1)
+
+
+class EventBroker:
+    """进程内发布/订阅；跨进程广播交给 fanout"""
+
+    def __init__(self, backend=EVENTS_BACKEND):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self.fanout = RedisFanout(self) if backend == 'redis' else LocalFanout(self)
+
+    def subscribe(self, report_ids=None):
+        subscription = Subscription(report_ids)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def deliver(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                subscription.put(event)
+
+    def publish(self, event):
+        self.fanout.publish(event)
+
+    def close(self):
+        """结束所有事件流，让优雅退出时不必等待长连接超时"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.put(CLOSE)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+
+_broker = None
+_broker_pid = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """当前进程的事件中心；fork 出的子进程重新创建（Redis 监听线程不会随 fork 复制）"""
+    global _broker, _broker_pid
+    pid = os.getpid()
+    if _broker is None or _broker_pid != pid:
+        with _broker_lock:
+            if _broker is None or _broker_pid != pid:
+                _broker = EventBroker()
+                _broker_pid = pid
+    return _broker
+
+
+def close_broker():
+    """关闭当前进程的事件流（worker 退出时调用）"""
+    if _broker is not None and _broker_pid == os.getpid():
+        _broker.close()
+
+
+def publish_event(event):
+    """发布事件；推送失败只记录日志，不影响已经提交的写操作"""
+    try:
+        get_broker().publish(event)
+    except Exception as e:
+        logger.error("发布评分事件失败: %s", e)
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def iter_sse(broker, report_ids=None, heartbeat=EVENTS_HEARTBEAT):
+    """订阅事件并转换为 SSE 文本流；空闲时发送注释行作为心跳，客户端断开后自动退订
+
+    在生成器开始执行时才订阅，响应未被发送时不会留下订阅。
+    """
+    subscription = broker.subscribe(report_ids)
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            event = subscription.get(timeout=heartbeat)
+            if event is CLOSE:
+                return
+            yield ': keepalive\n\n' if event is None else format_sse(event)
+    finally:
+        broker.unsubscribe(subscription)
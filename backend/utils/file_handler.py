@@ -1,15 +1,25 @@
 import os
+import json
+import base64
+import logging
 import mimetypes
 from PIL import Image
 from datetime import datetime
 from werkzeug.utils import secure_filename
-import fitz
+from utils.pdf_preview import get_pdf_info, render_page
+from utils.chunked_upload import store_stream
+from utils.blob_store import SORT_COLUMNS, get_blob_store
+
+logger = logging.getLogger(__name__)
 
 ALLOWED_EXTENSIONS = {
     'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx',
     'fig', 'sketch', 'xd'
 }
 
+# 文件列表每页最大条数
+MAX_PAGE_SIZE = 500
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -19,50 +29,44 @@ def get_file_type(filename):
     return mime_type or 'application/octet-stream'
 
 def save_file(file, upload_folder):
-    """保存上传的文件"""
+    """保存上传的文件
+
+    以流的方式写入磁盘并计算 sha256，与分片上传走同一套流程。
+    """
     try:
         if file and allowed_file(file.filename):
-            original_filename = secure_filename(file.filename)
-            # 添加时间戳到文件名
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            name, ext = os.path.splitext(original_filename)
-            new_filename = f"{name}_{timestamp}{ext}"
-            
-            # 确保上传目录存在
-            os.makedirs(upload_folder, exist_ok=True)
-            
-            file_path = os.path.join(upload_folder, new_filename)
-            file.save(file_path)
-            
-            return {
-                'filename': new_filename,
-                'original_name': original_filename,
-                'path': file_path,
-                'size': os.path.getsize(file_path),
-                'type': get_file_type(file_path),
-                'upload_time': timestamp
-            }
+            return store_stream(file.stream, file.filename, upload_folder)
     except Exception as e:
-        print(f"文件保存失败: {str(e)}")
+        logger.error("文件保存失败: %s", e, exc_info=True)
         return None
     return None
 
-def generate_preview(file_path):
-    """生成文件预览"""
+def generate_preview(file_path, filename=None):
+    """生成文件预览
+
+    上传文件按内容哈希存储、磁盘路径没有扩展名，类型根据 filename 判断。
+    """
     if not os.path.exists(file_path):
         return None
-        
-    mime_type = get_file_type(file_path)
-    file_ext = os.path.splitext(file_path)[1].lower()
+
+    filename = filename or file_path
+    mime_type = get_file_type(filename)
+    file_ext = os.path.splitext(filename)[1].lower()
     
     try:
         # 图片文件直接返回路径
         if mime_type.startswith('image/'):
             return {'type': 'image', 'path': file_path}
         
-        # PDF文件处理
+        # PDF文件处理：渲染首页作为预览图
         elif mime_type == 'application/pdf' or file_ext == '.pdf':
-            return {'type': 'pdf', 'path': file_path}
+            preview_path, _ = render_page(file_path, page=1)
+            return {
+                'type': 'pdf',
+                'path': file_path,
+                'preview': preview_path,
+                'page_count': get_pdf_info(file_path)['page_count']
+            }
         
         # Word文档处理
         elif file_ext in ['.doc', '.docx']:
@@ -71,64 +75,102 @@ def generate_preview(file_path):
         # 其他类型文件
         return {'type': 'other', 'path': None}
     except Exception as e:
-        print(f"预览生成失败: {str(e)}")
+        logger.error("预览生成失败: %s", e, exc_info=True)
         return None
 
+def resolve_upload(file_uid, upload_folder):
+    """上传文件 uid 对应的磁盘路径，不存在返回 None"""
+    return get_blob_store(upload_folder).resolve(secure_filename(file_uid))
+
+def _list_item(info):
+    timestamp = info['upload_time']
+    # 格式化时间戳为易读格式，使用点号分隔日期，不显示秒数
+    formatted_time = f"{timestamp[:4]}.{timestamp[4:6]}.{timestamp[6:8]} {timestamp[9:11]}:{timestamp[11:13]}"
+    return {
+        'uid': info['filename'],
+        'filename': info['filename'],
+        'original_name': info['original_name'],
+        'size': info['size'],
+        'type': info['type'],
+        'upload_time': formatted_time
+    }
+
 def list_files(upload_folder):
     """列出上传目录中的所有文件"""
     try:
         if not os.path.exists(upload_folder):
             return []
-            
-        files = []
-        for filename in os.listdir(upload_folder):
-            if filename.endswith('_preview.png'):  # 跳过预览文件
-                continue
-                
-            file_path = os.path.join(upload_folder, filename)
-            if os.path.isfile(file_path):
-                # 获取原始文件名（去掉时间戳）
-                name, ext = os.path.splitext(filename)
-                name_parts = name.rsplit('_', 2)  # 分割出时间戳部分
-                
-                if len(name_parts) >= 3:  # 如果包含时间戳
-                    original_name = name_parts[0] + ext
-                    timestamp = name_parts[-2] + '_' + name_parts[-1]  # 组合时间戳
-                    # 格式化时间戳为易读格式，使用点号分隔日期，不显示秒数
-                    formatted_time = f"{timestamp[:4]}.{timestamp[4:6]}.{timestamp[6:8]} {timestamp[9:11]}:{timestamp[11:13]}"
-                else:
-                    original_name = filename
-                    formatted_time = datetime.now().strftime('%Y.%m.%d %H:%M')
-                
-                files.append({
-                    'uid': filename,
-                    'filename': filename,
-                    'original_name': original_name,
-                    'size': os.path.getsize(file_path),
-                    'type': get_file_type(file_path),
-                    'upload_time': formatted_time
-                })
-        return sorted(files, key=lambda x: x['upload_time'], reverse=True)
+
+        return [_list_item(info) for info in get_blob_store(upload_folder).list()]
     except Exception as e:
-        print(f"获取文件列表失败: {str(e)}")
+        logger.error("获取文件列表失败: %s", e, exc_info=True)
         return []
 
+def _parse_date(value):
+    """YYYY-MM-DD 或 YYYYMMDD -> YYYYMMDD"""
+    if not value:
+        return None
+    return datetime.strptime(value.replace('-', ''), '%Y%m%d').strftime('%Y%m%d')
+
+def query_files(upload_folder, limit=50, cursor=None, sort='upload_time', order='desc',
+                file_type=None, date_from=None, date_to=None):
+    """分页查询上传文件，直接读取元数据索引而不扫描目录
+
+    Args:
+        limit: 每页条数（1-500）
+        cursor: 上一页返回的 next_cursor
+        sort: upload_time / size / name
+        order: asc / desc
+        file_type: MIME 类型或前缀，如 image、application/pdf
+        date_from, date_to: 上传日期范围，YYYY-MM-DD
+
+    Returns:
+        dict: {'files': [...], 'next_cursor': 下一页游标，没有更多时为 None}
+
+    参数不合法时抛出 ValueError。
+    """
+    limit = int(limit)
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f'limit必须在1-{MAX_PAGE_SIZE}之间')
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f'不支持的排序字段: {sort}')
+    if order not in ('asc', 'desc'):
+        raise ValueError(f'不支持的排序方向: {order}')
+
+    after = None
+    if cursor:
+        try:
+            after = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if after[0] != sort or after[1] != order:
+                raise ValueError
+            after = after[2:]
+        except Exception:
+            raise ValueError('无效的分页游标')
+
+    files, last_key = get_blob_store(upload_folder).query(
+        limit, after, sort, order, file_type, _parse_date(date_from), _parse_date(date_to)
+    )
+    next_cursor = None
+    if last_key is not None:
+        next_cursor = base64.urlsafe_b64encode(
+            json.dumps([sort, order] + last_key).encode('utf-8')
+        ).decode('ascii')
+    return {'files': [_list_item(info) for info in files], 'next_cursor': next_cursor}
+
 def delete_file(file_uid, upload_folder):
     """删除指定的文件
-    
+
+    相同内容的文件只保存一份，这里只删除一个引用，最后一个引用删除时才删除内容。
+
     Args:
         file_uid: 文件的唯一标识符（文件名）
         upload_folder: 上传文件目录
-        
+
     Returns:
         bool: 删除是否成功
     """
     try:
-        file_path = os.path.join(upload_folder, secure_filename(file_uid))
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            return True
-        return False
+        return get_blob_store(upload_folder).delete_reference(secure_filename(file_uid))
     except Exception as e:
-        print(f"删除文件失败: {str(e)}")
+        logger.error("删除文件失败: %s", e, exc_info=True)
         return False
@@ -0,0 +1,175 @@
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageOps
+from flask import request
+from dotenv import load_dotenv
+from utils.static_assets import send_asset
+from utils.metrics import record_cache
+from utils.disk_cache import DiskCacheLimit
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 缩略图等衍生图片的磁盘缓存目录，多个 worker 共享
+DERIVATIVE_CACHE_DIR = os.getenv('DERIVATIVE_CACHE_DIR') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'derivatives'
+)
+# 衍生图片缓存的容量上限，超出后删除最久未访问的文件；0 表示不限制
+DERIVATIVE_CACHE_MAX_BYTES = int(os.getenv('DERIVATIVE_CACHE_MAX_BYTES', str(1024 * 1024 * 1024)))
+derivative_limit = DiskCacheLimit(DERIVATIVE_CACHE_DIR, DERIVATIVE_CACHE_MAX_BYTES)
+
+# 预设尺寸（最大宽度，None 表示原尺寸）
+NAMED_SIZES = {
+    'thumb': 320,
+    'medium': 1024,
+    'full': None,
+}
+
+MIN_WIDTH = 16
+MAX_WIDTH = 2048
+WIDTH_STEP = 16  # 任意 ?w= 向上取整到该步长，避免缓存被无限多的尺寸撑满
+
+OUTPUT_FORMATS = {
+    'jpeg': ('JPEG', '.jpg', 'image/jpeg'),
+    'png': ('PNG', '.png', 'image/png'),
+    'webp': ('WEBP', '.webp', 'image/webp'),
+}
+# 各输出格式可以直接保存的颜色模式，其他模式（如扫描仪常见的 CMYK）先转换为 RGB / RGBA
+SAVE_MODES = {
+    'JPEG': ('RGB', 'L'),
+    'PNG': ('1', 'L', 'LA', 'P', 'RGB', 'RGBA', 'I'),
+    'WEBP': ('RGB', 'RGBA'),
+}
+JPEG_QUALITY = int(os.getenv('DERIVATIVE_JPEG_QUALITY', '82'))
+WEBP_QUALITY = int(os.getenv('DERIVATIVE_WEBP_QUALITY', '80'))
+
+# 源文件内容摘要的进程内缓存：(path, mtime_ns, size) -> sha256
+_digests = OrderedDict()
+_digests_lock = threading.Lock()
+_DIGEST_CACHE_SIZE = 4096
+
+
+def file_digest(path, st=None):
+    """文件内容的 sha256，按 (path, mtime, size) 缓存，文件未变化时不重复读取"""
+    if st is None:
+        st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    with _digests_lock:
+        digest = _digests.get(key)
+        if digest is not None:
+            _digests.move_to_end(key)
+            return digest
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    digest = sha.hexdigest()
+
+    with _digests_lock:
+        _digests[key] = digest
+        while len(_digests) > _DIGEST_CACHE_SIZE:
+            _digests.popitem(last=False)
+    return digest
+
+
+def parse_derivative_args(args):
+    """解析 ?size= / ?w= / ?format= 参数，返回 (width, format)
+
+    width 为 None 表示不缩放，format 为 None 表示保持原格式；参数非法时抛出 ValueError。
+    """
+    width = None
+    size = args.get('size')
+    if size:
+        if size not in NAMED_SIZES:
+            raise ValueError(f'不支持的尺寸: {size}')
+        width = NAMED_SIZES[size]
+
+    w = args.get('w')
+    if w:
+        width = int(w)
+        width = min(max(width, MIN_WIDTH), MAX_WIDTH)
+        width = -(-width // WIDTH_STEP) * WIDTH_STEP
+
+    fmt = args.get('format')
+    if fmt:
+        fmt = fmt.lower()
+        if fmt == 'jpg':
+            fmt = 'jpeg'
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f'不支持的图片格式: {fmt}')
+    return width, fmt
+
+
+def get_derivative(src_path, width=None, fmt=None):
+    """返回衍生图片的 (path, mimetype)；不缩放且格式不变时返回原图路径和 None
+
+    缓存文件名由源文件内容摘要和处理参数决定，先写临时文件再原子替换，
+    多个 worker 同时生成同一张图也不会读到不完整的文件。
+    """
+    src_ext = os.path.splitext(src_path)[1].lower().lstrip('.')
+    src_format = 'jpeg' if src_ext == 'jpg' else src_ext
+    if fmt is None:
+        fmt = src_format if src_format in OUTPUT_FORMATS else 'jpeg'
+    if width is None and fmt == src_format:
+        return src_path, None
+
+    st = os.stat(src_path)
+    pil_format, ext, mimetype = OUTPUT_FORMATS[fmt]
+    key = hashlib.sha256(
+        f'{file_digest(src_path, st)}:{width}:{fmt}:{JPEG_QUALITY}:{WEBP_QUALITY}'.encode('utf-8')
+    ).hexdigest()
+    cache_dir = os.path.join(DERIVATIVE_CACHE_DIR, key[:2])
+    cache_path = os.path.join(cache_dir, key + ext)
+    try:
+        derivative_limit.touch(cache_path)
+        record_cache('image_derivative', True)
+        return cache_path, mimetype
+    except FileNotFoundError:
+        record_cache('image_derivative', False)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if width is not None and width < img.width:
+            img.thumbnail((width, img.height * width // img.width + 1), Image.LANCZOS)
+
+        if img.mode not in SAVE_MODES[pil_format]:
+            alpha = 'A' in img.mode or 'transparency' in img.info
+            img = img.convert('RGBA' if alpha and pil_format != 'JPEG' else 'RGB')
+
+        save_kwargs = {}
+        if pil_format == 'JPEG':
+            save_kwargs = {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}
+        elif pil_format == 'WEBP':
+            save_kwargs = {'quality': WEBP_QUALITY, 'method': 4}
+
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                img.save(f, pil_format, **save_kwargs)
+            os.replace(tmp_path, cache_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    derivative_limit.added(os.path.getsize(cache_path))
+    return cache_path, mimetype
+
+
+def image_response(path):
+    """按请求参数返回原图或缩略图；文件无法作为图片处理时返回原文件"""
+    width, fmt = parse_derivative_args(request.args)
+    if width is None and fmt is None:
+        return send_asset(path)
+    try:
+        derivative_path, mimetype = get_derivative(path, width, fmt)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.warning("Cannot create derivative of %s: %s", path, e)
+        return send_asset(path)
+    return send_asset(derivative_path, mimetype=mimetype)
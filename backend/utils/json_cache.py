@@ -0,0 +1,106 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from flask import current_app, request
+from dotenv import load_dotenv
+from utils.metrics import record_cache
+from utils.static_assets import (
+    MIN_COMPRESS_SIZE, apply_cache_headers, compress, negotiate_encoding, supported_encodings
+)
+
+load_dotenv()
+
+# 缓存序列化后响应体的总字节数上限
+JSON_CACHE_MAX_BYTES = int(os.getenv('JSON_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+
+
+class CachedJson:
+    """一个 JSON 文件序列化后的响应体及其校验信息"""
+
+    __slots__ = ('mtime_ns', 'size', 'body', 'etag', 'last_modified', 'variants', 'nbytes')
+
+    def __init__(self, mtime_ns, size, body):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.last_modified = datetime.fromtimestamp(mtime_ns / 1e9, tz=timezone.utc)
+        # 预先压缩好的响应体，每个 mtime 只压缩一次
+        self.variants = {}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.variants = {encoding: compress(body, encoding) for encoding in supported_encodings()}
+        self.nbytes = len(body) + sum(len(v) for v in self.variants.values())
+
+
+class JsonResponseCache:
+    """按文件路径缓存 JSON 文件解析并重新序列化后的响应体及其压缩版本
+
+    以文件的 mtime 和大小判断缓存是否有效，文件修改后自动重新解析；
+    按响应体（含压缩版本）字节数做 LRU 淘汰。
+    """
+
+    def __init__(self, max_bytes=JSON_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def load(self, path, dumps):
+        """返回 path 对应的 CachedJson；文件不存在抛出 OSError，内容不是 JSON 抛出 ValueError"""
+        st = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+                self._entries.move_to_end(path)
+                record_cache('json', True)
+                return entry
+        record_cache('json', False)
+
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        entry = CachedJson(st.st_mtime_ns, st.st_size, f"{dumps(data)}\n".encode('utf-8'))
+
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            if entry.nbytes <= self.max_bytes:
+                self._entries[path] = entry
+                self._bytes += entry.nbytes
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted.nbytes
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_cache = JsonResponseCache()
+
+
+def load_cached_json(path):
+    """返回 path 对应的 CachedJson（序列化后的字节），供拼接组合响应使用"""
+    return _cache.load(path, current_app.json.dumps)
+
+
+def json_file_response(path):
+    """以 JSON 响应返回文件内容，带强 ETag、Last-Modified 和 Cache-Control: no-cache（文件可能被原地修改），
+    按 Accept-Encoding 返回压缩版本；请求携带匹配的 If-None-Match / If-Modified-Since 时返回 304"""
+    entry = _cache.load(path, current_app.json.dumps)
+    encoding = negotiate_encoding(entry.variants)
+    if encoding is None:
+        response = current_app.response_class(entry.body, mimetype='application/json')
+        response.set_etag(entry.etag)
+    else:
+        response = current_app.response_class(entry.variants[encoding], mimetype='application/json')
+        response.headers['Content-Encoding'] = encoding
+        response.set_etag(f'{entry.etag}-{encoding}')
+    response.last_modified = entry.last_modified
+    apply_cache_headers(response, vary_encoding=True, revalidate=True)
+    return response.make_conditional(request)
@@ -0,0 +1,187 @@
+import os
+import json
+import hashlib
+import threading
+from collections import Counter, OrderedDict, deque
+from dotenv import load_dotenv
+from utils.metrics import record_cache
+
+load_dotenv()
+
+# 最多缓存多少个案例解析后的知识图谱
+GRAPH_CACHE_SIZE = int(os.getenv('GRAPH_CACHE_SIZE', '256'))
+
+_DATASET_MARKERS = {'nodes': 'nodes = new vis.DataSet(', 'edges': 'edges = new vis.DataSet('}
+
+
+def _parse_title(title):
+    """节点的 title 形如 "实体: 王林\\n关系数: 3"，第一行的键作为节点类型，其余行作为属性"""
+    node_type, attrs = None, {}
+    for i, line in enumerate((title or '').splitlines()):
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        key, value = key.strip(), value.strip()
+        if i == 0:
+            node_type = key
+        else:
+            attrs[key] = int(value) if value.isdigit() else value
+    return node_type, attrs
+
+
+def parse_graph_html(text):
+    """从 pyvis 生成的 graph.html 中取出 vis.DataSet 的节点和边，转换为紧凑的模型
+
+    节点: {id, label, type, weight, attrs}；边: {id, source, target, relation[, dashed]}
+    """
+    decoder = json.JSONDecoder()
+    raw = {}
+    for name, marker in _DATASET_MARKERS.items():
+        start = text.find(marker)
+        if start < 0:
+            raise ValueError(f"graph.html 中没有 {name} 数据")
+        raw[name], _ = decoder.raw_decode(text, start + len(marker))
+
+    nodes = []
+    for item in raw['nodes']:
+        node_type, attrs = _parse_title(item.get('title'))
+        nodes.append({
+            'id': item['id'],
+            'label': item.get('label', item['id']),
+            'type': node_type or '实体',
+            'weight': item.get('size'),
+            'attrs': attrs,
+        })
+
+    edges = []
+    for i, item in enumerate(raw['edges']):
+        edge = {'id': i, 'source': item['from'], 'target': item['to'], 'relation': item.get('title')}
+        if item.get('dashes'):
+            edge['dashed'] = True
+        edges.append(edge)
+    return nodes, edges
+
+
+class CaseGraph:
+    """一个案例的知识图谱及其邻接索引（无向，用于 k 跳查询）"""
+
+    def __init__(self, mtime_ns, size, nodes, edges):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.nodes = nodes
+        self.edges = edges
+        self.etag = hashlib.sha1(f'{mtime_ns}:{size}'.encode('utf-8')).hexdigest()
+        self.node_index = {node['id']: node for node in nodes}
+        self.adjacency = {node['id']: [] for node in nodes}
+        for edge in edges:
+            # 边的端点不在节点列表里时补一个占位节点，保证边总能画出来
+            for end in (edge['source'], edge['target']):
+                if end not in self.node_index:
+                    node = {'id': end, 'label': end, 'type': '实体', 'weight': None, 'attrs': {}}
+                    nodes.append(node)
+                    self.node_index[end] = node
+                    self.adjacency[end] = []
+            self.adjacency[edge['source']].append(edge)
+            if edge['target'] != edge['source']:
+                self.adjacency[edge['target']].append(edge)
+        self.types = dict(Counter(node['type'] for node in nodes))
+
+    def neighborhood(self, center, hops):
+        """广度优先求 center 的 hops 跳邻域，返回 {节点 id: 距离}"""
+        distances = {center: 0}
+        queue = deque([center])
+        while queue:
+            node_id = queue.popleft()
+            if distances[node_id] >= hops:
+                continue
+            for edge in self.adjacency[node_id]:
+                other = edge['target'] if edge['source'] == node_id else edge['source']
+                if other not in distances:
+                    distances[other] = distances[node_id] + 1
+                    queue.append(other)
+        return distances
+
+    def query(self, center=None, hops=1, types=None, offset=0, limit=None):
+        """按 k 跳邻域和节点类型筛选，分页返回节点
+
+        节点按距离、权重从大到小排序，边只返回两端都在前 offset + limit 个节点中、
+        且至少一端在本页的，客户端逐页加载时每条边只收到一次，可以边加载边渲染。
+        center 不存在时抛出 KeyError。
+        """
+        if center is not None:
+            if center not in self.node_index:
+                raise KeyError(center)
+            distances = self.neighborhood(center, hops)
+        else:
+            distances = dict.fromkeys(self.node_index, 0)
+
+        selected = [self.node_index[node_id] for node_id in distances
+                    if not types or self.node_index[node_id]['type'] in types]
+        selected.sort(key=lambda node: (distances[node['id']], -(node['weight'] or 0)))
+
+        end = len(selected) if limit is None else offset + limit
+        page = selected[offset:end]
+        page_ids = {node['id'] for node in page}
+        loaded_ids = {node['id'] for node in selected[:end]}
+
+        edges = []
+        seen = set()
+        for node in page:
+            for edge in self.adjacency[node['id']]:
+                if edge['id'] in seen:
+                    continue
+                if edge['source'] in loaded_ids and edge['target'] in loaded_ids:
+                    if edge['source'] in page_ids or edge['target'] in page_ids:
+                        seen.add(edge['id'])
+                        edges.append(edge)
+        edges.sort(key=lambda edge: edge['id'])
+
+        result = {
+            'total': len(selected),
+            'offset': offset,
+            'next_offset': end if end < len(selected) else None,
+            'types': self.types,
+            'nodes': [dict(node, distance=distances[node['id']]) for node in page] if center is not None else page,
+            'edges': edges,
+        }
+        if center is not None:
+            result.update({'center': center, 'hops': hops})
+        return result
+
+
+class GraphCache:
+    """按文件路径缓存解析后的知识图谱，以 mtime 和大小判断是否需要重新解析，按案例数做 LRU 淘汰"""
+
+    def __init__(self, max_entries=GRAPH_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, path):
+        """返回 path 对应的 CaseGraph；文件不存在抛出 OSError，无法解析时抛出 ValueError"""
+        st = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+                self._entries.move_to_end(path)
+                record_cache('graph', True)
+                return entry
+        record_cache('graph', False)
+
+        with open(path, 'r', encoding='utf-8') as f:
+            nodes, edges = parse_graph_html(f.read())
+        entry = CaseGraph(st.st_mtime_ns, st.st_size, nodes, edges)
+
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+_cache = GraphCache()
+
+
+def load_case_graph(path):
+    return _cache.load(path)
@@ -0,0 +1,210 @@
+import os
+import re
+import sys
+import copy
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import threading
+from datetime import datetime
+from urllib.parse import urlencode
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, has_request_context, request
+from dotenv import load_dotenv
+from utils.metrics import registry
+
+load_dotenv()
+
+# 日志配置
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.getenv('LOG_LEVELS', 'werkzeug=WARNING')         # 按 logger 单独设置级别，如 routes.report=DEBUG,werkzeug=WARNING
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')                     # json（每行一个 JSON 对象）或 text
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))       # 待写出日志的队列上限，写满后丢弃新日志而不阻塞请求
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '1'))   # DEBUG 日志的采样比例
+LOG_ACCESS = os.getenv('LOG_ACCESS', '1') == '1'                 # 每个请求结束时记录一条访问日志
+LOG_ACCESS_SAMPLE_RATE = float(os.getenv('LOG_ACCESS_SAMPLE_RATE', '1'))  # 成功请求访问日志的采样比例
+LOG_SLOW_REQUEST_MS = float(os.getenv('LOG_SLOW_REQUEST_MS', '1000'))     # 超过该耗时的请求总是记录
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# 接受客户端或网关传入的请求 ID，格式不符时重新生成
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+# 访问日志中隐藏这些查询参数的值（SSE 通过 ?token= 传递令牌）
+REDACTED_PARAMS = {'token'}
+
+# LogRecord 自带的属性，其余属性（extra 传入的字段）原样写入 JSON
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id', 'taskName'}
+
+access_logger = logging.getLogger('access')
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', '-') != '-':
+            entry['request_id'] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+
+class _ContextFilter(logging.Filter):
+    """在调用线程中执行：按比例丢弃 DEBUG 日志，并记下当前请求的 ID"""
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG and LOG_DEBUG_SAMPLE_RATE < 1 and random.random() >= LOG_DEBUG_SAMPLE_RATE:
+            return False
+        record.request_id = g.get('request_id', '-') if has_request_context() else '-'
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    """把日志放入队列，由后台线程格式化和写出；队列满时丢弃并计数"""
+
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        # 只在调用线程中拼接消息和异常堆栈（参数可能在之后被修改），JSON 序列化留给后台线程
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if _listener_pid != os.getpid():
+            _restart_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            registry.inc('log_records_dropped_total', ())
+
+
+class _QueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # 队列满时也要等到结束标记放入，保证退出前写完已有日志
+        self.queue.put(self._sentinel)
+
+
+_handler = None
+_output = None
+_listener = None
+_listener_pid = None
+_lock = threading.Lock()
+
+
+def _parse_levels(spec):
+    for item in spec.split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            yield name.strip(), level.strip().upper()
+
+
+def _restart_listener():
+    """启动当前进程的后台写日志线程；fork 出的子进程里线程不会被复制，换用新队列重新启动"""
+    global _listener, _listener_pid
+    with _lock:
+        if _listener_pid == os.getpid():
+            return
+        _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+        _listener = _QueueListener(_handler.queue, _output, respect_handler_level=True)
+        _listener.start()
+        _listener_pid = os.getpid()
+
+
+def setup_logging(level=None):
+    """配置根 logger：日志经队列由后台线程写到标准输出，可重复调用"""
+    global _handler, _output
+    root = logging.getLogger()
+    root.setLevel(level or LOG_LEVEL)
+    for name, logger_level in _parse_levels(LOG_LEVELS):
+        logging.getLogger(name).setLevel(logger_level)
+    if _handler is not None:
+        return
+
+    _output = logging.StreamHandler(sys.stdout)
+    _output.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+    _handler = _QueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _handler.addFilter(_ContextFilter())
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    _restart_listener()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """写完队列中剩余的日志并停止后台线程（进程退出时调用）"""
+    global _listener_pid
+    with _lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+            _listener_pid = None
+
+
+# ---- 请求 ID 与访问日志 ----
+
+def _redacted_path():
+    if not request.query_string:
+        return request.path
+    args = [(key, '***' if key in REDACTED_PARAMS else value) for key, value in request.args.items(multi=True)]
+    return f'{request.path}?{urlencode(args, safe="*")}'
+
+
+def _start_request():
+    incoming = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = incoming if _REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+    g.request_start = time.perf_counter()
+
+
+def _finish_request(response):
+    request_id = g.get('request_id')
+    if request_id is None:
+        return response
+    response.headers[REQUEST_ID_HEADER] = request_id
+    if not LOG_ACCESS:
+        return response
+
+    duration = (time.perf_counter() - g.request_start) * 1000
+    if (response.status_code < 400 and duration < LOG_SLOW_REQUEST_MS
+            and LOG_ACCESS_SAMPLE_RATE < 1 and random.random() >= LOG_ACCESS_SAMPLE_RATE):
+        return response
+    fields = {
+        'method': request.method,
+        'path': _redacted_path(),
+        'status': response.status_code,
+        'duration_ms': round(duration, 1),
+        'remote_addr': request.remote_addr,
+    }
+    if g.get('metrics_db_count'):
+        fields['db_ms'] = round(g.metrics_db_time * 1000, 1)
+        fields['db_queries'] = g.metrics_db_count
+    # 流式响应（SSE、导出）在返回响应头时记录，耗时不含传输时间
+    access_logger.info('%s %s %s %.1fms', fields['method'], fields['path'], fields['status'], duration, extra=fields)
+    return response
+
+
+def install_request_logging(app):
+    """为每个请求分配 ID（响应头 X-Request-ID，并写入该请求的所有日志），请求结束时记录访问日志"""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
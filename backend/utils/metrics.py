@@ -0,0 +1,391 @@
+import os
+import re
+import json
+import glob
+import hmac
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from flask import Response, g, has_request_context, request
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows 下不部署 gunicorn，多进程汇总不需要文件锁
+    fcntl = None
+
+load_dotenv()
+
+# 指标配置
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', '0') == '1'  # 在响应中附加 Server-Timing 头
+# 多进程部署（gunicorn）时各 worker 把指标快照写到该目录，/metrics 汇总所有 worker；留空则只统计当前进程
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+# 设置后 /metrics 要求 Authorization: Bearer <METRICS_TOKEN>；留空时必须在反向代理上禁止外部访问 /metrics
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# 已退出 worker 的计数器和直方图累加到这个快照中
+RETIRED_SNAPSHOT = 'retired.json'
+
+# 直方图分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FINGERPRINT_MAX_LENGTH = 240
+
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# 指标名 -> (类型, 说明)
+METRICS = {
+    'http_requests_total': ('counter', '按路由、方法和状态码统计的请求数'),
+    'http_request_duration_seconds': ('histogram', '请求处理耗时（流式响应为返回响应头前的耗时）'),
+    'http_requests_in_flight': ('gauge', '正在处理的请求数'),
+    'http_response_bytes_total': ('counter', '已知长度的响应体字节数（含文件）'),
+    'db_query_duration_seconds': ('histogram', '按语句指纹统计的 SQL 执行耗时'),
+    'db_query_errors_total': ('counter', '执行出错的 SQL 数'),
+    'cache_requests_total': ('counter', '各缓存的命中 / 未命中次数'),
+    'password_hash_rejected_total': ('counter', '密码哈希任务因排满或超时被拒绝的次数'),
+    'log_records_dropped_total': ('counter', '日志队列已满而丢弃的日志条数'),
+}
+
+
+class Registry:
+    """进程内的计数器、直方图和仪表，指标名与标签组成键"""
+
+    def __init__(self):
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge_add(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets),
+                                                     'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'gauges': [[name, list(labels), value] for (name, labels), value in self._gauges.items()],
+                'histograms': [[name, list(labels), list(h['buckets']), list(h['counts']), h['sum'], h['count']]
+                               for (name, labels), h in self._histograms.items()],
+            }
+
+
+registry = Registry()
+
+
+# ---- 记录 ----
+
+@lru_cache(maxsize=1024)
+def fingerprint(query):
+    """SQL 语句指纹：压缩空白，参数和字面量替换为 ?，IN 列表合并为一个 ?"""
+    text = ' '.join(query.split())
+    text = re.sub(r"'(?:[^'\\]|\\.)*'", '?', text)
+    text = re.sub(r'\b\d+\b', '?', text)
+    text = text.replace('%s', '?')
+    text = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?)', text)
+    # 过长的语句保留开头和结尾（表名和条件），省略中间的列清单
+    if len(text) > FINGERPRINT_MAX_LENGTH:
+        half = FINGERPRINT_MAX_LENGTH // 2
+        text = f'{text[:half]} … {text[-half:]}'
+    return text
+
+
+def observe_query(query, seconds, error=False):
+    """记录一条 SQL 的耗时；在请求中执行时同时累计到该请求的 Server-Timing"""
+    if not METRICS_ENABLED:
+        return
+    labels = (('query', fingerprint(query)),)
+    registry.observe('db_query_duration_seconds', labels, seconds, DB_BUCKETS)
+    if error:
+        registry.inc('db_query_errors_total', labels)
+    if has_request_context():
+        g.metrics_db_time = g.get('metrics_db_time', 0.0) + seconds
+        g.metrics_db_count = g.get('metrics_db_count', 0) + 1
+
+
+def record_cache(cache, hit):
+    if METRICS_ENABLED:
+        registry.inc('cache_requests_total', (('cache', cache), ('result', 'hit' if hit else 'miss')))
+
+
+# ---- 多进程汇总 ----
+
+_last_flush = 0.0
+_snapshot_name = None
+_snapshot_pid = None
+
+
+def _snapshot_path():
+    """当前进程的快照文件，文件名带进程启动时间：PID 被复用时不会覆盖已退出 worker 的快照"""
+    global _snapshot_name, _snapshot_pid
+    pid = os.getpid()
+    if _snapshot_pid != pid:
+        _snapshot_name = f'{pid}-{time.time_ns()}.json'
+        _snapshot_pid = pid
+    return os.path.join(METRICS_DIR, _snapshot_name)
+
+
+def _write_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=METRICS_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def flush_metrics():
+    """把当前进程的快照写到 METRICS_DIR（原子替换）"""
+    global _last_flush
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _write_json(_snapshot_path(), registry.snapshot())
+    _last_flush = time.monotonic()
+
+
+@contextmanager
+def _retired_lock():
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(METRICS_DIR, 'retired.lock'), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _retire(paths):
+    """把已退出进程的快照累加到 retired.json 后删除，计数器不会因 worker 重启而减少，目录也不会越来越大"""
+    retired_path = os.path.join(METRICS_DIR, RETIRED_SNAPSHOT)
+    with _retired_lock():
+        snapshots = [_read_json(retired_path) or {'pid': None, 'counters': [], 'gauges': [], 'histograms': []}]
+        retired = []
+        for path in paths:
+            snapshot = _read_json(path)
+            if snapshot is not None:  # 为 None 时已被其他进程合并
+                snapshots.append(snapshot)
+                retired.append(path)
+        if not retired:
+            return
+        counters, _, histograms = _merge(snapshots)
+        _write_json(retired_path, {
+            'pid': None,
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'gauges': [],
+            'histograms': [[name, list(labels), h['buckets'], h['counts'], h['sum'], h['count']]
+                           for (name, labels), h in histograms.items()],
+        })
+        for path in retired:
+            os.remove(path)
+
+
+def retire_metrics():
+    """worker 退出时调用：写出最后的快照并合并到 retired.json"""
+    if not METRICS_DIR:
+        return
+    flush_metrics()
+    _retire([_snapshot_path()])
+
+
+def clear_metrics_dir():
+    """服务启动前清空上次运行留下的快照"""
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.json')) if METRICS_DIR else []:
+        os.remove(path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+def _snapshot_pid_of(path):
+    try:
+        return int(os.path.basename(path).split('-')[0].split('.')[0])
+    except ValueError:
+        return None
+
+
+def _collect():
+    if not METRICS_DIR:
+        return [registry.snapshot()]
+    flush_metrics()
+    paths = glob.glob(os.path.join(METRICS_DIR, '*.json'))
+    # 异常退出（没有执行 worker_exit）的 worker 留下的快照
+    dead = [path for path in paths
+            if os.path.basename(path) != RETIRED_SNAPSHOT and not _pid_alive(_snapshot_pid_of(path) or 0)]
+    if dead:
+        _retire(dead)
+    snapshots = []
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+        snapshot = _read_json(path)
+        if snapshot is not None:
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def _merge(snapshots):
+    """合并多个进程的快照：计数器和直方图累加（含已退出的 worker），仪表只累加仍在运行的进程"""
+    counters, gauges, histograms = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        pid = snapshot['pid']
+        if pid is not None and (pid == os.getpid() or _pid_alive(pid)):
+            for name, labels, value in snapshot['gauges']:
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0) + value
+        for name, labels, buckets, counts, total, count in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, {'buckets': buckets, 'counts': [0] * len(buckets),
+                                                 'sum': 0.0, 'count': 0})
+            merged['counts'] = [a + b for a, b in zip(merged['counts'], counts)]
+            merged['sum'] += total
+            merged['count'] += count
+    return counters, gauges, histograms
+
+
+# ---- Prometheus 文本格式 ----
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics():
+    counters, gauges, histograms = _merge(_collect())
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            for (metric, labels), h in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(h['buckets'], h['counts']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels, [('le', _number(float(bound)))])} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {h['count']}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(h['sum'])}")
+                lines.append(f"{name}_count{_labels(labels)} {h['count']}")
+        else:
+            values = counters if kind == 'counter' else gauges
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# ---- Flask 中间件 ----
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_route = _route()
+    registry.gauge_add('http_requests_in_flight', (('route', g.metrics_route),), 1)
+
+
+def _after_request(response):
+    start = g.get('metrics_start')
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    route = g.metrics_route
+    registry.observe('http_request_duration_seconds', (('route', route), ('method', request.method)),
+                     elapsed, LATENCY_BUCKETS)
+    registry.inc('http_requests_total', (('route', route), ('method', request.method),
+                                         ('status', str(response.status_code))))
+    if response.content_length:
+        registry.inc('http_response_bytes_total', (('route', route),), response.content_length)
+
+    if METRICS_SERVER_TIMING:
+        timings = [f'app;dur={elapsed * 1000:.1f}']
+        if g.get('metrics_db_count'):
+            timings.append(f'db;dur={g.metrics_db_time * 1000:.1f};desc="{g.metrics_db_count} queries"')
+        response.headers['Server-Timing'] = ', '.join(timings)
+
+    if METRICS_DIR and time.monotonic() - _last_flush > METRICS_FLUSH_INTERVAL:
+        flush_metrics()
+    return response
+
+
+def _teardown_request(exc):
+    route = g.pop('metrics_route', None)
+    if route is not None:
+        registry.gauge_add('http_requests_in_flight', (('route', route),), -1)
+
+
+def metrics_view():
+    if METRICS_TOKEN:
+        expected = f'Bearer {METRICS_TOKEN}'.encode('utf-8')
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode('utf-8'), expected):
+            return Response('unauthorized\n', status=401, headers={'WWW-Authenticate': 'Bearer'},
+                            content_type='text/plain; charset=utf-8')
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def install_metrics(app):
+    """注册请求计时中间件和 /metrics"""
+    if not METRICS_ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,218 @@
+import os
+import time
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+from dotenv import load_dotenv
+from utils.metrics import registry
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只有每个 worker 自己的上限
+    fcntl = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 密码哈希配置
+# werkzeug 的 method 字符串：scrypt[:n:r:p] 或 pbkdf2[:hash[:iterations]]；修改后旧哈希在用户下次登录时自动重新计算
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+PASSWORD_SALT_LENGTH = int(os.getenv('PASSWORD_SALT_LENGTH', '16'))
+PASSWORD_HASH_POOL = os.getenv('PASSWORD_HASH_POOL', '1') == '1'                     # 0 时在请求线程中直接计算
+# 以下两项按每个 gunicorn worker 计算，整台机器的哈希进程数为 gunicorn worker 数 × PASSWORD_HASH_WORKERS
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '1'))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', str(PASSWORD_HASH_WORKERS * 4)))  # 排队与执行中的任务上限
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))              # 等待结果的最长秒数
+# 整台机器同时执行的哈希任务上限，所有 worker 通过 PASSWORD_HASH_LOCK_DIR 下的文件锁共享；0 表示不限制
+PASSWORD_HASH_NODE_SLOTS = int(os.getenv('PASSWORD_HASH_NODE_SLOTS') or os.cpu_count() or 1)
+PASSWORD_HASH_LOCK_DIR = os.getenv('PASSWORD_HASH_LOCK_DIR') or os.path.join(tempfile.gettempdir(), 'password-hash-slots')
+# 哈希进程等待整机名额的最长秒数，超过后直接拒绝（返回 503），不在队列里继续等
+PASSWORD_HASH_NODE_WAIT = float(os.getenv('PASSWORD_HASH_NODE_WAIT', '0.05'))
+
+
+class HashingBusy(Exception):
+    """哈希任务已排满或等待超时，调用方应返回 503"""
+
+
+def _canonical_method(method):
+    """补全 werkzeug 的默认参数，便于与已存储哈希的前缀比较"""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = (args + ['32768', '8', '1'][len(args):])[:3]
+        return f'scrypt:{n}:{r}:{p}'
+    if name == 'pbkdf2':
+        hash_name, iterations = (args + ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)][len(args):])[:2]
+        return f'pbkdf2:{hash_name}:{iterations}'
+    return method
+
+
+def needs_rehash(password_hash, method=PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH):
+    """已存储的哈希是否使用了与当前配置不同的算法、参数或盐长度"""
+    parts = password_hash.split('$')
+    if len(parts) != 3:
+        return True
+    return _canonical_method(parts[0]) != _canonical_method(method) or len(parts[1]) != salt_length
+
+
+# ---- 在进程池中执行的任务（必须是模块级函数，才能被子进程导入） ----
+
+def _hash(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def _verify(password_hash, password, method, salt_length):
+    """校验密码，参数已变化时在同一个任务里算出新哈希，返回 (ok, new_hash)"""
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if needs_rehash(password_hash, method, salt_length):
+        return True, _hash(password, method, salt_length)
+    return True, None
+
+
+def _run_with_node_slot(node_slots, wait, fn, *args):
+    """在哈希进程中占用整机名额后执行 fn：只有正在计算的任务占用名额，排队中的不占"""
+    fd = node_slots.acquire(wait)
+    if fd is None:
+        raise HashingBusy('node_busy')
+    try:
+        return fn(*args)
+    finally:
+        NodeSlots.release(fd)
+
+
+class NodeSlots:
+    """同一台机器上所有 worker 共享的执行名额
+
+    每个名额对应 lock_dir 下的一个文件，持有它的排他 flock 即占用该名额；
+    进程异常退出时锁由内核释放，名额不会泄漏。
+    """
+
+    POLL_INTERVAL = 0.01
+
+    def __init__(self, lock_dir=PASSWORD_HASH_LOCK_DIR, slots=PASSWORD_HASH_NODE_SLOTS):
+        os.makedirs(lock_dir, exist_ok=True)
+        self._paths = [os.path.join(lock_dir, f'slot-{i}.lock') for i in range(slots)]
+
+    def acquire(self, timeout):
+        """占用一个名额，返回其文件描述符；timeout 秒内没有空闲名额时返回 None"""
+        deadline = time.monotonic() + timeout
+        while True:
+            for path in self._paths:
+                fd = os.open(path, os.O_CREAT | os.O_RDWR)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return fd
+                except BlockingIOError:
+                    os.close(fd)
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.POLL_INTERVAL)
+
+    @staticmethod
+    def release(fd):
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+class HashPool:
+    """有界的密码哈希进程池
+
+    KDF 会占满一个 CPU 核，放到独立进程中执行，不阻塞请求线程、也不占用 GIL；
+    排队和执行中的任务超过 queue_size 时立即拒绝，登录高峰不会拖慢其他接口。
+    gunicorn 的每个 worker 各有一个进程池，node_slots 再限制整台机器同时执行的任务数：
+    名额在哈希进程开始计算时占用，node_wait 秒内没有空闲名额时任务以 HashingBusy 结束。
+    """
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, queue_size=PASSWORD_HASH_QUEUE_SIZE,
+                 timeout=PASSWORD_HASH_TIMEOUT, node_slots=None, node_wait=PASSWORD_HASH_NODE_WAIT):
+        self.timeout = timeout
+        self._node_slots = node_slots
+        self._node_wait = node_wait
+        self._slots = threading.BoundedSemaphore(max(queue_size, 1))
+        # 用 spawn 启动子进程：gunicorn worker 中已有日志、连接池等线程，fork 可能复制到被占用的锁
+        self._executor = ProcessPoolExecutor(max_workers=max(workers, 1),
+                                             mp_context=multiprocessing.get_context('spawn'))
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            registry.inc('password_hash_rejected_total', (('reason', 'queue_full'),))
+            raise HashingBusy()
+        try:
+            if self._node_slots is not None:
+                future = self._executor.submit(_run_with_node_slot, self._node_slots, self._node_wait, fn, *args)
+            else:
+                future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # 任务仍会在子进程中完成，名额在完成时归还
+            registry.inc('password_hash_rejected_total', (('reason', 'timeout'),))
+            raise HashingBusy()
+        except HashingBusy:
+            registry.inc('password_hash_rejected_total', (('reason', 'node_busy'),))
+            raise
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_hash_pool():
+    """当前进程的哈希进程池，首次使用时创建；fork 出的子进程重新创建"""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                node_slots = None
+                if fcntl is not None and PASSWORD_HASH_NODE_SLOTS > 0:
+                    node_slots = NodeSlots()
+                _pool = HashPool(node_slots=node_slots)
+                _pool_pid = pid
+    return _pool
+
+
+def close_hash_pool():
+    """关闭当前进程的哈希进程池（worker 退出时调用）"""
+    global _pool
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown()
+        _pool = None
+
+
+def _run(fn, *args):
+    if not PASSWORD_HASH_POOL:
+        return fn(*args)
+    try:
+        return get_hash_pool().run(fn, *args)
+    except BrokenProcessPool as e:
+        # 子进程异常退出后进程池不可再用，丢弃后下次请求重新创建
+        logger.error("密码哈希进程池异常: %s", e)
+        close_hash_pool()
+        raise HashingBusy() from e
+
+
+def hash_password(password):
+    """按当前配置计算密码哈希；繁忙时抛出 HashingBusy"""
+    return _run(_hash, password, PASSWORD_HASH_METHOD, PASSWORD_SALT_LENGTH)
+
+
+def verify_password(password_hash, password):
+    """校验密码，返回 (ok, new_hash)；new_hash 不为 None 时应更新存储的哈希。繁忙时抛出 HashingBusy"""
+    return _run(_verify, password_hash, password, PASSWORD_HASH_METHOD, PASSWORD_SALT_LENGTH)
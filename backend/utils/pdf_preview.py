@@ -0,0 +1,103 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import fitz
+from PIL import Image
+from dotenv import load_dotenv
+from utils.image_derivatives import file_digest
+from utils.metrics import record_cache
+
+load_dotenv()
+
+# PDF 页面预览图的磁盘缓存目录
+PDF_PREVIEW_CACHE_DIR = os.getenv('PDF_PREVIEW_CACHE_DIR') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'pdf_previews'
+)
+
+DEFAULT_DPI = int(os.getenv('PDF_PREVIEW_DPI', '110'))
+MIN_DPI = 36
+MAX_DPI = 300
+
+PREVIEW_FORMATS = {
+    'png': ('.png', 'image/png'),
+    'webp': ('.webp', 'image/webp'),
+}
+WEBP_QUALITY = int(os.getenv('DERIVATIVE_WEBP_QUALITY', '80'))
+
+# 文件摘要 -> PDF 信息 的进程内缓存
+_info_cache = OrderedDict()
+_info_lock = threading.Lock()
+_INFO_CACHE_SIZE = 512
+
+
+def get_pdf_info(path):
+    """PDF 的页数、元数据和每页尺寸（单位 pt），按文件内容缓存"""
+    digest = file_digest(path)
+    with _info_lock:
+        info = _info_cache.get(digest)
+        if info is not None:
+            _info_cache.move_to_end(digest)
+            return info
+
+    with fitz.open(path) as doc:
+        info = {
+            'page_count': doc.page_count,
+            'metadata': {k: v for k, v in (doc.metadata or {}).items() if v},
+            'pages': [{'width': page.rect.width, 'height': page.rect.height} for page in doc],
+        }
+
+    with _info_lock:
+        _info_cache[digest] = info
+        while len(_info_cache) > _INFO_CACHE_SIZE:
+            _info_cache.popitem(last=False)
+    return info
+
+
+def parse_preview_args(args):
+    """解析 ?page= / ?dpi= / ?format= 参数，返回 (page, dpi, format)；page 从 1 开始"""
+    page = int(args.get('page', 1))
+    if page < 1:
+        raise ValueError('页码必须从1开始')
+    dpi = min(max(int(args.get('dpi', DEFAULT_DPI)), MIN_DPI), MAX_DPI)
+    fmt = args.get('format', 'png').lower()
+    if fmt not in PREVIEW_FORMATS:
+        raise ValueError(f'不支持的预览格式: {fmt}')
+    return page, dpi, fmt
+
+
+def render_page(path, page=1, dpi=DEFAULT_DPI, fmt='png'):
+    """渲染 PDF 的第 page 页，返回 (预览图路径, mimetype)
+
+    缓存文件名由 PDF 内容摘要、页码、DPI 和格式组成，只渲染请求的那一页。
+    页码超出范围时抛出 ValueError。
+    """
+    ext, mimetype = PREVIEW_FORMATS[fmt]
+    digest = file_digest(path)
+    cache_dir = os.path.join(PDF_PREVIEW_CACHE_DIR, digest[:2], digest)
+    cache_path = os.path.join(cache_dir, f'p{page}_{dpi}{ext}')
+    hit = os.path.exists(cache_path)
+    record_cache('pdf_preview', hit)
+    if hit:
+        return cache_path, mimetype
+
+    with fitz.open(path) as doc:
+        if page > doc.page_count:
+            raise ValueError(f'页码超出范围，共{doc.page_count}页')
+        pix = doc.load_page(page - 1).get_pixmap(dpi=dpi, alpha=False)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if fmt == 'png':
+                    f.write(pix.tobytes('png'))
+                else:
+                    img = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+                    img.save(f, 'WEBP', quality=WEBP_QUALITY)
+            os.replace(tmp_path, cache_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return cache_path, mimetype
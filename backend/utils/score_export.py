@@ -0,0 +1,63 @@
+import io
+import csv
+import json
+
+# 导出的列，依次对应 CSV 表头
+EXPORT_COLUMNS = ('report_id', 'user_id', 'username', 'score', 'comments', 'created_at', 'updated_at')
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+# 每攒够多少行输出一次，避免每行一个响应块
+EXPORT_FLUSH_ROWS = 500
+
+
+def build_export_query(report_ids=None):
+    """评分连同评分人的导出 SQL，返回 (query, params)"""
+    query = """SELECT s.report_id, s.user_id, u.username, s.score, s.comments, s.created_at, s.updated_at
+               FROM scores s
+               JOIN users u ON u.id = s.user_id"""
+    params = None
+    if report_ids:
+        query += f" WHERE s.report_id IN ({', '.join(['%s'] * len(report_ids))})"
+        params = tuple(report_ids)
+    query += " ORDER BY s.report_id, s.user_id"
+    return query, params
+
+
+def _value(value):
+    return value.isoformat(sep=' ') if hasattr(value, 'isoformat') else value
+
+
+def iter_csv(rows):
+    """把行逐批写成 CSV 文本块；开头带 BOM，方便 Excel 正确识别中文"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_COLUMNS)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([_value(row[column]) for column in EXPORT_COLUMNS])
+        if i % EXPORT_FLUSH_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(rows):
+    """每行一个 JSON 对象"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({column: _value(row[column]) for column in EXPORT_COLUMNS},
+                                ensure_ascii=False))
+        if len(lines) >= EXPORT_FLUSH_ROWS:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines.clear()
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def iter_export(rows, fmt):
+    return iter_csv(rows) if fmt == 'csv' else iter_ndjson(rows)
@@ -0,0 +1,227 @@
+import math
+from database.db import execute_query
+
+# 直方图分桶：0-9、10-19 …… 80-89、90-100
+HISTOGRAM_BUCKETS = 10
+BUCKET_LABELS = [f'{i * 10}-{i * 10 + 9}' for i in range(HISTOGRAM_BUCKETS - 1)] + ['90-100']
+
+# 0-100 分整数评分在均匀分布（无共识）下的期望方差：(A² - 1) / 12，A = 101
+UNIFORM_NULL_VARIANCE = (101 ** 2 - 1) / 12
+
+_BUCKET_COLUMNS = ', '.join(f'bucket_{i}' for i in range(HISTOGRAM_BUCKETS))
+_BUCKET_SUMS = ', '.join(f'SUM(LEAST(score DIV 10, 9) = {i})' for i in range(HISTOGRAM_BUCKETS))
+_BUCKET_UPDATES = ', '.join(f'bucket_{i} = VALUES(bucket_{i})' for i in range(HISTOGRAM_BUCKETS))
+_BUCKET_DELTAS = ', '.join(f'bucket_{i} = bucket_{i} + %s' for i in range(HISTOGRAM_BUCKETS))
+
+STATS_COLUMNS = f'report_id, score_count, score_sum, score_sum_sq, score_min, score_max, {_BUCKET_COLUMNS}'
+
+# 评分写入前锁定（必要时创建）报告的统计行；ON DUPLICATE KEY UPDATE 直接取得排他锁，
+# 同一报告的写入在这一行上排队，不会像先共享锁再升级那样互相死锁
+LOCK_STATS_SQL = """INSERT INTO report_score_stats (report_id) VALUES {values}
+                    ON DUPLICATE KEY UPDATE report_id = report_id"""
+SELECT_LOCKED_STATS_SQL = f"SELECT {STATS_COLUMNS} FROM report_score_stats WHERE report_id IN ({{placeholders}}) FOR UPDATE"
+SELECT_USER_SCORES_SQL = "SELECT report_id, score FROM scores WHERE user_id = %s AND report_id IN ({placeholders})"
+UPDATE_STATS_SQL = f"""UPDATE report_score_stats
+                       SET score_count = score_count + %s, score_sum = score_sum + %s, score_sum_sq = score_sum_sq + %s,
+                           score_min = %s, score_max = %s, {_BUCKET_DELTAS}
+                       WHERE report_id = %s"""
+DELETE_STATS_SQL = "DELETE FROM report_score_stats WHERE report_id = %s"
+# 删除或修改的分数恰好是最低/最高分时重新取极值，走 (report_id, score) 索引只读两端
+SELECT_EXTREMES_SQL = "SELECT MIN(score) AS score_min, MAX(score) AS score_max FROM scores WHERE report_id = %s"
+
+# 查询统计；{where} 为空（全部报告）或 WHERE report_id IN (...)
+SELECT_STATS_SQL = f"SELECT {STATS_COLUMNS} FROM report_score_stats WHERE report_id = %s"
+SELECT_ALL_STATS_SQL = f"SELECT {STATS_COLUMNS} FROM report_score_stats {{where}} ORDER BY report_id"
+# 按 (report_id, score) 索引有序读取中间的一到两个分数
+MEDIAN_SQL = """SELECT score FROM scores
+                WHERE report_id = %s
+                ORDER BY score
+                LIMIT %s OFFSET %s"""
+# 一次查询得到多个报告的中位数（需要 MySQL 8 窗口函数）
+MEDIANS_SQL = """SELECT report_id, AVG(score) AS median
+                 FROM (SELECT report_id, score,
+                              ROW_NUMBER() OVER (PARTITION BY report_id ORDER BY score) AS rn,
+                              COUNT(*) OVER (PARTITION BY report_id) AS cnt
+                       FROM scores {where}) ranked
+                 WHERE rn IN (FLOOR((cnt + 1) / 2), FLOOR(cnt / 2) + 1)
+                 GROUP BY report_id"""
+
+
+def _bucket(score):
+    return min(score // 10, HISTOGRAM_BUCKETS - 1)
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def lock_report_stats(user_id, report_ids, connection):
+    """在评分事务的开头调用：锁定涉及报告的统计行，并读取该用户在这些报告上原有的分数
+
+    返回 (stats, old_scores)，交给写入评分后的 update_report_stats。报告按 id 排序加锁，
+    批量评分之间的加锁顺序一致。锁定之后才读取原分数（事务的快照在第一次普通读取时建立），
+    同一报告的其他写入已在统计行上排队，读到的就是最新值。
+    """
+    report_ids = sorted(set(report_ids))
+    if not report_ids:
+        return {}, {}
+    execute_query(LOCK_STATS_SQL.format(values=', '.join(['(%s)'] * len(report_ids))),
+                  tuple(report_ids), connection=connection)
+    _, rows = execute_query(SELECT_LOCKED_STATS_SQL.format(placeholders=_placeholders(report_ids)),
+                            tuple(report_ids), connection=connection)
+    stats = {row['report_id']: row for row in rows}
+    _, rows = execute_query(SELECT_USER_SCORES_SQL.format(placeholders=_placeholders(report_ids)),
+                            (user_id, *report_ids), connection=connection)
+    return stats, {row['report_id']: row['score'] for row in rows}
+
+
+def update_report_stats(stats, old_scores, new_scores, connection):
+    """按评分的变化增量更新已锁定的统计行
+
+    new_scores 为 {report_id: 新分数}，None 表示评分已删除。人数、总和、平方和与直方图按差值增减；
+    最低/最高分只有在被删除或修改的分数恰好是极值时才重新查询。没有评分的报告删除其统计行。
+    """
+    for report_id in sorted(new_scores):
+        row = stats[report_id]
+        old, new = old_scores.get(report_id), new_scores[report_id]
+        if old == new:
+            if not row['score_count']:
+                # 加锁时为没有评分的报告创建的空行
+                execute_query(DELETE_STATS_SQL, (report_id,), connection=connection)
+            continue
+
+        count = int(row['score_count'])
+        buckets = [0] * HISTOGRAM_BUCKETS
+        delta_count = delta_sum = delta_sq = 0
+        if old is not None:
+            delta_count, delta_sum, delta_sq = -1, -old, -old * old
+            buckets[_bucket(old)] -= 1
+        if new is not None:
+            delta_count, delta_sum, delta_sq = delta_count + 1, delta_sum + new, delta_sq + new * new
+            buckets[_bucket(new)] += 1
+
+        if count + delta_count <= 0:
+            execute_query(DELETE_STATS_SQL, (report_id,), connection=connection)
+            continue
+
+        score_min, score_max = row['score_min'], row['score_max']
+        if old is not None and old in (score_min, score_max):
+            # 评分已经写入，重新取极值时已包含新分数
+            _, extremes = execute_query(SELECT_EXTREMES_SQL, (report_id,), connection=connection)
+            score_min, score_max = extremes[0]['score_min'], extremes[0]['score_max']
+        elif new is not None:
+            score_min = new if score_min is None else min(score_min, new)
+            score_max = new if score_max is None else max(score_max, new)
+
+        execute_query(UPDATE_STATS_SQL, (delta_count, delta_sum, delta_sq, score_min, score_max,
+                                         *buckets, report_id), connection=connection)
+
+
+def rebuild_report_stats(report_ids, connection):
+    """按 scores 重新汇总指定报告的统计行，用于批量导入数据之后
+
+    会对涉及报告的全部评分加共享锁，不要在评分请求的事务中调用（并发时会死锁），请求中用增量更新。
+    """
+    report_ids = list(dict.fromkeys(report_ids))
+    if not report_ids:
+        return
+    placeholders = _placeholders(report_ids)
+    execute_query(
+        f"""INSERT INTO report_score_stats ({STATS_COLUMNS})
+            SELECT report_id, COUNT(*), SUM(score), SUM(score * score), MIN(score), MAX(score), {_BUCKET_SUMS}
+            FROM scores
+            WHERE report_id IN ({placeholders})
+            GROUP BY report_id
+            ON DUPLICATE KEY UPDATE
+                score_count = VALUES(score_count),
+                score_sum = VALUES(score_sum),
+                score_sum_sq = VALUES(score_sum_sq),
+                score_min = VALUES(score_min),
+                score_max = VALUES(score_max),
+                {_BUCKET_UPDATES}""",
+        tuple(report_ids), connection=connection
+    )
+    execute_query(
+        f"""DELETE FROM report_score_stats
+            WHERE report_id IN ({placeholders})
+              AND NOT EXISTS (SELECT 1 FROM scores WHERE scores.report_id = report_score_stats.report_id)""",
+        tuple(report_ids), connection=connection
+    )
+
+
+def _median(report_id, count):
+    """按 (report_id, score) 索引有序读取中间的一到两个分数，得到精确中位数"""
+    if not count:
+        return None
+    success, rows = execute_query(MEDIAN_SQL, (report_id, 2 - count % 2, (count - 1) // 2))
+    if not success or not rows:
+        return None
+    return sum(row['score'] for row in rows) / len(rows)
+
+
+def _report_filter(report_ids):
+    """{where} 子句及其参数；不指定报告时为空"""
+    if not report_ids:
+        return '', None
+    return f'WHERE report_id IN ({_placeholders(report_ids)})', tuple(report_ids)
+
+
+def _medians(report_ids=None):
+    """一次查询得到多个报告的精确中位数（需要 MySQL 8 窗口函数）"""
+    where, params = _report_filter(report_ids)
+    success, rows = execute_query(MEDIANS_SQL.format(where=where), params)
+    if not success:
+        return None
+    return {row['report_id']: float(row['median']) for row in rows}
+
+
+def summarize(row, median):
+    """把统计行换算成均值、标准差、直方图和评分一致性 rwg"""
+    count = int(row['score_count']) if row else 0
+    if not count:
+        return {
+            'count': 0, 'mean': None, 'median': None, 'stddev': None, 'min': None, 'max': None,
+            'histogram': [{'range': label, 'count': 0} for label in BUCKET_LABELS],
+            'agreement': {'rwg': None}
+        }
+
+    total = int(row['score_sum'])
+    total_sq = int(row['score_sum_sq'])
+    mean = total / count
+    # 样本方差；只有一个评分时无法计算离散程度和一致性
+    variance = max(total_sq - total * total / count, 0) / (count - 1) if count > 1 else None
+    rwg = max(1 - variance / UNIFORM_NULL_VARIANCE, 0.0) if variance is not None else None
+
+    return {
+        'count': count,
+        'mean': round(mean, 4),
+        'median': median,
+        'stddev': round(math.sqrt(variance), 4) if variance is not None else None,
+        'min': row['score_min'],
+        'max': row['score_max'],
+        'histogram': [{'range': label, 'count': int(row[f'bucket_{i}'])}
+                      for i, label in enumerate(BUCKET_LABELS)],
+        'agreement': {'rwg': round(rwg, 4) if rwg is not None else None}
+    }
+
+
+def get_report_stats(report_id):
+    """单个报告的统计结果，返回 (success, result)"""
+    success, rows = execute_query(SELECT_STATS_SQL, (report_id,))
+    if not success:
+        return False, rows
+    row = rows[0] if rows else None
+    median = _median(report_id, int(row['score_count'])) if row else None
+    return True, {'report_id': report_id, **summarize(row, median)}
+
+
+def get_all_stats(report_ids=None):
+    """全部（或指定）报告的统计结果，返回 (success, result)"""
+    where, params = _report_filter(report_ids)
+    success, rows = execute_query(SELECT_ALL_STATS_SQL.format(where=where), params)
+    if not success:
+        return False, rows
+
+    medians = _medians(report_ids) or {}
+    return True, [{'report_id': row['report_id'], **summarize(row, medians.get(row['report_id']))}
+                  for row in rows]
@@ -0,0 +1,101 @@
+import os
+import json
+import base64
+from datetime import datetime
+from dotenv import load_dotenv
+from database.db import execute_query
+
+load_dotenv()
+
+# 删除记录（墓碑）保留天数；游标早于该时间的客户端需要全量同步
+SCORE_TOMBSTONE_RETENTION_DAYS = int(os.getenv('SCORE_TOMBSTONE_RETENTION_DAYS', '30'))
+
+# 游标比当前时间提前的秒数：updated_at 只精确到秒，且提交较慢的事务可能写入稍早的时间，
+# 留出余量宁可重复返回少量记录，也不漏掉
+SYNC_CURSOR_LAG = 5
+
+CURSOR_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+SYNC_CURSOR_SQL = "SELECT NOW() - INTERVAL %s SECOND AS cursor_time, NOW() - INTERVAL %s DAY AS retained_from"
+# 全量与增量同步的评分，走 scores(user_id, updated_at) 索引
+ALL_SCORES_SQL = """SELECT report_id, score, comments, updated_at
+                    FROM scores
+                    WHERE user_id = %s
+                    ORDER BY updated_at"""
+CHANGED_SCORES_SQL = """SELECT report_id, score, comments, updated_at
+                        FROM scores
+                        WHERE user_id = %s AND updated_at >= %s
+                        ORDER BY updated_at"""
+# 删除后又重新评分的报告以 scores 中的记录为准
+DELETED_SCORES_SQL = """SELECT t.report_id
+                        FROM score_tombstones t
+                        LEFT JOIN scores s ON s.user_id = t.user_id AND s.report_id = t.report_id
+                        WHERE t.user_id = %s AND t.deleted_at >= %s AND s.id IS NULL"""
+SELECT_SCORE_FOR_DELETE_SQL = "SELECT id FROM scores WHERE user_id = %s AND report_id = %s FOR UPDATE"
+DELETE_SCORE_SQL = "DELETE FROM scores WHERE id = %s"
+INSERT_TOMBSTONE_SQL = """INSERT INTO score_tombstones (user_id, report_id)
+                          VALUES (%s, %s)
+                          ON DUPLICATE KEY UPDATE deleted_at = CURRENT_TIMESTAMP"""
+PURGE_TOMBSTONES_SQL = "DELETE FROM score_tombstones WHERE user_id = %s AND deleted_at < NOW() - INTERVAL %s DAY"
+
+
+def encode_cursor(moment):
+    return base64.urlsafe_b64encode(
+        json.dumps([moment.strftime(CURSOR_TIME_FORMAT)]).encode('utf-8')
+    ).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """游标 -> datetime，格式不对时抛出 ValueError"""
+    try:
+        return datetime.strptime(json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))[0],
+                                 CURSOR_TIME_FORMAT)
+    except Exception:
+        raise ValueError('无效的同步游标')
+
+
+def get_changes(user_id, since=None):
+    """返回 (success, result)，result 为 {'full', 'changed', 'deleted', 'cursor'}
+
+    since 为 None 或早于墓碑保留期时返回全部评分（full 为 True，客户端应替换本地数据）；
+    否则只返回 updated_at >= since 的评分和此后删除的报告 id。
+    """
+    # 先确定新游标再读取数据，读取期间提交的修改会在下一次同步中返回
+    success, rows = execute_query(SYNC_CURSOR_SQL, (SYNC_CURSOR_LAG, SCORE_TOMBSTONE_RETENTION_DAYS))
+    if not success:
+        return False, rows
+    cursor_time = rows[0]['cursor_time']
+    full = since is None or since < rows[0]['retained_from']
+
+    if full:
+        success, changed = execute_query(ALL_SCORES_SQL, (user_id,))
+    else:
+        success, changed = execute_query(CHANGED_SCORES_SQL, (user_id, since))
+    if not success:
+        return False, changed
+
+    deleted = []
+    if not full:
+        success, deleted = execute_query(DELETED_SCORES_SQL, (user_id, since))
+        if not success:
+            return False, deleted
+
+    return True, {
+        'full': full,
+        'changed': changed,
+        'deleted': [row['report_id'] for row in deleted],
+        'cursor': encode_cursor(cursor_time)
+    }
+
+
+def delete_score(user_id, report_id, connection):
+    """在事务中删除一条评分并记录墓碑，评分不存在时返回 False"""
+    _, rows = execute_query(SELECT_SCORE_FOR_DELETE_SQL, (user_id, report_id), connection=connection)
+    if not rows:
+        return False
+
+    execute_query(DELETE_SCORE_SQL, (rows[0]['id'],), connection=connection)
+    execute_query(INSERT_TOMBSTONE_SQL, (user_id, report_id), connection=connection)
+    # 顺带清理超过保留期的墓碑
+    execute_query(PURGE_TOMBSTONES_SQL, (user_id, SCORE_TOMBSTONE_RETENTION_DAYS), connection=connection)
+    return True
@@ -0,0 +1,271 @@
+import os
+import re
+import json
+import math
+import time
+import threading
+import unicodedata
+import logging
+from collections import Counter
+from dotenv import load_dotenv
+from utils.case_catalog import get_case_catalog
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 两次检查文件变化之间的最短间隔（秒）
+SEARCH_REFRESH_INTERVAL = float(os.getenv('SEARCH_REFRESH_INTERVAL', '10'))
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+PHRASE_BONUS = 2.0  # 完整包含查询串的段落额外加分
+
+SNIPPET_RADIUS = 40
+
+_CJK_RE = re.compile(r'[㐀-䶿一-鿿豈-﫿]+')
+_WORD_RE = re.compile(r'[0-9a-z]+')
+
+
+def normalize(text):
+    return unicodedata.normalize('NFKC', text).lower()
+
+
+def tokenize(text):
+    """中文按相邻两字切分（bigram），字母数字按单词切分；只有一个汉字的片段保留单字"""
+    text = normalize(text)
+    tokens = []
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(_WORD_RE.findall(text))
+    return tokens
+
+
+def _flatten(value, path=''):
+    """把 JSON 结构展开为 (路径, 文本) 列表"""
+    if isinstance(value, dict):
+        for key, child in value.items():
+            yield from _flatten(child, f'{path}/{key}' if path else str(key))
+    elif isinstance(value, list):
+        for i, child in enumerate(value):
+            yield from _flatten(child, f'{path}[{i}]')
+    elif value is not None:
+        yield path, str(value)
+
+
+def _record_passages(data):
+    """询问记录：基本信息作为一个段落，每轮问答各作为一个段落"""
+    passages = []
+    info = data.get('基本信息')
+    if info:
+        text = '\n'.join(f'{path}: {value}' for path, value in _flatten(info))
+        passages.append({'kind': 'record_info', 'turn': None, 'path': '基本信息', 'text': text})
+    for i, turn in enumerate(data.get('对话') or []):
+        if not isinstance(turn, dict):
+            continue
+        question = str(turn.get('question') or '')
+        answer = str(turn.get('answer') or '')
+        passages.append({
+            'kind': 'dialogue', 'turn': i, 'path': f'对话[{i}]',
+            'question': question, 'answer': answer,
+            'text': f'{question}\n{answer}'
+        })
+    return passages
+
+
+def _report_passages(data):
+    """报告：每个文本字段作为一个段落"""
+    return [{'kind': 'report', 'turn': None, 'path': path, 'text': text}
+            for path, text in _flatten(data) if text.strip()]
+
+
+class SearchIndex:
+    """case_show 中询问记录和报告的倒排索引
+
+    每个文件按 mtime / size 记录版本，refresh 时只重新索引新增或修改过的文件，
+    并删除已不存在文件的段落。
+    """
+
+    def __init__(self, catalog=None, refresh_interval=SEARCH_REFRESH_INTERVAL):
+        self.catalog = catalog or get_case_catalog()
+        self.refresh_interval = refresh_interval
+        self._postings = {}     # token -> {doc_id: tf}
+        self._docs = {}         # doc_id -> 段落
+        self._doc_tokens = {}   # doc_id -> Counter
+        self._files = {}        # (case_id, rel_path) -> ((mtime, size), [doc_id])
+        self._total_length = 0
+        self._next_id = 0
+        self._checked_at = None
+        self._lock = threading.RLock()
+
+    # ---- 索引维护 ----
+
+    def _source_files(self):
+        for case in self.catalog.list_cases():
+            case_info = self.catalog.get_case(case['id'])
+            if case_info is None:
+                continue
+            if case_info['report'] is not None:
+                yield case['id'], 'report.json'
+            for name in case_info['dirs'].get('record', {}):
+                if name.lower().endswith('.json'):
+                    yield case['id'], f'record/{name}'
+
+    def _remove_file(self, key):
+        _, doc_ids = self._files.pop(key, (None, []))
+        for doc_id in doc_ids:
+            tokens = self._doc_tokens.pop(doc_id)
+            for token in tokens:
+                postings = self._postings[token]
+                del postings[doc_id]
+                if not postings:
+                    del self._postings[token]
+            self._total_length -= self._docs.pop(doc_id)['length']
+
+    def _add_file(self, key, path, version):
+        case_id, rel_path = key
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if rel_path == 'report.json':
+            passages = _report_passages(data) if isinstance(data, dict) else []
+        else:
+            passages = _record_passages(data) if isinstance(data, dict) else []
+
+        doc_ids = []
+        for passage in passages:
+            doc_id = self._next_id
+            self._next_id += 1
+            tokens = Counter(tokenize(passage['text']))
+            passage.update({'case': case_id, 'file': rel_path, 'normalized': normalize(passage['text']),
+                            'length': sum(tokens.values())})
+            self._docs[doc_id] = passage
+            self._doc_tokens[doc_id] = tokens
+            self._total_length += passage['length']
+            for token, tf in tokens.items():
+                self._postings.setdefault(token, {})[doc_id] = tf
+            doc_ids.append(doc_id)
+        self._files[key] = (version, doc_ids)
+
+    def refresh(self, force=False):
+        """检查源文件变化并增量更新索引"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+                return
+            self._checked_at = now
+
+            seen = set()
+            for case_id, rel_path in self._source_files():
+                key = (case_id, rel_path)
+                seen.add(key)
+                version = self.catalog.version(case_id, rel_path)
+                if version is None:
+                    continue
+                indexed = self._files.get(key)
+                if indexed is not None and indexed[0] == version:
+                    continue
+                self._remove_file(key)
+                try:
+                    # 只有需要重新索引时才取文件（远程存储时会下载到读缓存）
+                    path = self.catalog.local_path(case_id, rel_path)
+                    if path is None:
+                        continue
+                    self._add_file(key, path, version)
+                    logger.debug("Indexed %s/%s", case_id, rel_path)
+                except (OSError, ValueError) as e:
+                    logger.error("Error indexing %s/%s: %s", case_id, rel_path, e)
+
+            for key in set(self._files) - seen:
+                self._remove_file(key)
+
+    # ---- 查询 ----
+
+    def _snippet(self, doc, query, tokens):
+        text = doc['text']
+        pos = doc['normalized'].find(query)
+        if pos < 0:
+            positions = [doc['normalized'].find(t) for t in tokens]
+            positions = [p for p in positions if p >= 0]
+            pos = min(positions) if positions else 0
+        start = max(pos - SNIPPET_RADIUS, 0)
+        end = min(pos + len(query) + SNIPPET_RADIUS, len(text))
+        snippet = text[start:end].replace('\n', ' ')
+        return ('…' if start > 0 else '') + snippet + ('…' if end < len(text) else '')
+
+    def search(self, query, case_id=None, kind=None, limit=20, offset=0):
+        """BM25 排序的检索结果，返回 (命中总数, 当前页结果)"""
+        self.refresh()
+        normalized = normalize(query).strip()
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not normalized:
+            return 0, []
+
+        with self._lock:
+            n_docs = len(self._docs) or 1
+            avg_length = self._total_length / n_docs or 1
+            scores = Counter()
+
+            if tokens:
+                for token in tokens:
+                    postings = self._postings.get(token)
+                    if not postings:
+                        continue
+                    idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for doc_id, tf in postings.items():
+                        length = self._docs[doc_id]['length']
+                        norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                        scores[doc_id] += idf * tf * (BM25_K1 + 1) / norm
+            else:
+                # 查询中没有可切分的词（如单个标点），退化为子串匹配
+                for doc_id, doc in self._docs.items():
+                    if normalized in doc['normalized']:
+                        scores[doc_id] = 1.0
+
+            hits = []
+            for doc_id, score in scores.items():
+                doc = self._docs[doc_id]
+                if case_id and doc['case'] != case_id:
+                    continue
+                if kind and doc['kind'] != kind:
+                    continue
+                if normalized in doc['normalized']:
+                    score += PHRASE_BONUS
+                hits.append((score, doc_id))
+            hits.sort(key=lambda hit: (-hit[0], hit[1]))
+
+            results = []
+            for score, doc_id in hits[offset:offset + limit]:
+                doc = self._docs[doc_id]
+                result = {
+                    'case': doc['case'],
+                    'file': doc['file'],
+                    'kind': doc['kind'],
+                    'turn': doc['turn'],
+                    'path': doc['path'],
+                    'score': round(score, 4),
+                    'snippet': self._snippet(doc, normalized, tokens)
+                }
+                if doc['kind'] == 'dialogue':
+                    result['question'] = doc['question']
+                results.append(result)
+            return len(hits), results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    """全局检索索引，首次调用时构建"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = SearchIndex()
+                index.refresh(force=True)
+                _index = index
+    return _index
@@ -0,0 +1,180 @@
+import os
+import gzip
+import hashlib
+import tempfile
+import mimetypes
+from flask import current_app, request, send_file
+from dotenv import load_dotenv
+from utils.metrics import record_cache
+from utils.disk_cache import DiskCacheLimit
+
+try:
+    import brotli
+except ImportError:  # 未安装 brotli 时只提供 gzip
+    brotli = None
+
+load_dotenv()
+
+# case_show 中图片等二进制资源的缓存时间（秒）；graph.html、JSON 等会被原地修改的文本每次都用 ETag 确认
+CASE_ASSET_MAX_AGE = int(os.getenv('CASE_ASSET_MAX_AGE', '86400'))
+
+# 预压缩文件的磁盘缓存目录
+PRECOMPRESSED_CACHE_DIR = os.getenv('PRECOMPRESSED_CACHE_DIR') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'precompressed'
+)
+# 预压缩缓存的容量上限，超出后删除最久未访问的文件；0 表示不限制
+PRECOMPRESSED_CACHE_MAX_BYTES = int(os.getenv('PRECOMPRESSED_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+precompressed_limit = DiskCacheLimit(PRECOMPRESSED_CACHE_DIR, PRECOMPRESSED_CACHE_MAX_BYTES)
+
+# 小于该字节数的响应不压缩
+MIN_COMPRESS_SIZE = 1024
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def compress_fast(data, encoding):
+    """按请求即时压缩动态内容，用较低的压缩级别换取速度"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=4)
+    return gzip.compress(data, compresslevel=5, mtime=0)
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(available=None):
+    """按请求的 Accept-Encoding 选择压缩方式，优先 br，不接受压缩时返回 None"""
+    accept = request.accept_encodings
+    for encoding in supported_encodings():
+        if (available is None or encoding in available) and accept[encoding] > 0:
+            return encoding
+    return None
+
+
+def _variant_prefix(path):
+    """同一源文件的各个版本共用的文件名前缀"""
+    return hashlib.sha1(path.encode('utf-8')).hexdigest() + '-'
+
+
+def _variant_path(path, st, encoding):
+    prefix = _variant_prefix(path)
+    version = hashlib.sha1(f'{st.st_mtime_ns}:{st.st_size}'.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(PRECOMPRESSED_CACHE_DIR, prefix[:2], prefix + version + ENCODING_SUFFIXES[encoding])
+
+
+def _remove_stale_variants(variant_path, path, limit):
+    """源文件修改后删除旧版本的压缩文件；最近还在使用的留给容量清理"""
+    cache_dir, current = os.path.split(variant_path)
+    prefix = _variant_prefix(path)
+    suffix = os.path.splitext(current)[1]
+    for name in os.listdir(cache_dir):
+        if name == current or not name.startswith(prefix) or not name.endswith(suffix):
+            continue
+        stale = os.path.join(cache_dir, name)
+        try:
+            if not limit.recently_used(os.stat(stale)):
+                os.remove(stale)
+        except OSError:
+            pass
+
+
+def _precompressed(path, st, encoding):
+    """返回文件的预压缩版本路径；每个 mtime 只压缩一次，先写临时文件再原子替换"""
+    variant_path = _variant_path(path, st, encoding)
+    limit = precompressed_limit
+    try:
+        limit.touch(variant_path)
+        record_cache('precompressed', True)
+        return variant_path
+    except FileNotFoundError:
+        record_cache('precompressed', False)
+
+    with open(path, 'rb') as f:
+        data = compress(f.read(), encoding)
+
+    cache_dir = os.path.dirname(variant_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, variant_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _remove_stale_variants(variant_path, path, limit)
+    limit.added(len(data))
+    return variant_path
+
+
+def apply_cache_headers(response, vary_encoding=False, revalidate=False):
+    """revalidate 为 True 时设置 no-cache：可以缓存，但每次使用前都要带 ETag 向服务器确认；
+    否则缓存 CASE_ASSET_MAX_AGE 秒"""
+    response.cache_control.public = True
+    if revalidate:
+        response.cache_control.max_age = None
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.max_age = CASE_ASSET_MAX_AGE
+    if vary_encoding:
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def dynamic_response(body, etag, mimetype='application/json'):
+    """动态拼接的响应：按 Accept-Encoding 即时压缩，ETag 带上压缩方式，使用 no-cache
+
+    请求的 If-None-Match 匹配时直接返回 304，不再压缩响应体。
+    """
+    encoding = negotiate_encoding() if len(body) >= MIN_COMPRESS_SIZE else None
+    if encoding is not None:
+        etag = f'{etag}-{encoding}'
+    response = current_app.response_class(mimetype=mimetype)
+    response.set_etag(etag)
+    apply_cache_headers(response, vary_encoding=True, revalidate=True)
+    if request.if_none_match.contains_weak(etag):
+        response.status_code = 304
+        return response
+    if encoding is not None:
+        response.set_data(compress_fast(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response.set_data(body)
+    return response
+
+
+def send_asset(path, mimetype=None):
+    """发送 case_show 中的静态文件
+
+    支持 Range 请求与 ETag / Last-Modified 条件请求。图片等二进制文件设置长期 Cache-Control；
+    HTML、JSON 等文本使用 no-cache（内容可能被重新生成），并按 Accept-Encoding 返回预先压缩好的 br / gzip 版本。
+    """
+    mimetype = mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    st = os.stat(path)
+    etag = f'{st.st_mtime_ns:x}-{st.st_size:x}'
+    compressible = is_compressible(mimetype)
+
+    encoding = negotiate_encoding() if compressible and st.st_size >= MIN_COMPRESS_SIZE else None
+    if encoding is None:
+        response = send_file(path, mimetype=mimetype, etag=etag, conditional=True,
+                             last_modified=st.st_mtime, max_age=CASE_ASSET_MAX_AGE)
+    else:
+        response = send_file(_precompressed(path, st, encoding), mimetype=mimetype,
+                             etag=f'{etag}-{encoding}', conditional=True,
+                             last_modified=st.st_mtime, max_age=CASE_ASSET_MAX_AGE)
+        response.headers['Content-Encoding'] = encoding
+    return apply_cache_headers(response, vary_encoding=compressible, revalidate=compressible)
@@ -0,0 +1,322 @@
+import os
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import namedtuple
+from dotenv import load_dotenv
+from utils.metrics import record_cache
+from utils.disk_cache import DiskCacheLimit
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只使用进程内锁
+    fcntl = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 案例资源和上传文件的存储后端：local（本地目录）或 s3（S3 兼容的对象存储，如 MinIO）
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'local')
+S3_BUCKET = os.getenv('S3_BUCKET', '')
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL') or None       # 留空时使用 AWS；MinIO 等填写其地址
+S3_REGION = os.getenv('S3_REGION') or None
+S3_CASE_PREFIX = os.getenv('S3_CASE_PREFIX', 'case_show/')
+S3_UPLOAD_PREFIX = os.getenv('S3_UPLOAD_PREFIX', 'uploads/')
+
+# 远程对象的本地读缓存，同一台机器上的 worker 共享，按最近访问时间淘汰
+STORAGE_CACHE_DIR = os.getenv('STORAGE_CACHE_DIR') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'storage'
+)
+STORAGE_CACHE_MAX_BYTES = int(os.getenv('STORAGE_CACHE_MAX_BYTES', str(2 * 1024 * 1024 * 1024)))
+
+# 下载和复制时每次读取的字节数
+STORAGE_CHUNK_SIZE = 1024 * 1024
+
+ObjectInfo = namedtuple('ObjectInfo', ['key', 'size', 'mtime', 'etag'])
+
+
+class LocalBackend:
+    """本地目录，key 为相对路径（以 / 分隔）
+
+    remote 为 True 时当作远程存储使用（经过读缓存，上传文件的引用也写到这里），
+    用于测试，或把多台机器共同挂载的目录（如 NFS）当作没有 MinIO 时的共享存储。
+    """
+
+    def __init__(self, root, remote=False):
+        self.root = root
+        self.is_local = not remote
+        self.name = f'file://{os.path.abspath(root)}'
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def stat(self, key):
+        try:
+            st = os.stat(self.path(key))
+        except OSError:
+            return None
+        return ObjectInfo(key, st.st_size, st.st_mtime, f'{st.st_mtime_ns}-{st.st_size}')
+
+    def list(self, prefix=''):
+        base = self.path(prefix) if prefix else self.root
+        for dirpath, _, filenames in os.walk(base):
+            for filename in filenames:
+                rel = os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, '/')
+                info = self.stat(rel)
+                if info is not None:
+                    yield info
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def _write(self, key, write):
+        # 先写临时文件再原子替换，读取方不会看到写了一半的文件
+        dest = self.path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as dst:
+                write(dst)
+            os.replace(tmp_path, dest)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_file(self, key, src_path):
+        def copy(dst):
+            with open(src_path, 'rb') as src:
+                shutil.copyfileobj(src, dst, STORAGE_CHUNK_SIZE)
+        self._write(key, copy)
+
+    def put_bytes(self, key, data):
+        self._write(key, lambda dst: dst.write(data))
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3Backend:
+    """S3 兼容的对象存储，key 前加 prefix 作为对象名"""
+
+    is_local = False
+
+    def __init__(self, bucket, prefix='', endpoint_url=S3_ENDPOINT_URL, region=S3_REGION):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.name = f's3://{bucket}/{prefix}'
+        self._client = None
+        self._client_pid = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        """boto3 客户端；fork 出的子进程重新创建（连接不能跨进程共享）"""
+        if self._client is None or self._client_pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._client_pid != os.getpid():
+                    import boto3  # 仅在启用 s3 后端时需要
+                    self._client = boto3.client('s3', endpoint_url=self.endpoint_url, region_name=self.region)
+                    self._client_pid = os.getpid()
+        return self._client
+
+    def stat(self, key):
+        try:
+            head = self.client().head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except Exception as e:
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return ObjectInfo(key, head['ContentLength'], head['LastModified'].timestamp(), head['ETag'].strip('"'))
+
+    def list(self, prefix=''):
+        paginator = self.client().get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            for item in page.get('Contents', []):
+                key = item['Key'][len(self.prefix):]
+                if key and not key.endswith('/'):
+                    yield ObjectInfo(key, item['Size'], item['LastModified'].timestamp(), item['ETag'].strip('"'))
+
+    def open(self, key):
+        """对象内容的流，调用方按块读取后关闭"""
+        return self.client().get_object(Bucket=self.bucket, Key=self.prefix + key)['Body']
+
+    def put_file(self, key, src_path):
+        # upload_file 从磁盘分块读取，大文件自动使用分片上传
+        self.client().upload_file(src_path, self.bucket, self.prefix + key)
+
+    def put_bytes(self, key, data):
+        self.client().put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+    def delete(self, key):
+        self.client().delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+
+class ReadThroughCache:
+    """远程对象的本地磁盘缓存
+
+    文件名由后端、key 和对象版本（ETag）计算，对象更新后自然换用新文件，缓存内容不需要失效。
+    下载时逐块写入临时文件再原子替换，同一对象在多个 worker 中只下载一次（文件锁）。
+    缓存文件的 mtime 设为对象的 LastModified，ETag、预压缩文件等以 mtime 为版本的逻辑在各节点上结果一致；
+    最近访问时间记在 atime 上，总大小超过 max_bytes 时删除最久未访问的文件。
+    """
+
+    TOUCH_INTERVAL = DiskCacheLimit.TOUCH_INTERVAL
+
+    def __init__(self, root=STORAGE_CACHE_DIR, max_bytes=STORAGE_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._limit = DiskCacheLimit(root, max_bytes)
+        # 没有 fcntl 时按路径分段的进程内下载锁
+        self._download_locks = [threading.Lock() for _ in range(16)]
+
+    def _path(self, backend, info):
+        digest = hashlib.sha256(f'{backend.name}|{info.key}|{info.etag}'.encode('utf-8')).hexdigest()
+        # 保留扩展名，按扩展名判断类型的代码（JSON、图片、PDF）可以直接使用缓存文件
+        return os.path.join(self.root, digest[:2], digest + os.path.splitext(info.key)[1].lower())
+
+    def get(self, backend, info):
+        """返回对象在本地缓存中的路径，不在缓存中时先下载"""
+        path = self._path(backend, info)
+        try:
+            self._limit.touch(path)
+            record_cache('storage', True)
+            return path
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if fcntl is None:
+            with self._download_locks[hash(path) % len(self._download_locks)]:
+                self._fill(backend, info, path)
+        else:
+            with open(path + '.lock', 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._fill(backend, info, path)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._limit.added(info.size)
+        return path
+
+    def _fill(self, backend, info, path):
+        # 等锁期间其他 worker 可能已经下载完成
+        if not os.path.exists(path):
+            record_cache('storage', False)
+            self._download(backend, info, path)
+
+    def _download(self, backend, info, path):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as dst:
+                src = backend.open(info.key)
+                try:
+                    for block in iter(lambda: src.read(STORAGE_CHUNK_SIZE), b''):
+                        dst.write(block)
+                finally:
+                    src.close()
+            os.utime(tmp_path, (time.time(), info.mtime))
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def evict(self):
+        self._limit.evict()
+
+
+class Storage:
+    """存储后端 + 本地读缓存；local_path 总是返回本地文件路径，供 send_file、PIL、fitz 等直接使用"""
+
+    def __init__(self, backend, cache=None):
+        self.backend = backend
+        self.cache = cache
+
+    @property
+    def is_local(self):
+        return self.backend.is_local
+
+    def stat(self, key):
+        return self.backend.stat(key)
+
+    def list(self, prefix=''):
+        return self.backend.list(prefix)
+
+    def read_bytes(self, key):
+        """小对象（如元数据）的全部内容，不经过读缓存；不存在时返回 None"""
+        if self.backend.stat(key) is None:
+            return None
+        src = self.backend.open(key)
+        try:
+            return src.read()
+        finally:
+            src.close()
+
+    def local_path(self, key, info=None):
+        """key 对应的本地文件路径，对象不存在时返回 None
+
+        info 为列目录时得到的 ObjectInfo，已知版本时不必再向远程查询。
+        """
+        if self.backend.is_local:
+            path = self.backend.path(key)
+            return path if os.path.isfile(path) else None
+        info = info or self.backend.stat(key)
+        if info is None:
+            return None
+        return self.cache.get(self.backend, info)
+
+    def put_file(self, key, src_path):
+        self.backend.put_file(key, src_path)
+
+    def put_bytes(self, key, data):
+        self.backend.put_bytes(key, data)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+
+def _make_storage(local_root, s3_prefix):
+    if STORAGE_BACKEND == 's3':
+        return Storage(S3Backend(S3_BUCKET, s3_prefix), _get_cache())
+    return Storage(LocalBackend(local_root))
+
+
+_cache = None
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        _cache = ReadThroughCache()
+    return _cache
+
+
+def get_case_storage(case_dir):
+    """案例资源（case_show）的存储；本地后端即案例目录本身"""
+    return _get_storage(('cases', os.path.abspath(case_dir)), case_dir, S3_CASE_PREFIX)
+
+
+def get_upload_storage(upload_folder):
+    """上传文件的存储；本地后端即上传目录本身"""
+    return _get_storage(('uploads', os.path.abspath(upload_folder)), upload_folder, S3_UPLOAD_PREFIX)
+
+
+def _get_storage(name, local_root, s3_prefix):
+    storage = _storages.get(name)
+    if storage is None:
+        with _storages_lock:
+            storage = _storages.get(name)
+            if storage is None:
+                storage = _storages[name] = _make_storage(local_root, s3_prefix)
+    return storage
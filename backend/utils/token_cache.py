@@ -0,0 +1,151 @@
+"""已验证 token 的缓存：token 摘要 -> 用户信息（id、username）
+
+缓存期间不再查询 users 表，所以修改 users 行的代码必须在提交后调用 invalidate_user(user_id)，
+该用户已缓存的 token 在下一次请求时重新校验。
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 已验证 token 缓存配置
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', '300'))         # 缓存最长秒数，同时不超过 token 的 exp
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '10000'))     # 进程内缓存的最大条目数
+TOKEN_CACHE_BACKEND = os.getenv('TOKEN_CACHE_BACKEND', 'memory')   # memory 或 redis
+TOKEN_CACHE_REDIS_URL = os.getenv('TOKEN_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+
+def token_cache_key(token):
+    """缓存键使用 token 的摘要，避免在缓存中保存原始 token"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _expires_at(exp, ttl):
+    expires_at = time.time() + ttl
+    if exp:
+        expires_at = min(expires_at, float(exp))
+    return expires_at
+
+
+class MemoryTokenCache:
+    """进程内 TTL + LRU 缓存：token 摘要 -> 已验证的用户信息"""
+
+    def __init__(self, max_size=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._user_keys = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return principal
+
+    def set(self, key, principal, exp=None):
+        expires_at = _expires_at(exp, self.ttl)
+        if expires_at <= time.time():
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (principal, expires_at)
+            self._user_keys.setdefault(principal['id'], set()).add(key)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._user_keys.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[0]['id']
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+
+
+class RedisTokenCache:
+    """基于 Redis 的跨进程缓存，多个 worker 共享同一份已验证用户信息"""
+
+    PREFIX = 'fire_gpt:token:'
+    USER_PREFIX = 'fire_gpt:token_user:'
+
+    def __init__(self, url=TOKEN_CACHE_REDIS_URL, ttl=TOKEN_CACHE_TTL):
+        import redis  # 仅在启用 redis 后端时需要
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(self.PREFIX + key)
+        return json.loads(value) if value else None
+
+    def set(self, key, principal, exp=None):
+        seconds = int(_expires_at(exp, self.ttl) - time.time())
+        if seconds <= 0:
+            return
+        user_key = f"{self.USER_PREFIX}{principal['id']}"
+        pipe = self._client.pipeline()
+        pipe.set(self.PREFIX + key, json.dumps(principal), ex=seconds)
+        pipe.sadd(user_key, key)
+        pipe.expire(user_key, self.ttl)
+        pipe.execute()
+
+    def invalidate_user(self, user_id):
+        user_key = f'{self.USER_PREFIX}{user_id}'
+        keys = self._client.smembers(user_key)
+        pipe = self._client.pipeline()
+        for key in keys:
+            pipe.delete(self.PREFIX + key.decode('utf-8'))
+        pipe.delete(user_key)
+        pipe.execute()
+
+    def clear(self):
+        for pattern in (self.PREFIX + '*', self.USER_PREFIX + '*'):
+            for key in self._client.scan_iter(pattern):
+                self._client.delete(key)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """按 TOKEN_CACHE_BACKEND 创建全局缓存实例"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                if TOKEN_CACHE_BACKEND == 'redis':
+                    _cache = RedisTokenCache()
+                else:
+                    _cache = MemoryTokenCache()
+    return _cache
+
+
+def invalidate_user(user_id):
+    """用户信息变更（改名、改密码、删除等）后调用，使其已缓存的 token 重新校验"""
+    get_token_cache().invalidate_user(user_id)
@@ -0,0 +1,75 @@
+import io
+import zipfile
+
+COPY_BUFFER_SIZE = 256 * 1024
+
+# 已经压缩过的格式直接存储，不再 deflate
+STORED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.zip', '.pdf')
+
+
+class _ZipOutput(io.RawIOBase):
+    """只写、不可 seek 的输出流：zipfile 写入的数据暂存在这里，由生成器随时取走"""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(files):
+    """边读文件边生成 ZIP 数据块
+
+    files 为 (压缩包内路径, 磁盘路径) 的可迭代对象。输出流不可 seek，zipfile 会为每个
+    条目写数据描述符，因此不需要临时文件，内存中最多只有一个读缓冲区的数据。
+    """
+    output = _ZipOutput()
+    with zipfile.ZipFile(output, 'w', allowZip64=True) as zf:
+        for arcname, path in files:
+            zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            if path.lower().endswith(STORED_EXTENSIONS):
+                zinfo.compress_type = zipfile.ZIP_STORED
+            else:
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, 'rb') as src, zf.open(zinfo, 'w') as dst:
+                for block in iter(lambda: src.read(COPY_BUFFER_SIZE), b''):
+                    dst.write(block)
+                    data = output.take()
+                    if data:
+                        yield data
+            data = output.take()
+            if data:
+                yield data
+    yield output.take()
+
+
+def case_zip_entries(catalog, case, root_name=None):
+    """案例索引中的全部文件 -> (压缩包内路径, 磁盘路径)
+
+    按需逐个取得本地路径：远程存储时文件在打包到它之前才下载到读缓存。
+    """
+    root_name = root_name or case['id']
+    rel_paths = [case[name]['name'] for name in ('report', 'graph') if case[name] is not None]
+    for folder, files in case['dirs'].items():
+        rel_paths.extend(f'{folder}/{file_name}' for file_name in files)
+    for rel_path in rel_paths:
+        path = catalog.local_path(case['id'], rel_path)
+        if path is not None:
+            yield f'{root_name}/{rel_path}', path